@@ -2,18 +2,45 @@
 """
 Скрипт для анализа тональности существующих сообщений
 Анализирует все сообщения клиентов и обновляет базу данных
+
+Сообщения читаются страницами по id, прогресс сохраняется в system_config:
+прерванный запуск с тем же охватом продолжается с последней страницы.
+Охват задается --since/--until/--chat; --shards N запускает N процессов,
+каждый со своей частью сообщений (id % N), а --shard K/N - один такой шард
+(например, на другой машине). Метрики вызовов API каждого запуска или шарда
+публикуются в Redis после каждой страницы и в конце
+(/api/sentiment-metrics, /api/sentiment-pipeline-status).
+
+Пример:
+    python analyze_sentiment_batch.py
+    python analyze_sentiment_batch.py --since 2025-01-01 --until 2025-02-01 --shards 4
+    python analyze_sentiment_batch.py --chat -1001234567890 --restart
+    python analyze_sentiment_batch.py --recent 24
 """
 
+import argparse
 import asyncio
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float, BigInteger
+from sqlalchemy import create_engine, text, update, Column, Integer, String, Text, DateTime, Boolean, Float, BigInteger
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from sentiment_analyzer import SentimentAnalyzer
+from sentiment_metrics import publish_backfill_snapshot
+from sentiment_pipeline import (BURST_SECONDS, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, RateLimiter,
+                                SentimentPipeline)
+
+# Сообщений на страницу (одна транзакция с контрольной точкой)
+CHUNK_SIZE = 1000
+CHECKPOINT_PREFIX = "sentiment_backfill:"
 
 Base = declarative_base()
 
@@ -22,11 +49,13 @@ class Message(Base):
     __tablename__ = 'messages'
     
     id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger)
     text = Column(Text)
     is_team_member = Column(Boolean, nullable=False)
     sentiment_score = Column(Float)
     sentiment_label = Column(String(20))
     sentiment_confidence = Column(Float)
+    sentiment_source = Column(String(10))
     processed_for_sentiment = Column(Boolean, default=False)
     timestamp = Column(DateTime)
 
@@ -34,6 +63,15 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def checkpoint_key(scope: Dict):
+    """(ключ system_config, описание) контрольной точки охвата"""
+    description = "Sentiment backfill " + ", ".join(
+        f"{name}={value}" for name, value in scope.items() if value is not None
+    )
+    digest = hashlib.sha1(json.dumps(scope, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{CHECKPOINT_PREFIX}{digest}", description
+
+
 class SentimentBatchAnalyzer:
     """Пакетный анализатор тональности сообщений"""
     
@@ -51,105 +89,205 @@ class SentimentBatchAnalyzer:
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
     
-    async def analyze_all_client_messages(self):
-        """Анализ всех сообщений клиентов"""
+    async def analyze_all_client_messages(self, **scope):
+        """Анализ всех сообщений клиентов (backfill с продолжением с контрольной точки)"""
         logger.info("Начинаем анализ тональности сообщений клиентов...")
-        
-        # Получаем все сообщения клиентов без анализа тональности
-        unanalyzed_messages = self.session.query(Message).filter(
-            Message.is_team_member == False,  # Только клиентские сообщения
-            Message.text.isnot(None),  # Только текстовые сообщения
-            Message.text != '',  # Не пустые
-            (Message.processed_for_sentiment == False) | (Message.processed_for_sentiment.is_(None))  # Не обработанные или NULL
-        ).all()
-        
-        logger.info(f"Найдено {len(unanalyzed_messages)} сообщений для анализа")
-        
-        if not unanalyzed_messages:
-            logger.info("Нет сообщений для анализа")
-            return
-        
-        analyzed_count = 0
-        error_count = 0
-        
-        for message in unanalyzed_messages:
-            try:
-                logger.info(f"Анализируем сообщение {message.id}: '{message.text[:50]}...'")
-                
-                # Анализируем тональность
-                sentiment_result = await self.sentiment_analyzer.analyze_sentiment(message.text)
-                
-                if sentiment_result:
-                    # Обновляем сообщение
-                    message.sentiment_score = sentiment_result['score']
-                    message.sentiment_label = sentiment_result['label']
-                    message.sentiment_confidence = sentiment_result['confidence']
-                    message.processed_for_sentiment = True
-                    
-                    logger.info(f"Результат: {sentiment_result['label']} (score: {sentiment_result['score']:.2f})")
-                    analyzed_count += 1
-                else:
-                    logger.warning(f"Не удалось проанализировать сообщение {message.id}")
-                    # Помечаем как обработанное, чтобы не пытаться снова
-                    message.processed_for_sentiment = True
-                    error_count += 1
-                
-                # Сохраняем изменения каждые 5 сообщений
-                if (analyzed_count + error_count) % 5 == 0:
-                    self.session.commit()
-                    logger.info(f"Обработано {analyzed_count + error_count} сообщений")
-                
-                # Небольшая пауза между запросами к API
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Ошибка при анализе сообщения {message.id}: {e}")
-                error_count += 1
-                continue
-        
-        # Финальное сохранение
-        self.session.commit()
+        state = await self.backfill(**scope)
         
         logger.info(f"Анализ завершен:")
-        logger.info(f"- Успешно проанализировано: {analyzed_count}")
-        logger.info(f"- Ошибок: {error_count}")
-        logger.info(f"- Всего обработано: {analyzed_count + error_count}")
+        logger.info(f"- Успешно проанализировано: {state['analyzed']}")
+        logger.info(f"- Ошибок (останутся необработанными, их подхватит worker или следующий запуск): "
+                    f"{state['failed']}")
+        logger.info(f"- Всего обработано: {state['analyzed'] + state['failed']}")
     
     async def analyze_recent_messages(self, hours: int = 24):
         """Анализ сообщений за последние часы"""
-        from datetime import timedelta
-        
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+        state = await self.backfill(since=cutoff_time, checkpoint=False)
+        logger.info(f"Проанализировано {state['analyzed']} недавних сообщений")
+    
+    async def backfill(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       chat_id: Optional[int] = None, shard: int = 0, shards: int = 1,
+                       chunk_size: int = CHUNK_SIZE, checkpoint: bool = True, restart: bool = False) -> Dict:
+        """
+        Потоковый анализ необработанных сообщений клиентов страницами по id
+        
+        Сообщения читаются по chunk_size (id > последнего id, по возрастанию
+        id), результаты страницы записываются одним пакетным UPDATE в одной
+        транзакции с контрольной точкой в system_config. После сбоя запуск с
+        тем же охватом (since/until/chat_id/shard) продолжает с последней
+        записанной страницы; restart начинает охват заново. Шард shard из
+        shards берет сообщения с id % shards == shard, так что параллельные
+        процессы не пересекаются; лимиты запросов к API делятся между шардами.
         
-        recent_messages = self.session.query(Message).filter(
+        Неудачные сообщения (и предварительные результаты локальной модели)
+        остаются позади контрольной точки: после последней страницы они
+        анализируются еще раз одним проходом по id от первого неудачного
+        (retry_from) до last_id. Те, что не удались и тогда, повторит
+        следующий запуск с тем же охватом.
+        
+        Возвращает состояние: last_id, analyzed, failed, retry_from.
+        """
+        scope = {
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "chat": chat_id,
+            "shard": f"{shard}/{shards}",
+        }
+        key, description = checkpoint_key(scope)
+        state = {"last_id": 0, "analyzed": 0, "failed": 0, "retry_from": None}
+        if checkpoint and not restart:
+            saved = self.load_checkpoint(key)
+            if saved:
+                state.update(saved)
+                logger.info(f"Продолжаем {description} с id {state['last_id']} "
+                            f"(уже проанализировано {state['analyzed']})")
+        
+        if shards > 1:
+            # Ключ API общий: каждому шарду своя доля лимитов
+            await self.sentiment_analyzer.get_session()
+            self.sentiment_analyzer.rate_limiter = RateLimiter(
+                REQUESTS_PER_MINUTE / shards, TOKENS_PER_MINUTE / shards, BURST_SECONDS
+            )
+        
+        filters = [
+            Message.processed_for_sentiment == False,
             Message.is_team_member == False,
             Message.text.isnot(None),
-            Message.text != '',
-            Message.timestamp >= cutoff_time,
-            Message.processed_for_sentiment == False
-        ).all()
-        
-        logger.info(f"Найдено {len(recent_messages)} недавних сообщений для анализа")
-        
-        analyzed_count = 0
-        for message in recent_messages:
-            try:
-                sentiment_result = await self.sentiment_analyzer.analyze_sentiment(message.text)
-                
-                if sentiment_result:
-                    message.sentiment_score = sentiment_result['score']
-                    message.sentiment_label = sentiment_result['label']
-                    message.sentiment_confidence = sentiment_result['confidence']
-                    message.processed_for_sentiment = True
-                    analyzed_count += 1
-                    
-                await asyncio.sleep(0.5)  # Короткая пауза
-                
-            except Exception as e:
-                logger.error(f"Ошибка при анализе сообщения {message.id}: {e}")
-        
-        self.session.commit()
-        logger.info(f"Проанализировано {analyzed_count} недавних сообщений")
+            Message.text != ''
+        ]
+        if since:
+            filters.append(Message.timestamp >= since)
+        if until:
+            filters.append(Message.timestamp < until)
+        if chat_id is not None:
+            filters.append(Message.chat_id == chat_id)
+        if shards > 1:
+            filters.append(Message.id % shards == shard)
+        
+        started = time.monotonic()
+        processed = 0
+        async for last_id, size, analyzed, failed in self._pages(filters, state["last_id"], None, chunk_size):
+            state["last_id"] = last_id
+            state["analyzed"] += analyzed
+            state["failed"] += len(failed)
+            if failed and state["retry_from"] is None:
+                state["retry_from"] = min(failed)
+            self._commit_page(key, description, state, checkpoint)
+            
+            processed += size
+            logger.info(f"Обработано до id {state['last_id']}: проанализировано {state['analyzed']}, "
+                        f"ошибок {state['failed']} ({processed / (time.monotonic() - started):.0f} сообщений/с)")
+        
+        if state["retry_from"] is not None:
+            # Неудачные сообщения остались до контрольной точки, следующая страница их не вернет
+            retry_from, remaining = state["retry_from"], None
+            logger.info(f"Повторный проход по необработанным сообщениям с id {retry_from} по {state['last_id']}")
+            async for last_id, size, analyzed, failed in self._pages(filters, retry_from - 1, state["last_id"],
+                                                                     chunk_size):
+                state["analyzed"] += analyzed
+                state["failed"] = max(0, state["failed"] - (size - len(failed)))
+                if failed and remaining is None:
+                    remaining = min(failed)
+                # После сбоя повторный проход продолжится со следующей страницы
+                state["retry_from"] = remaining if remaining is not None else last_id + 1
+                self._commit_page(key, description, state, checkpoint)
+            # Оставшиеся неудачные повторит следующий запуск с тем же охватом
+            state["retry_from"] = remaining
+            self._commit_page(key, description, state, checkpoint)
+        
+        self.publish_metrics(key, description, state, finished=True)
+        tiers = self.sentiment_analyzer.tier_split()
+        logger.info("Источник результатов: " + ", ".join(
+            f"{tier} {split['count']} ({split['share'] or 0:.0%})" for tier, split in tiers.items()
+        ))
+        return state
+    
+    async def _pages(self, filters, after_id: int, up_to_id: Optional[int], chunk_size: int):
+        """
+        Анализ страниц сообщений с id > after_id (и <= up_to_id) по
+        возрастанию id; выдает (последний id, размер страницы, число
+        проанализированных, неудачные id) после каждой, коммит делает
+        вызывающий
+        """
+        while True:
+            query = self.session.query(Message.id, Message.text).filter(Message.id > after_id, *filters)
+            if up_to_id is not None:
+                query = query.filter(Message.id <= up_to_id)
+            chunk = query.order_by(Message.id).limit(chunk_size).all()
+            if not chunk:
+                return
+            
+            analyzed, failed = await self._analyze_chunk(chunk)
+            after_id = chunk[-1].id
+            yield after_id, len(chunk), analyzed, failed
+    
+    def _commit_page(self, key: str, description: str, state: Dict, checkpoint: bool):
+        """Коммит результатов страницы вместе с контрольной точкой, затем публикация метрик"""
+        try:
+            if checkpoint:
+                self.save_checkpoint(key, description, state)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        self.publish_metrics(key, description, state)
+    
+    def publish_metrics(self, key: str, description: str, state: Dict, finished: bool = False):
+        """
+        Метрики вызовов API и уровней анализатора в Redis (рядом со снимком
+        worker, см. sentiment_metrics): /api/sentiment-metrics и
+        /api/sentiment-pipeline-status показывают их для каждого запуска
+        или шарда
+        """
+        publish_backfill_snapshot(key[len(CHECKPOINT_PREFIX):], {
+            **self.sentiment_analyzer.metrics_snapshot(),
+            "run": {"scope": description, **state, "finished": finished},
+        })
+    
+    async def _analyze_chunk(self, rows):
+        """
+        Анализ страницы [(id, text)] через SentimentPipeline (ограничение
+        параллельности и частоты запросов, повтор неудачных); результаты
+        записываются одним UPDATE по первичному ключу, коммит делает
+        вызывающий. Возвращает (число проанализированных, неудачные id)
+        
+        Неудачные сообщения не помечаются обработанными; предварительные
+        результаты локальной модели (LLM недоступна) записываются, но
+        сообщение остается в очереди для LLM.
+        """
+        pipeline = SentimentPipeline(self.sentiment_analyzer)
+        results = []
+        failed = await pipeline.run([(row.id, row.text) for row in rows], results.extend)
+        for message_id in failed:
+            logger.warning(f"Не удалось проанализировать сообщение {message_id}")
+        
+        if results:
+            self.session.execute(update(Message), [{
+                "id": message_id,
+                "sentiment_score": result["score"],
+                "sentiment_label": result["label"],
+                "sentiment_confidence": result["confidence"],
+                "sentiment_source": result.get("source"),
+                "processed_for_sentiment": not result.get("provisional")
+            } for message_id, result in results])
+        analyzed = sum(1 for _, result in results if not result.get("provisional"))
+        return analyzed, failed
+    
+    def load_checkpoint(self, key: str) -> Optional[Dict]:
+        """Сохраненное состояние охвата или None"""
+        value = self.session.execute(
+            text("SELECT value FROM system_config WHERE key = :key"), {"key": key}
+        ).scalar()
+        return json.loads(value) if value else None
+    
+    def save_checkpoint(self, key: str, description: str, state: Dict):
+        """Запись состояния охвата в system_config (в текущей транзакции)"""
+        self.session.execute(text(
+            "INSERT INTO system_config (key, value, description, updated_at) "
+            "VALUES (:key, :value, :description, :now) "
+            "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = EXCLUDED.updated_at"
+        ), {"key": key, "value": json.dumps(state), "description": description, "now": datetime.utcnow()})
     
     def get_statistics(self):
         """Получение статистики по анализу тональности"""
@@ -191,13 +329,46 @@ class SentimentBatchAnalyzer:
             'neutral': neutral_count
         }
     
-    def close(self):
-        """Закрытие соединения с базой данных"""
+    async def close(self):
+        """Закрытие HTTP-сессии анализатора и соединения с базой данных"""
+        await self.sentiment_analyzer.close()
         self.session.close()
 
 
-async def main():
+def parse_date(value):
+    return datetime.fromisoformat(value)
+
+
+def run_shard(scope):
+    """Один шард в отдельном процессе"""
+    async def run():
+        analyzer = SentimentBatchAnalyzer()
+        try:
+            await analyzer.analyze_all_client_messages(**scope)
+        finally:
+            await analyzer.close()
+    
+    asyncio.run(run())
+
+
+async def main(args):
     """Основная функция"""
+    scope = {"since": args.since, "until": args.until, "chat_id": args.chat,
+             "chunk_size": args.chunk_size, "restart": args.restart}
+    
+    if args.shards > 1 and args.shard is None:
+        # Шарды в отдельных процессах: у каждого свое соединение, сессия API и контрольная точка
+        processes = [multiprocessing.Process(target=run_shard, args=({**scope, "shard": shard, "shards": args.shards},))
+                     for shard in range(args.shards)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        failed = [shard for shard, process in enumerate(processes) if process.exitcode != 0]
+        if failed:
+            raise SystemExit(f"Шарды завершились с ошибкой: {failed}")
+        return
+    
     analyzer = SentimentBatchAnalyzer()
     
     try:
@@ -205,16 +376,40 @@ async def main():
         logger.info("Статистика до анализа:")
         analyzer.get_statistics()
         
-        # Запускаем анализ всех сообщений
-        await analyzer.analyze_all_client_messages()
+        if args.recent:
+            await analyzer.analyze_recent_messages(args.recent)
+        elif args.shard is not None:
+            await analyzer.analyze_all_client_messages(**scope, shard=args.shard, shards=args.shards)
+        else:
+            await analyzer.analyze_all_client_messages(**scope)
         
         # Показываем статистику после анализа
         logger.info("Статистика после анализа:")
         analyzer.get_statistics()
         
     finally:
-        analyzer.close()
+        await analyzer.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Анализ тональности необработанных сообщений клиентов")
+    parser.add_argument('--since', type=parse_date, help="Сообщения начиная с даты (ISO, UTC)")
+    parser.add_argument('--until', type=parse_date, help="Сообщения до даты, не включая (ISO, UTC)")
+    parser.add_argument('--chat', type=int, help="Только один чат")
+    parser.add_argument('--shards', type=int, default=1, help="Число шардов (процессов) по id %% N")
+    parser.add_argument('--shard', help="Запустить только шард K/N в этом процессе")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Сообщений на страницу")
+    parser.add_argument('--restart', action='store_true', help="Начать охват заново, без контрольной точки")
+    parser.add_argument('--recent', type=int, metavar='HOURS', help="Только сообщения за последние часы")
+    args = parser.parse_args()
+    
+    if args.shard is not None:
+        shard, _, shards = args.shard.partition('/')
+        args.shard, args.shards = int(shard), int(shards or args.shards)
+        if not 0 <= args.shard < args.shards:
+            parser.error("--shard: нужно K/N, 0 <= K < N")
+    return args
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(parse_args()))
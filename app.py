@@ -6,6 +6,8 @@ from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 
+from db_routing import RoutingSession
+
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 import os
@@ -17,7 +19,8 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+# Reads of @replica_reads views go to DATABASE_READ_URL when it is set
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
 # Create the app
 app = Flask(__name__)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк потоковой выгрузки /api/export/messages и /api/export/kpis
+
+Создает (при необходимости) синтетический чат с N сообщениями, выгружает его во
+всех форматах и печатает пропускную способность (строк/с, МБ/с) и прирост
+пиковой памяти процесса. Память не должна расти с количеством строк.
+
+Пример:
+    DATABASE_URL=... ADMIN_TOKEN=... python benchmark_export.py --rows 1000000
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+BENCHMARK_CHAT_ID = -1009999999999
+
+
+def seed_messages(db, rows):
+    """Создает чат бенчмарка и rows сообщений в нем"""
+    db.session.execute(text("DELETE FROM messages WHERE chat_id = :chat_id"), {"chat_id": BENCHMARK_CHAT_ID})
+    db.session.execute(text("DELETE FROM chats WHERE id = :chat_id"), {"chat_id": BENCHMARK_CHAT_ID})
+    db.session.execute(text(
+        "INSERT INTO chats (id, title, chat_type, is_active, created_at, updated_at) "
+        "VALUES (:chat_id, 'Export benchmark', 'supergroup', false, :now, :now)"
+    ), {"chat_id": BENCHMARK_CHAT_ID, "now": datetime.utcnow()})
+
+    start = datetime.utcnow() - timedelta(days=1)
+    if db.engine.dialect.name == 'postgresql':
+        # generate_series вставляет миллионы строк за секунды
+        db.session.execute(text(
+            "INSERT INTO messages (message_id, chat_id, user_id, username, full_name, text, message_type, "
+            "is_team_member, timestamp, created_at, sentiment_score, sentiment_label, processed_for_sentiment) "
+            "SELECT n, :chat_id, 1000 + n % 7, 'user' || (n % 7), 'Benchmark User ' || (n % 7), "
+            "'Сообщение номер ' || n || ', немного текста, \"кавычки\" и запятые', 'text', "
+            "n % 3 = 0, :start + (n * interval '1 millisecond'), :start, "
+            "((n % 200) - 100) / 100.0, 'neutral', true "
+            "FROM generate_series(1, :rows) AS n"
+        ), {"chat_id": BENCHMARK_CHAT_ID, "start": start, "rows": rows})
+    else:
+        params = [{
+            "n": n, "chat_id": BENCHMARK_CHAT_ID, "user_id": 1000 + n % 7,
+            "text": f"Сообщение номер {n}, немного текста", "team": n % 3 == 0,
+            "ts": start + timedelta(milliseconds=n)
+        } for n in range(1, rows + 1)]
+        db.session.execute(text(
+            "INSERT INTO messages (message_id, chat_id, user_id, text, message_type, is_team_member, timestamp) "
+            "VALUES (:n, :chat_id, :user_id, :text, 'text', :team, :ts)"
+        ), params)
+
+    db.session.commit()
+    return start
+
+
+def cleanup(db):
+    """Удаляет данные бенчмарка"""
+    db.session.execute(text("DELETE FROM messages WHERE chat_id = :chat_id"), {"chat_id": BENCHMARK_CHAT_ID})
+    db.session.execute(text("DELETE FROM chats WHERE id = :chat_id"), {"chat_id": BENCHMARK_CHAT_ID})
+    db.session.commit()
+
+
+def peak_rss_mb():
+    """Пиковая память процесса (ru_maxrss в КБ на Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_export(client, url, token, compressed):
+    """Выгружает url потоком и считает байты и строки, не храня ответ целиком"""
+    started = time.perf_counter()
+    response = client.get(url, headers={'X-Admin-Token': token}, buffered=False)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url}: HTTP {response.status_code}")
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+    wire_bytes = 0
+    raw_bytes = 0
+    lines = 0
+    try:
+        for chunk in response.response:
+            wire_bytes += len(chunk)
+            data = decompressor.decompress(chunk) if decompressor else chunk
+            raw_bytes += len(data)
+            lines += data.count(b'\n')
+    finally:
+        response.close()
+
+    return time.perf_counter() - started, wire_bytes, raw_bytes, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк потоковой выгрузки")
+    parser.add_argument('--rows', type=int, default=100000, help="Количество синтетических сообщений")
+    parser.add_argument('--no-seed', action='store_true', help="Выгружать существующие данные (без чата бенчмарка)")
+    parser.add_argument('--keep', action='store_true', help="Не удалять синтетические данные после запуска")
+    parser.add_argument('--start-date', help="Начало периода (YYYY-MM-DD, по Москве) для --no-seed")
+    parser.add_argument('--end-date', help="Конец периода (YYYY-MM-DD, по Москве) для --no-seed")
+    args = parser.parse_args()
+
+    token = os.environ.get('ADMIN_TOKEN')
+    if not os.environ.get('DATABASE_URL') or not token:
+        print("Ошибка: нужны переменные DATABASE_URL и ADMIN_TOKEN")
+        sys.exit(1)
+
+    from app import app, db
+    import routes  # noqa: F401 - регистрирует эндпоинты
+
+    client = app.test_client()
+    query = ''
+
+    with app.app_context():
+        if not args.no_seed:
+            print(f"Создание {args.rows} сообщений...")
+            seed_started = time.perf_counter()
+            start = seed_messages(db, args.rows)
+            print(f"Готово за {time.perf_counter() - seed_started:.1f} с")
+            query = f"chat_id={BENCHMARK_CHAT_ID}&start_date={start:%Y-%m-%d}&end_date={datetime.utcnow() + timedelta(days=1):%Y-%m-%d}"
+        elif args.start_date and args.end_date:
+            query = f"start_date={args.start_date}&end_date={args.end_date}"
+
+    try:
+        print(f"\n{'эндпоинт':<28}{'формат':<8}{'gzip':<6}{'строк':>10}{'сек':>8}{'строк/с':>11}"
+              f"{'МБ/с':>8}{'МБ':>9}{'ΔRSS МБ':>9}")
+        for endpoint in ('/api/export/messages', '/api/export/kpis'):
+            for export_format in ('ndjson', 'csv'):
+                for compressed in (False, True):
+                    url = f"{endpoint}?format={export_format}&{query}"
+                    if compressed:
+                        url += '&compress=gzip'
+
+                    rss_before = peak_rss_mb()
+                    elapsed, wire_bytes, raw_bytes, lines = run_export(client, url, token, compressed)
+                    rows = lines - 1 if export_format == 'csv' else lines
+
+                    print(f"{endpoint:<28}{export_format:<8}{'да' if compressed else 'нет':<6}{rows:>10}"
+                          f"{elapsed:>8.2f}{rows / elapsed if elapsed else 0:>11.0f}"
+                          f"{raw_bytes / 1048576 / elapsed if elapsed else 0:>8.1f}"
+                          f"{wire_bytes / 1048576:>9.1f}{peak_rss_mb() - rss_before:>9.1f}")
+    finally:
+        if not args.no_seed and not args.keep:
+            with app.app_context():
+                cleanup(db)
+
+
+if __name__ == "__main__":
+    main()
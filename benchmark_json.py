@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации и сжатия JSON-ответов
+
+Запрашивает самые большие эндпоинты дашборда на текущих данных и для каждого
+ответа сравнивает время сериализации (стандартный json с настройками Flask по
+умолчанию и json_response.dumps_bytes) и размер тела на проводе без сжатия,
+с gzip и brotli (если установлен модуль brotli).
+
+Пример:
+    DATABASE_URL=... ADMIN_TOKEN=... python benchmark_json.py --iterations 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+DEFAULT_ENDPOINTS = [
+    '/api/filtered-dashboard-data',
+    '/api/dashboard-bundle?sections=dashboard,filter_options,sentiment_trend,response_time_trend&days=30',
+    '/api/chats-management?limit=200',
+    '/api/team-members?limit=200',
+    '/api/recent-communications?limit=200&hours=168',
+    '/api/sentiment-overview',
+    '/api/response-time-analysis',
+]
+
+
+def measure(function, iterations):
+    """Среднее время вызова function в миллисекундах"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = function()
+    return (time.perf_counter() - started) * 1000 / iterations, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации и сжатия JSON")
+    parser.add_argument('--iterations', type=int, default=20, help="Повторов каждого замера")
+    parser.add_argument('endpoints', nargs='*', help="Эндпоинты (по умолчанию самые большие)")
+    args = parser.parse_args()
+
+    token = os.environ.get('ADMIN_TOKEN')
+    if not os.environ.get('DATABASE_URL') or not token:
+        print("Ошибка: нужны переменные DATABASE_URL и ADMIN_TOKEN")
+        sys.exit(1)
+
+    from app import app
+    import routes  # noqa: F401 - регистрирует эндпоинты
+    import json_response
+    from json_response import compress, dumps_bytes
+
+    client = app.test_client()
+    encodings = ['gzip'] + (['br'] if json_response.brotli is not None else [])
+
+    print(f"orjson: {'да' if json_response.orjson is not None else 'нет'}, "
+          f"brotli: {'да' if json_response.brotli is not None else 'нет'}\n")
+    print(f"{'эндпоинт':<48}{'json мс':>9}{'fast мс':>9}{'x':>6}{'КБ':>9}"
+          + ''.join(f"{encoding + ' КБ':>10}{encoding + ' мс':>9}" for encoding in encodings))
+
+    for endpoint in args.endpoints or DEFAULT_ENDPOINTS:
+        response = client.get(endpoint, headers={'X-Admin-Token': token})
+        if response.status_code != 200:
+            print(f"{endpoint}: HTTP {response.status_code}")
+            continue
+        payload = json.loads(response.get_data())
+
+        # Настройки стандартного провайдера Flask: sort_keys, ensure_ascii
+        stdlib_ms, _ = measure(lambda: json.dumps(payload, sort_keys=True).encode('utf-8'), args.iterations)
+        fast_ms, body = measure(lambda: dumps_bytes(payload), args.iterations)
+
+        row = (f"{endpoint[:47]:<48}{stdlib_ms:>9.2f}{fast_ms:>9.2f}"
+               f"{stdlib_ms / fast_ms if fast_ms else 0:>6.1f}{len(body) / 1024:>9.1f}")
+        for encoding in encodings:
+            compress_ms, compressed = measure(lambda: compress(body, encoding), args.iterations)
+            row += f"{len(compressed) / 1024:>10.1f}{compress_ms:>9.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
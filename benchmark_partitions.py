@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Проверка отсечения секций (partition pruning) в запросах эндпоинтов
+
+Вызывает аналитические эндпоинты за последние N дней, перехватывает их
+SQL-запросы к messages и выполняет для каждого EXPLAIN ANALYZE с теми же
+параметрами (только SELECT). Для каждого эндпоинта печатает время ответа, число
+запросов к messages и сколько секций из имеющихся просканировал самый
+тяжелый из них. Запрос, читающий все секции при фильтре по периоду,
+помечается как "без отсечения".
+
+Имеет смысл после migrations/optional/messages_partitioning.sql; на
+несекционированной таблице показывает только время.
+
+Пример:
+    DATABASE_URL=... ADMIN_TOKEN=... python benchmark_partitions.py --days 7
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+ENDPOINTS = (
+    '/api/filtered-dashboard-data?start_date={start}&end_date={end}',
+    '/api/sentiment-trend?days={days}',
+    '/api/response-time-trend?days={days}',
+    '/api/response-time-analysis?start_date={start}&end_date={end}',
+    '/api/sentiment-overview?start_date={start}&end_date={end}',
+    '/api/activity-data?start_date={start}&end_date={end}',
+    '/api/recent-communications?start_date={start}&end_date={end}',
+    '/api/search/messages?q=спасибо&start_date={start}&end_date={end}',
+    '/api/export/messages?format=ndjson&start_date={start}&end_date={end}',
+)
+
+
+class StatementRecorder:
+    """Собирает SELECT-запросы к messages, выполненные в любом потоке"""
+
+    def __init__(self):
+        self.statements = []
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.enabled or executemany:
+            return
+        normalized = statement.lstrip().upper()
+        if normalized.startswith(('SELECT', 'WITH')) and 'MESSAGES' in normalized:
+            with self._lock:
+                self.statements.append((statement, parameters))
+
+    def take(self):
+        with self._lock:
+            statements, self.statements = self.statements, []
+        return statements
+
+
+def scanned_relations(plan, found=None):
+    """Имена таблиц в узлах плана, которые действительно выполнялись"""
+    found = set() if found is None else found
+    if 'Relation Name' in plan and plan.get('Actual Loops', 0) > 0:
+        found.add(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        scanned_relations(child, found)
+    return found
+
+
+def explain_partitions(connection, statement, parameters, partitions):
+    """
+    Секции messages, которые прочитал запрос
+
+    EXPLAIN ANALYZE учитывает и отсечение во время выполнения (параметры
+    nested loop), которое обычный EXPLAIN не показывает
+    """
+    plan = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {statement}", parameters or {}).scalar()
+    return scanned_relations(plan[0]['Plan']) & partitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка partition pruning в эндпоинтах")
+    parser.add_argument('--days', type=int, default=7, help="Период запросов, дней до сегодня")
+    parser.add_argument('--verbose', action='store_true', help="Печатать запросы без отсечения")
+    args = parser.parse_args()
+
+    token = os.environ.get('ADMIN_TOKEN')
+    if not os.environ.get('DATABASE_URL') or not token:
+        print("Ошибка: нужны переменные DATABASE_URL и ADMIN_TOKEN")
+        sys.exit(1)
+
+    from app import app, db
+    import routes  # noqa: F401 - регистрирует эндпоинты
+    from partition_manager import is_partitioned, list_partitions
+
+    client = app.test_client()
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=args.days - 1)
+    params = {'start': start.isoformat(), 'end': end.isoformat(), 'days': args.days}
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print("Нужен PostgreSQL")
+            sys.exit(1)
+        with db.engine.connect() as connection:
+            partitioned = is_partitioned(connection)
+            partitions = {item['name'] for item in list_partitions(connection)} if partitioned else set()
+
+        if partitioned:
+            print(f"Секций messages: {len(partitions)}, период {start} .. {end}")
+        else:
+            print("messages не секционирована, отсечение не проверяется")
+
+        recorder = StatementRecorder()
+        event.listen(db.engine, 'before_cursor_execute', recorder)
+
+        print(f"\n{'эндпоинт':<40}{'мс':>8}{'запросов':>10}{'секций':>10}  итог")
+        failures = 0
+        try:
+            for template in ENDPOINTS:
+                url = template.format(**params)
+                recorder.enabled = True
+                started = time.perf_counter()
+                response = client.get(url, headers={'X-Admin-Token': token})
+                response.get_data()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                recorder.enabled = False
+                statements = recorder.take()
+
+                path = url.split('?')[0]
+                if response.status_code != 200:
+                    print(f"{path:<40}{elapsed_ms:>8.0f}{'':>10}{'':>10}  HTTP {response.status_code}")
+                    failures += 1
+                    continue
+                if not partitioned:
+                    print(f"{path:<40}{elapsed_ms:>8.0f}{len(statements):>10}")
+                    continue
+
+                widest = 0
+                unpruned = []
+                with db.engine.connect() as connection:
+                    for statement, parameters in statements:
+                        scanned = explain_partitions(connection, statement, parameters, partitions)
+                        widest = max(widest, len(scanned))
+                        if len(scanned) == len(partitions):
+                            unpruned.append(statement)
+                        elif args.verbose and len(scanned) > 1:
+                            print(f"    {len(scanned)} секций: {' '.join(statement.split())[:200]}")
+
+                verdict = f"без отсечения: {len(unpruned)}" if unpruned else "ok"
+                failures += bool(unpruned)
+                print(f"{path:<40}{elapsed_ms:>8.0f}{len(statements):>10}{f'{widest}/{len(partitions)}':>10}  {verdict}")
+                if args.verbose:
+                    for statement in unpruned:
+                        print(f"    {' '.join(statement.split())[:300]}")
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', recorder)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк HTTP-клиента SentimentAnalyzer на локальном mock-сервере
+
+Поднимает на 127.0.0.1 сервер, отвечающий как OpenRouter chat/completions
+(с задержкой --delay), и сравнивает время одного вызова _call_openrouter_api:
+- "новая сессия": сессия закрывается после каждого вызова, как было раньше,
+  каждый запрос заново открывает TCP (и TLS) соединение;
+- "постоянная сессия": одна сессия с пулом keep-alive соединений.
+
+С --tls сервер работает по HTTPS с самоподписанным сертификатом (нужен
+openssl), что ближе к реальному API: установка TLS - основная часть
+накладных расходов. Печатает среднее, p50 и p95 в миллисекундах и сколько
+TCP-соединений принял сервер.
+
+Пример:
+    python benchmark_sentiment_http.py --requests 200 --concurrency 10 --tls
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def make_certificate(directory):
+    """Самоподписанный сертификат для 127.0.0.1 (cert, key)"""
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+         '-keyout', key, '-out', cert],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+async def start_mock_server(delay, ssl_context):
+    """Mock chat/completions; возвращает (runner, base_url, множество соединений)"""
+    from aiohttp import web
+
+    connections = set()
+    reply = '{"score": 0.5, "label": "positive", "confidence": 0.9}'
+
+    async def completions(request):
+        connections.add(request.transport.get_extra_info('peername'))
+        await request.json()
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        return web.json_response({"choices": [{"message": {"content": reply}}]})
+
+    app = web.Application()
+    app.router.add_post('/api/v1/chat/completions', completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0, ssl_context=ssl_context)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    scheme = 'https' if ssl_context else 'http'
+    return runner, f"{scheme}://127.0.0.1:{port}/api/v1", connections
+
+
+async def run_mode(analyzer, requests, concurrency, persistent):
+    """Задержки вызовов в миллисекундах"""
+    from sentiment_analyzer import SentimentAnalyzer
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call():
+        client = analyzer
+        if not persistent:
+            # Как раньше: своя сессия на каждый запрос
+            client = SentimentAnalyzer()
+            client.base_url = analyzer.base_url
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client._call_openrouter_api("Benchmark prompt")
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not persistent:
+                await client.close()
+        if response is None:
+            raise RuntimeError("mock server returned an error")
+
+    await asyncio.gather(*(call() for _ in range(requests)))
+    return latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def benchmark(args, ssl_context):
+    from sentiment_analyzer import SentimentAnalyzer
+
+    runner, base_url, connections = await start_mock_server(args.delay, ssl_context)
+    try:
+        print(f"Mock-сервер {base_url}, задержка {args.delay} мс, {args.requests} запросов, "
+              f"параллельно {args.concurrency}\n")
+        print(f"{'режим':<22}{'сред мс':>9}{'p50':>8}{'p95':>8}{'соединений':>12}{'всего с':>9}")
+
+        for title, persistent in (("новая сессия", False), ("постоянная сессия", True)):
+            analyzer = SentimentAnalyzer()
+            analyzer.base_url = base_url
+            # Прогрев: DNS, импорт, первый handshake не входят в замер
+            await analyzer._call_openrouter_api("warm up")
+            await analyzer.close()
+            connections.clear()
+
+            started = time.perf_counter()
+            latencies = await run_mode(analyzer, args.requests, args.concurrency, persistent)
+            total = time.perf_counter() - started
+            await analyzer.close()
+
+            print(f"{title:<22}{statistics.mean(latencies):>9.2f}{percentile(latencies, 0.5):>8.2f}"
+                  f"{percentile(latencies, 0.95):>8.2f}{len(connections):>12}{total:>9.2f}")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк HTTP-сессии SentimentAnalyzer")
+    parser.add_argument('--requests', type=int, default=200, help="Запросов в каждом режиме")
+    parser.add_argument('--concurrency', type=int, default=1, help="Одновременных запросов")
+    parser.add_argument('--delay', type=float, default=0, help="Задержка ответа сервера, мс")
+    parser.add_argument('--tls', action='store_true', help="HTTPS с самоподписанным сертификатом")
+    args = parser.parse_args()
+
+    # Ключ нужен только для заголовка, запросы уходят на mock-сервер
+    os.environ.setdefault('OPENROUTER_API_KEY', 'benchmark')
+
+    directory = tempfile.mkdtemp()
+    try:
+        ssl_context = None
+        if args.tls:
+            if not shutil.which('openssl'):
+                print("Ошибка: для --tls нужен openssl")
+                sys.exit(1)
+            cert, key = make_certificate(directory)
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(cert, key)
+            # Клиент проверяет сертификат по хранилищу по умолчанию:
+            # переменная должна быть задана до импорта aiohttp
+            os.environ['SSL_CERT_FILE'] = cert
+
+        asyncio.run(benchmark(args, ssl_context))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк SentimentPipeline на mock-сервере с ограничением частоты
+
+Поднимает на 127.0.0.1 сервер, отвечающий как OpenRouter chat/completions
+(в том числе на пакетные запросы), который пропускает не больше --server-rpm
+запросов в минуту (с запасом на --server-burst секунд), отвечает 429 с
+Retry-After сверх лимита и 500 на доле --error-rate запросов. Сравнивает:
+- "gather без лимитов": все пакеты разом через asyncio.gather, без
+  ограничения частоты и параллельности (как раньше в analyze_batch);
+- "pipeline": SentimentPipeline с RateLimiter под лимит сервера,
+  ограничением параллельности и повторной постановкой неудачных сообщений.
+
+Печатает время, сообщений в секунду, запросы к серверу, ответы 429/500 и
+сколько сообщений осталось без результата.
+
+Пример:
+    python benchmark_sentiment_pipeline.py --messages 2000 --server-rpm 1200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+
+
+class ThrottlingServer:
+    """Mock OpenRouter с серверным token bucket"""
+
+    def __init__(self, rpm, burst_seconds, error_rate, delay_ms):
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.error_rate = error_rate
+        self.delay = delay_ms / 1000
+        self.random = random.Random(42)
+        self.counters = {"requests": 0, "throttled": 0, "errors": 0}
+
+    def reset(self):
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.counters = {key: 0 for key in self.counters}
+
+    def take(self):
+        """None если запрос пропущен, иначе секунды до следующего свободного места"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate
+
+    async def completions(self, request):
+        from aiohttp import web
+
+        self.counters["requests"] += 1
+        payload = await request.json()
+        wait = self.take()
+        if wait is not None:
+            self.counters["throttled"] += 1
+            return web.json_response({"error": {"message": "Rate limit exceeded"}}, status=429,
+                                     headers={"Retry-After": str(max(1, math.ceil(wait)))})
+        if self.random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            return web.json_response({"error": {"message": "Upstream error"}}, status=500)
+
+        await asyncio.sleep(self.delay)
+        prompt = payload["messages"][0]["content"]
+        ids = [json.loads(line)["id"] for line in prompt.splitlines() if line.startswith('{"id"')]
+        if ids:
+            content = json.dumps([{"id": item_id, "score": 0.4, "label": "positive", "confidence": 0.8}
+                                  for item_id in ids])
+        else:
+            content = '{"score": 0.4, "label": "positive", "confidence": 0.8}'
+        usage = {"total_tokens": len(prompt) // 3 + 40 * max(1, len(ids))}
+        return web.json_response({"choices": [{"message": {"content": content}}], "usage": usage})
+
+
+async def start_server(server):
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_post('/api/v1/chat/completions', server.completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/v1"
+
+
+async def run_gather(analyzer, texts):
+    """Как раньше: все пакеты одновременно, без лимитов"""
+    from sentiment_pipeline import RateLimiter
+
+    await analyzer.get_session()
+    analyzer.rate_limiter = RateLimiter(0, 0)
+    analyzer._semaphore = asyncio.Semaphore(len(texts) + 1)
+
+    size = analyzer.batch_size
+    chunks = [texts[start:start + size] for start in range(0, len(texts), size)]
+    results = await asyncio.gather(*(analyzer.analyze_batch(chunk) for chunk in chunks))
+    return sum(result is None for chunk in results for result in chunk)
+
+
+async def run_pipeline(analyzer, texts, args):
+    """SentimentPipeline с лимитами под сервер"""
+    from sentiment_pipeline import RateLimiter, SentimentPipeline
+
+    await analyzer.get_session()
+    analyzer.rate_limiter = RateLimiter(args.server_rpm, 0, args.server_burst)
+    analyzer._semaphore = asyncio.Semaphore(args.concurrency)
+
+    pipeline = SentimentPipeline(analyzer, concurrency=args.concurrency)
+    failed = await pipeline.run(list(enumerate(texts)), lambda results: None)
+    return len(failed)
+
+
+async def benchmark(args):
+    from sentiment_analyzer import SentimentAnalyzer
+
+    server = ThrottlingServer(args.server_rpm, args.server_burst, args.error_rate, args.delay)
+    runner, base_url = await start_server(server)
+    texts = [f"Сообщение клиента номер {n}, когда будет готово?" for n in range(args.messages)]
+    try:
+        print(f"Сервер: {args.server_rpm} запросов/мин (запас {args.server_burst} с), ошибок "
+              f"{args.error_rate:.0%}; {args.messages} сообщений, пакет {args.batch_size}\n")
+        print(f"{'режим':<22}{'с':>8}{'сообщ/с':>10}{'запросов':>10}{'429':>7}{'500':>7}{'без результата':>16}")
+
+        for title, mode in (("gather без лимитов", "gather"), ("pipeline", "pipeline")):
+            analyzer = SentimentAnalyzer()
+            analyzer.base_url = base_url
+            analyzer.batch_size = args.batch_size
+            server.reset()
+
+            started = time.perf_counter()
+            if mode == "gather":
+                failed = await run_gather(analyzer, texts)
+            else:
+                failed = await run_pipeline(analyzer, texts, args)
+            elapsed = time.perf_counter() - started
+            await analyzer.close()
+
+            done = args.messages - failed
+            print(f"{title:<22}{elapsed:>8.1f}{done / elapsed:>10.1f}{server.counters['requests']:>10}"
+                  f"{server.counters['throttled']:>7}{server.counters['errors']:>7}{failed:>16}")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк SentimentPipeline с 429 от сервера")
+    parser.add_argument('--messages', type=int, default=2000, help="Сообщений для анализа")
+    parser.add_argument('--batch-size', type=int, default=10, help="Сообщений в одном запросе")
+    parser.add_argument('--concurrency', type=int, default=4, help="Параллельность pipeline")
+    parser.add_argument('--server-rpm', type=float, default=1200, help="Лимит сервера, запросов в минуту")
+    parser.add_argument('--server-burst', type=float, default=1, help="Запас лимита сервера, секунд")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Доля ответов 500")
+    parser.add_argument('--delay', type=float, default=20, help="Время ответа сервера, мс")
+    parser.add_argument('--verbose', action='store_true', help="Печатать повторы и ошибки анализатора")
+    args = parser.parse_args()
+
+    # Ключ нужен только для заголовка, запросы уходят на mock-сервер
+    os.environ.setdefault('OPENROUTER_API_KEY', 'benchmark')
+    if args.verbose:
+        logging.basicConfig(level=logging.WARNING)
+    else:
+        logging.disable(logging.ERROR)
+
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
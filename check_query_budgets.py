@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Проверка бюджетов SQL-запросов эндпоинтов (регрессия к N+1)
+
+Создает в базе синтетические чаты (у каждого клиент, сотрудник, сообщения за
+последние часы и строки kpi_live), вызывает эндпоинты через тестовый клиент
+Flask и считает их запросы (query_metrics.query_budget, включая потоки
+пула). Затем добавляет столько же чатов и вызывает эндпоинты снова.
+Завершается с кодом 1, если эндпоинт:
+- выполнил больше запросов, чем его бюджет (плюс допуск на каждый чат);
+- на каждый добавленный чат выполняет больше запросов, чем ему разрешено
+  (у большинства эндпоинтов - ни одного).
+
+Нужен PostgreSQL с примененными миграциями (python migrate.py) и токен
+администратора (ADMIN_TOKEN или api.admin_token в config.yaml). Данные
+набора удаляются после проверки.
+
+Пример:
+    DATABASE_URL=... python check_query_budgets.py --chats 10
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+CHECK_CHAT_BASE = -1009999980000
+CHECK_USER_BASE = 9100000000
+MAX_CHATS = 1000
+
+# (адрес, бюджет запросов, допустимые запросы на каждый чат)
+ENDPOINT_BUDGETS = [
+    ('/dashboard-data', 8, 0),
+    ('/api/chats-management', 3, 0),
+    ('/api/team-members', 4, 0),
+    ('/api/filter-options', 3, 0),
+    ('/api/users/search?q=budget', 2, 0),
+    # Известный долг: KpiCalculator и ResponseTimeAnalyzer считают каждый чат отдельно
+    ('/api/filtered-dashboard-data', 8, 5),
+    ('/api/response-time-analysis', 2, 1),
+    ('/api/dashboard-bundle', 10, 6),
+]
+
+
+def seed_chats(db, first, count):
+    """Добавляет чаты first..first+count-1: клиент, сотрудник, 20 сообщений и KPI у каждого"""
+    now = datetime.utcnow()
+    params = {"base": CHECK_CHAT_BASE, "user_base": CHECK_USER_BASE, "first": first,
+              "last": first + count - 1, "now": now}
+    db.session.execute(text(
+        "INSERT INTO chats (id, title, chat_type, is_active, created_at, updated_at) "
+        "SELECT :base - n, 'Budget check ' || n, 'supergroup', true, :now, :now "
+        "FROM generate_series(:first, :last) AS n"
+    ), params)
+    db.session.execute(text(
+        "INSERT INTO team_members (user_id, username, full_name, is_active, is_linked, created_at, updated_at) "
+        "SELECT :user_base + 2 * n + 1, 'budget_team' || n, 'Budget Team ' || n, true, true, :now, :now "
+        "FROM generate_series(:first, :last) AS n"
+    ), params)
+
+    # Клиент и сотрудник чередуются каждые 5 минут за последние 100 минут
+    db.session.execute(text(
+        "INSERT INTO messages (message_id, chat_id, user_id, username, full_name, text, message_type, "
+        "is_team_member, timestamp, created_at, response_time_seconds, is_answered, "
+        "processed_for_sentiment, sentiment_label, sentiment_score) "
+        "SELECT m, :base - n, :user_base + 2 * n + m % 2, "
+        "CASE WHEN m % 2 = 1 THEN 'budget_team' ELSE 'budget_client' END || n, "
+        "CASE WHEN m % 2 = 1 THEN 'Budget Team ' ELSE 'Budget Client ' END || n, "
+        "'Сообщение ' || m, 'text', m % 2 = 1, :now - (20 - m) * interval '5 minutes', :now, "
+        "CASE WHEN m % 2 = 1 THEN 300 END, m % 2 = 0, true, 'neutral', 0 "
+        "FROM generate_series(:first, :last) AS n, generate_series(0, 19) AS m"
+    ), params)
+
+    db.session.execute(text(
+        "INSERT INTO kpi_live (chat_id, calculated_at, period_start, period_end, needs_attention, "
+        "total_messages, client_messages, team_messages) "
+        "SELECT :base - n, :now, :now - interval '1 day', :now, n % 2 = 0, 20, 10, 10 "
+        "FROM generate_series(:first, :last) AS n"
+    ), params)
+    db.session.commit()
+
+
+def cleanup(db):
+    """Удаляет набор данных"""
+    params = {"low": CHECK_CHAT_BASE - MAX_CHATS, "high": CHECK_CHAT_BASE,
+              "user_low": CHECK_USER_BASE, "user_high": CHECK_USER_BASE + 2 * MAX_CHATS}
+    db.session.execute(text("DELETE FROM kpi_live WHERE chat_id BETWEEN :low AND :high"), params)
+    db.session.execute(text("DELETE FROM messages WHERE chat_id BETWEEN :low AND :high"), params)
+    db.session.execute(text("DELETE FROM chats WHERE id BETWEEN :low AND :high"), params)
+    db.session.execute(text("DELETE FROM team_members WHERE user_id BETWEEN :user_low AND :user_high"), params)
+    db.session.execute(text("DELETE FROM users WHERE user_id BETWEEN :user_low AND :user_high"), params)
+    db.session.commit()
+
+
+def measure(client, headers):
+    """Число запросов каждого эндпоинта (без общих кешей результатов)"""
+    from json_response import response_cache
+    from query_metrics import query_budget
+
+    counts = {}
+    for url, _, _ in ENDPOINT_BUDGETS:
+        response_cache.clear()
+        with query_budget(sys.maxsize) as stats:
+            response = client.get(url, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} вернул {response.status_code}")
+        counts[url] = stats.count
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка бюджетов SQL-запросов эндпоинтов")
+    parser.add_argument('--chats', type=int, default=10, help="Чатов в наборе (затем добавляется столько же)")
+    parser.add_argument('--keep', action='store_true', help="Не удалять синтетические данные")
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print("Ошибка: нужна переменная DATABASE_URL")
+        sys.exit(1)
+    if not 0 < args.chats <= MAX_CHATS // 2:
+        print(f"Ошибка: --chats от 1 до {MAX_CHATS // 2}")
+        sys.exit(1)
+
+    from app import app, db
+    import routes
+    from models import Chat
+    from request_coalescer import request_coalescer
+
+    token = os.getenv("ADMIN_TOKEN") or routes.config_manager.get_api_config().get("admin_token")
+    if not token:
+        print("Ошибка: не задан токен администратора")
+        sys.exit(1)
+    headers = {'X-Admin-Token': token}
+    # Результаты, общие для одинаковых запросов, скрыли бы запросы второго замера
+    request_coalescer.enabled = False
+
+    failures = 0
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print("Нужен PostgreSQL")
+            sys.exit(1)
+
+        print(f"Создание набора данных ({args.chats} чатов)...")
+        cleanup(db)
+        try:
+            client = app.test_client()
+            seed_chats(db, 0, args.chats)
+            before = measure(client, headers)
+            seed_chats(db, args.chats, args.chats)
+            after = measure(client, headers)
+            active_chats = Chat.query.filter_by(is_active=True).count()
+        finally:
+            if not args.keep:
+                cleanup(db)
+
+    print(f"\n{'эндпоинт':<32}{'запросы':>10}{'на чат':>9}{'бюджет':>9}  итог")
+    for url, budget, per_chat in ENDPOINT_BUDGETS:
+        growth = (after[url] - before[url]) / args.chats
+        limit = budget + per_chat * active_chats
+        problems = []
+        if after[url] > limit:
+            problems.append(f"больше бюджета {limit}")
+        if growth > per_chat:
+            problems.append(f"растет на {growth:g} запроса на чат, допустимо {per_chat}")
+        failures += bool(problems)
+        print(f"{url:<32}{after[url]:>10}{growth:>9g}{limit:>9}  {'; '.join(problems) or 'ok'}")
+
+    if failures:
+        print(f"\nБюджет превышен у {failures} эндпоинтов")
+        sys.exit(1)
+    print("\nВсе эндпоинты в бюджете")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Проверка планов горячих запросов (регрессия к последовательному чтению)
+
+Создает в базе синтетический набор данных (сотни тысяч сообщений и строки
+kpi_live в отдельных чатах), выполняет EXPLAIN для запросов, повторяющих
+горячие места кода, и завершается с кодом 1, если какой-либо из них читает
+messages или kpi_live последовательным сканированием (Seq Scan). Индексы
+под эти запросы - migrations/007_query_shape_indexes.sql.
+
+Нужен PostgreSQL с примененными миграциями (python migrate.py). Данные
+набора удаляются после проверки.
+
+Пример:
+    DATABASE_URL=... python check_query_plans.py --rows 300000
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc, func, select, text
+
+CHECK_CHAT_BASE = -1009999990000
+CHECK_USER_BASE = 9000000000
+CHECK_CHATS = 20
+LARGE_TABLES = ('messages', 'kpi_live')
+
+
+def seed_fixture(db, rows):
+    """Создает чаты, сообщения и KPI набора данных"""
+    cleanup(db)
+    now = datetime.utcnow()
+    db.session.execute(text(
+        "INSERT INTO chats (id, title, chat_type, is_active, created_at, updated_at) "
+        "SELECT :base - n, 'Plan check ' || n, 'supergroup', false, :now, :now "
+        "FROM generate_series(0, :chats - 1) AS n"
+    ), {"base": CHECK_CHAT_BASE, "chats": CHECK_CHATS, "now": now})
+
+    # 90 дней истории; каждое третье сообщение - ответ сотрудника, 2% сообщений
+    # клиентов без ответа, тональность не посчитана у самых новых 0.5%
+    db.session.execute(text(
+        "INSERT INTO messages (message_id, chat_id, user_id, username, full_name, text, message_type, "
+        "is_team_member, timestamp, created_at, response_time_seconds, is_answered, "
+        "processed_for_sentiment, sentiment_label, sentiment_score) "
+        "SELECT n, :base - n % :chats, :user_base + n % 50, 'plan' || n % 50, 'Plan User ' || n % 50, "
+        "'Сообщение ' || n, 'text', n % 3 = 0, "
+        ":start + n * (interval '90 days' / :rows), :now, "
+        "CASE WHEN n % 3 = 0 OR n % 50 <> 0 THEN 30 + n % 3600 END, n % 3 <> 0 AND n % 50 <> 0, "
+        "n < :rows * 0.995, 'neutral', 0 "
+        "FROM generate_series(1, :rows) AS n"
+    ), {"base": CHECK_CHAT_BASE, "chats": CHECK_CHATS, "user_base": CHECK_USER_BASE,
+        "start": now - timedelta(days=90), "now": now, "rows": rows})
+
+    # Расчет KPI каждые 5 минут за неделю, внимание нужно в 5% расчетов
+    db.session.execute(text(
+        "INSERT INTO kpi_live (chat_id, calculated_at, period_start, period_end, needs_attention, "
+        "total_messages, client_messages, team_messages) "
+        "SELECT :base - n % :chats, :now - (n / :chats) * interval '5 minutes', "
+        ":now - interval '1 day', :now, n % 20 = 0, 0, 0, 0 "
+        "FROM generate_series(0, :chats * 2016 - 1) AS n"
+    ), {"base": CHECK_CHAT_BASE, "chats": CHECK_CHATS, "now": now})
+    db.session.commit()
+
+    # Как после autovacuum: статистика и карта видимости (index-only scan)
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("VACUUM ANALYZE messages")
+        connection.exec_driver_sql("VACUUM ANALYZE kpi_live")
+
+
+def cleanup(db):
+    """Удаляет набор данных"""
+    params = {"low": CHECK_CHAT_BASE - CHECK_CHATS, "high": CHECK_CHAT_BASE, "user_base": CHECK_USER_BASE}
+    db.session.execute(text("DELETE FROM kpi_live WHERE chat_id BETWEEN :low AND :high"), params)
+    db.session.execute(text("DELETE FROM messages WHERE chat_id BETWEEN :low AND :high"), params)
+    db.session.execute(text("DELETE FROM chats WHERE id BETWEEN :low AND :high"), params)
+    db.session.execute(text("DELETE FROM users WHERE user_id BETWEEN :user_base AND :user_base + 49"), params)
+    db.session.commit()
+
+
+def hot_queries(now):
+    """Запросы (имя, место в коде, select), повторяющие горячие места"""
+    from models import KpiLive, Message
+    from timezone_utils import local_date
+
+    chat_id = CHECK_CHAT_BASE - 1
+    day_ago = now - timedelta(hours=24)
+    week_ago = now - timedelta(days=7)
+    # sentiment_queue._pending(), SentimentBatchAnalyzer.backfill
+    sentiment_pending = [
+        Message.processed_for_sentiment == False,
+        Message.is_team_member == False,
+        Message.text.isnot(None),
+        Message.text != ""
+    ]
+
+    return [
+        ("unanswered_lookup", "worker.calculate_response_time",
+         select(Message.id, Message.timestamp).where(
+             Message.chat_id == chat_id,
+             Message.is_team_member == False,
+             Message.timestamp < now,
+             Message.is_answered == False
+         ).order_by(desc(Message.timestamp)).limit(1)),
+        ("unanswered_count", "KpiCalculator._calculate_unanswered_messages",
+         select(func.count()).select_from(Message).where(
+             Message.chat_id == chat_id,
+             Message.timestamp >= day_ago,
+             Message.timestamp <= now - timedelta(minutes=60),
+             Message.is_team_member == False,
+             Message.is_answered == False
+         )),
+        ("sentiment_queue_attention", "sentiment_queue.fetch_prioritized",
+         select(Message.id, Message.text).where(
+             *sentiment_pending,
+             Message.timestamp >= day_ago,
+             Message.chat_id.in_([chat_id, chat_id - 1])
+         ).order_by(desc(Message.timestamp)).limit(72)),
+        ("sentiment_queue_recent", "sentiment_queue.fetch_prioritized",
+         select(Message.id, Message.text).where(
+             *sentiment_pending,
+             Message.timestamp >= day_ago,
+             Message.chat_id.notin_([chat_id, chat_id - 1])
+         ).order_by(desc(Message.timestamp)).limit(72)),
+        ("sentiment_queue_backlog", "sentiment_queue.fetch_prioritized",
+         select(Message.id, Message.text).where(
+             *sentiment_pending,
+             Message.timestamp < day_ago
+         ).order_by(desc(Message.timestamp)).limit(8)),
+        ("sentiment_backfill_page", "SentimentBatchAnalyzer.backfill",
+         select(Message.id, Message.text).where(
+             Message.id > 1000,
+             *sentiment_pending
+         ).order_by(Message.id).limit(1000)),
+        ("recent_sentiment_backfill", "SentimentBatchAnalyzer.analyze_recent_messages",
+         select(Message.id, Message.text).where(
+             Message.id > 1000,
+             *sentiment_pending,
+             Message.timestamp >= day_ago
+         ).order_by(Message.id).limit(1000)),
+        ("chat_response_times", "KpiCalculator._calculate_response_times",
+         select(Message.response_time_seconds).where(
+             Message.chat_id == chat_id,
+             Message.timestamp >= day_ago,
+             Message.timestamp <= now,
+             Message.response_time_seconds.isnot(None),
+             Message.response_time_seconds > 0
+         )),
+        ("member_response_times", "ResponseTimeAnalyzer (время ответа сотрудника)",
+         select(Message.response_time_seconds).where(
+             Message.chat_id == chat_id,
+             Message.user_id == CHECK_USER_BASE,
+             Message.is_team_member == True,
+             Message.timestamp >= week_ago,
+             Message.timestamp <= now,
+             Message.response_time_seconds.isnot(None),
+             Message.response_time_seconds > 0
+         )),
+        ("response_time_trend", "routes.build_response_time_trend",
+         select(
+             local_date(Message.timestamp).label('date'),
+             func.avg(Message.response_time_seconds),
+             func.count(Message.id)
+         ).where(
+             Message.timestamp >= week_ago,
+             Message.timestamp <= now,
+             Message.response_time_seconds.isnot(None),
+             Message.response_time_seconds > 0
+         ).group_by('date').order_by('date')),
+        ("kpi_latest_per_chat", "worker.calculate_chat_kpis",
+         select(KpiLive.needs_attention).where(
+             KpiLive.chat_id == chat_id
+         ).order_by(desc(KpiLive.calculated_at)).limit(1)),
+        ("kpi_attention", "routes.get_chats_needing_attention",
+         select(KpiLive.id, KpiLive.chat_id).where(
+             KpiLive.needs_attention == True
+         ).order_by(desc(KpiLive.calculated_at)).limit(20)),
+    ]
+
+
+def plan_nodes(plan):
+    """Все узлы плана"""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def is_large_table(relation):
+    """messages, kpi_live или секция messages"""
+    return relation in LARGE_TABLES or relation.startswith(('messages_p', 'messages_default'))
+
+
+def explain(connection, statement, options="FORMAT JSON"):
+    """Результат EXPLAIN запроса с параметрами драйвера"""
+    # render_postcompile: IN (...) по списку раскрывается в отдельные параметры
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    return connection.exec_driver_sql(f"EXPLAIN ({options}) {compiled}", compiled.params).scalars().all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка планов горячих запросов")
+    parser.add_argument('--rows', type=int, default=300000, help="Количество синтетических сообщений")
+    parser.add_argument('--no-seed', action='store_true', help="Проверять на существующих данных")
+    parser.add_argument('--keep', action='store_true', help="Не удалять синтетические данные")
+    parser.add_argument('--verbose', action='store_true', help="Печатать планы целиком")
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print("Ошибка: нужна переменная DATABASE_URL")
+        sys.exit(1)
+
+    from app import app, db
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print("Нужен PostgreSQL")
+            sys.exit(1)
+
+        if not args.no_seed:
+            print(f"Создание набора данных ({args.rows} сообщений)...")
+            seed_fixture(db, args.rows)
+
+        regressions = 0
+        try:
+            with db.engine.connect() as connection:
+                print(f"\n{'запрос':<28}{'итог':<8}узлы")
+                for name, source, statement in hot_queries(datetime.utcnow()):
+                    plan = explain(connection, statement)[0][0]['Plan']
+                    scans = []
+                    failed = False
+                    for node in plan_nodes(plan):
+                        if node['Node Type'] == 'Bitmap Index Scan':
+                            scans.append(f"Bitmap Index Scan({node['Index Name']})")
+                            continue
+                        relation = node.get('Relation Name')
+                        if not relation or not is_large_table(relation) or node['Node Type'] == 'Bitmap Heap Scan':
+                            continue
+                        scans.append(f"{node['Node Type']}({node.get('Index Name', relation)})")
+                        failed = failed or node['Node Type'] == 'Seq Scan'
+
+                    regressions += failed
+                    print(f"{name:<28}{'SEQ' if failed else 'ok':<8}{', '.join(scans)}")
+                    if failed or args.verbose:
+                        print(f"    {source}")
+                        for line in explain(connection, statement, "FORMAT TEXT"):
+                            print(f"    {line}")
+        finally:
+            if not args.no_seed and not args.keep:
+                cleanup(db)
+
+    if regressions:
+        print(f"\nПоследовательное чтение в {regressions} запросах")
+        sys.exit(1)
+    print("\nВсе запросы используют индексы")
+
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,10 @@ class ConfigManager:
         """Get agency name"""
         return self._config.get("agency", {}).get("name", "Customer Service Agency")
     
+    def get_agency_timezone(self) -> str:
+        """Get agency timezone name"""
+        return self._config.get("agency", {}).get("timezone", "Europe/Moscow")
+    
     def get_team_members(self) -> Dict[int, Dict]:
         """Get team members configuration"""
         return self._config.get("team_members", {})
@@ -81,6 +85,10 @@ class ConfigManager:
         """Get API configuration"""
         return self._config.get("api", {})
     
+    def get_performance_config(self) -> Dict:
+        """Get performance configuration"""
+        return self._config.get("performance", {})
+    
     def update_team_members(self, team_members: Dict):
         """Update team members configuration"""
         try:
@@ -133,6 +141,7 @@ class ConfigManager:
         return {
             "TELEGRAM_BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN", ""),
             "DATABASE_URL": os.getenv("DATABASE_URL", ""),
+            "DATABASE_READ_URL": os.getenv("DATABASE_READ_URL", ""),
             "REDIS_URL": os.getenv("REDIS_URL", "redis://localhost:6379"),
             "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY", ""),
             "ADMIN_TOKEN": os.getenv("ADMIN_TOKEN", "admin-secret-token"),
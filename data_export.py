@@ -0,0 +1,152 @@
+"""
+Streaming export of messages and KPI history
+
+Rows are read through a server-side cursor (yield_per) and serialized as
+NDJSON or CSV in fixed-size chunks, optionally gzip-compressed, so memory
+use stays flat regardless of how many rows an export contains.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator, List, Sequence
+
+from sqlalchemy import JSON, select
+
+from models import Chat, KpiLive, Message
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+MESSAGE_EXPORT_COLUMNS = [column for column in Message.__table__.columns] + [Chat.title.label('chat_title')]
+KPI_EXPORT_COLUMNS = [column for column in KpiLive.__table__.columns]
+
+MESSAGE_EXPORT_FIELDS = [column.name for column in MESSAGE_EXPORT_COLUMNS]
+KPI_EXPORT_FIELDS = [column.name for column in KPI_EXPORT_COLUMNS]
+
+
+def build_messages_export_query(filters: Sequence) -> Any:
+    """Select message rows (with chat title) matching the filters, in id order"""
+    return select(*MESSAGE_EXPORT_COLUMNS).join(Chat, Chat.id == Message.chat_id) \
+        .where(*filters).order_by(Message.id)
+
+
+def build_kpis_export_query(filters: Sequence) -> Any:
+    """Select KPI history rows matching the filters, in calculation order"""
+    return select(*KPI_EXPORT_COLUMNS).where(*filters).order_by(KpiLive.calculated_at, KpiLive.id)
+
+
+def stream_rows(session, query, yield_per: int = 2000) -> Iterator[tuple]:
+    """
+    Iterate over query rows using a server-side cursor
+
+    With yield_per the driver fetches rows in batches (a named cursor on
+    PostgreSQL) instead of buffering the whole result set in memory.
+    """
+    result = session.execute(query.execution_options(yield_per=yield_per))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize values json does not know (dates) in ISO format"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_ndjson(rows: Iterable[tuple], columns: List[str]) -> Iterator[str]:
+    """Serialize rows as newline-delimited JSON"""
+    encoder = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def iter_csv(rows: Iterable[tuple], columns: List[str], json_indexes: Sequence[int] = ()) -> Iterator[str]:
+    """
+    Serialize rows as CSV with a header line
+
+    Values of the columns at json_indexes (JSON columns) are written as JSON text.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    for row in rows:
+        if json_indexes:
+            row = list(row)
+            for index in json_indexes:
+                if row[index] is not None:
+                    row[index] = json.dumps(row[index], ensure_ascii=False)
+        writer.writerow(row)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def chunked(pieces: Iterable[str], chunk_size: int = 65536) -> Iterator[bytes]:
+    """Join small serialized pieces into chunks of roughly chunk_size bytes"""
+    parts = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a chunk stream into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(session, query, columns: List[str], export_format: str = 'ndjson',
+                  compress: bool = False, yield_per: int = 2000,
+                  chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    Stream the rows of a query as encoded (and optionally gzipped) chunks
+
+    Args:
+        session: SQLAlchemy session to run the query on
+        query: Select statement (see build_*_export_query)
+        columns: Column names to export, in order
+        export_format: 'ndjson' or 'csv'
+        compress: Gzip the output
+        yield_per: Rows fetched from the server-side cursor at a time
+        chunk_size: Approximate size of the emitted chunks in bytes
+
+    Returns:
+        Iterator over response body chunks
+    """
+    rows = stream_rows(session, query, yield_per)
+    if export_format == 'csv':
+        json_indexes = [index for index, column in enumerate(query.selected_columns)
+                        if isinstance(column.type, JSON)]
+        pieces = iter_csv(rows, columns, json_indexes)
+    else:
+        pieces = iter_ndjson(rows, columns)
+
+    chunks = chunked(pieces, chunk_size)
+    return gzip_chunks(chunks) if compress else chunks
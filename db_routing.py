@@ -0,0 +1,243 @@
+"""
+Read replica routing
+
+With DATABASE_READ_URL set, the SELECTs of views decorated with
+@replica_reads (dashboard, analytics, search, exports) go to the replica.
+Everything else stays on DATABASE_URL: other views, flushes and DML, and
+any read issued after the request has written something (read-after-write).
+Management views that are re-read right after a change are deliberately
+not decorated.
+
+The replica is probed at most every read_replica.health_check_interval
+seconds. While it is unreachable, or lags more than max_lag_seconds behind,
+reads fall back to the primary; a view whose replica connection failed is
+re-run once on the primary.
+"""
+
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("read_replica", {})
+HEALTH_CHECK_INTERVAL = _config.get("health_check_interval", 5)
+MAX_LAG_SECONDS = _config.get("max_lag_seconds", 10)
+FAILOVER_COOLDOWN = _config.get("failover_cooldown", 30)
+CONNECT_TIMEOUT = _config.get("connect_timeout", 3)
+
+# Replication delay as seen by a standby; 0 when it has replayed everything received
+_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaRouter:
+    """Replica engine with health and lag state"""
+
+    def __init__(self, url: Optional[str] = None):
+        # Without a url DATABASE_READ_URL is read on first use: app.py loads .env
+        # only after importing this module
+        self._url = url or None
+        self._url_resolved = self._url is not None
+        self._engine = None
+        self._lock = threading.Lock()
+        self.available = False
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._checked_at = 0.0
+        self._down_until = 0.0
+
+    @property
+    def url(self) -> Optional[str]:
+        if not self._url_resolved:
+            self._url = os.environ.get("DATABASE_READ_URL") or None
+            self._url_resolved = True
+        return self._url
+
+    @property
+    def configured(self) -> bool:
+        return self.url is not None
+
+    @property
+    def engine(self):
+        """Replica engine, created on first use"""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    connect_args = {"connect_timeout": CONNECT_TIMEOUT} if self.url.startswith("postgresql") else {}
+                    engine = create_engine(self.url, pool_recycle=300, pool_pre_ping=True,
+                                           connect_args=connect_args)
+                    event.listen(engine, "handle_error", self._on_error)
+                    self._engine = engine
+        return self._engine
+
+    def _on_error(self, context):
+        """Engine error hook: connection failures (and recovery conflicts) take the replica out"""
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.mark_failed(context.original_exception)
+
+    def mark_failed(self, error):
+        """Route reads to the primary for the failover cooldown"""
+        with self._lock:
+            if self.available or self.last_error is None:
+                logger.warning(f"Read replica unavailable, reading from the primary: {error}")
+            self.available = False
+            self.last_error = str(error).strip().splitlines()[0] if str(error).strip() else repr(error)
+            self._down_until = time.monotonic() + FAILOVER_COOLDOWN
+            self._checked_at = time.monotonic()
+        state = get_replica_state()
+        if state is not None and state.used:
+            state.failed = True
+
+    def check(self, force: bool = False) -> bool:
+        """Probe connectivity and lag (rate limited unless forced); True if reads may use the replica"""
+        if not self.configured:
+            return False
+
+        now = time.monotonic()
+        if not force and (now - self._checked_at < HEALTH_CHECK_INTERVAL or now < self._down_until):
+            return self.available
+
+        self._checked_at = now
+        try:
+            with self.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lag = float(connection.execute(_LAG_QUERY).scalar() or 0)
+                else:
+                    connection.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            self.mark_failed(e)
+            return False
+
+        with self._lock:
+            if not self.available and self.last_error is not None:
+                logger.info("Read replica is back")
+            self.lag_seconds = round(lag, 3)
+            self.last_error = None
+            self.available = lag <= MAX_LAG_SECONDS
+        if not self.available:
+            logger.warning(f"Read replica lags {lag:.1f}s behind, reading from the primary")
+        return self.available
+
+    def engine_for_reads(self):
+        """Replica engine if healthy, else None (use the primary)"""
+        if self.check():
+            return self.engine
+        return None
+
+    def status(self) -> Dict:
+        """Replica state for /health"""
+        if not self.configured:
+            return {"configured": False}
+
+        self.check(force=True)
+        if self.last_error is not None:
+            state = "down"
+        elif not self.available:
+            state = "lagging"
+        else:
+            state = "connected"
+        return {
+            "configured": True,
+            "status": state,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": MAX_LAG_SECONDS,
+            "reads_on": "replica" if self.available else "primary",
+            "error": self.last_error
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+class ReplicaReadState:
+    """Replica routing state of one request, shared with its bundle worker threads"""
+
+    def __init__(self):
+        self.enabled = True
+        self.wrote = False
+        self.used = False
+        self.failed = False
+
+
+def get_replica_state() -> Optional[ReplicaReadState]:
+    """Replica routing state of the current request, if it is a @replica_reads view"""
+    return g.get("_replica_state") if has_app_context() else None
+
+
+def bind_replica_state(state: Optional[ReplicaReadState]):
+    """Route reads of another app context (e.g. a bundle worker thread) like the request's"""
+    g._replica_state = state
+
+
+class RoutingSession(FlaskSession):
+    """Flask-SQLAlchemy session sending reads of @replica_reads views to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        state = get_replica_state() if bind is None and replica_router.configured else None
+        if state is not None:
+            if self._flushing or getattr(clause, "is_dml", False):
+                # Anything read later in this request must see the write
+                state.wrote = True
+            elif (state.enabled and not state.wrote and isinstance(clause, (Select, CompoundSelect))
+                    and getattr(clause, "_for_update_arg", None) is None):
+                engine = replica_router.engine_for_reads()
+                if engine is not None:
+                    state.used = True
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(view):
+    """Serve a read-only view from the replica, re-running it on the primary if the replica fails"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not replica_router.configured:
+            return view(*args, **kwargs)
+
+        state = ReplicaReadState()
+        g._replica_state = state
+        error = None
+        response = None
+        try:
+            response = view(*args, **kwargs)
+        except Exception as e:
+            error = e
+
+        status = getattr(response, "status_code", None)
+        if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+            status = response[1]
+
+        # Views turn exceptions into 500 responses: on those, probe the replica
+        # to tell its failures apart from application errors
+        if state.used and not state.failed and (error is not None or (status or 200) >= 500):
+            state.failed = not replica_router.check(force=True)
+
+        if state.failed:
+            logger.warning(f"Retrying {view.__name__} on the primary after a read replica failure")
+            current_app.extensions["sqlalchemy"].session.rollback()
+            state.enabled = False
+            return view(*args, **kwargs)
+
+        if error is not None:
+            raise error
+        return response
+
+    return wrapper
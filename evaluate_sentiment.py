@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Оценка уровней анализа тональности на размеченном наборе
+
+Прогоняет набор (sentiment_eval_set.jsonl: по строке {"text", "label"}) через
+локальные правила (sentiment_rules.py) и печатает, какую долю сообщений они
+берут на себя, точность по отношению к разметке и результаты по каждому
+правилу. С --llm те же сообщения отправляются в LLM (нужен
+OPENROUTER_API_KEY): печатается согласие правил с LLM на сообщениях, которые
+правила взяли, и точность схемы "правила + LLM" против одного LLM.
+
+Пример:
+    python evaluate_sentiment.py --show-errors
+    OPENROUTER_API_KEY=... python evaluate_sentiment.py --llm
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+
+LABELS = ('positive', 'neutral', 'negative')
+DEFAULT_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentiment_eval_set.jsonl')
+
+
+def load_set(path):
+    """Размеченные примеры [(text, label)]"""
+    examples = []
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get('label') not in LABELS:
+                raise ValueError(f"{path}:{number}: метка должна быть одной из {', '.join(LABELS)}")
+            examples.append((item['text'], item['label']))
+    return examples
+
+
+def share(part, total):
+    return f"{part / total:.1%}" if total else "-"
+
+
+def print_confusion(pairs, title):
+    """Матрица ошибок: строки - разметка, столбцы - предсказание"""
+    counts = Counter(pairs)
+    print(f"\n{title}")
+    print(f"{'':<12}" + "".join(f"{label:>10}" for label in LABELS))
+    for gold in LABELS:
+        print(f"{gold:<12}" + "".join(f"{counts[(gold, predicted)]:>10}" for predicted in LABELS))
+
+
+async def llm_labels(texts):
+    """Метки LLM без правил и кэша (None при ошибке)"""
+    from sentiment_analyzer import SentimentAnalyzer
+
+    analyzer = SentimentAnalyzer()
+    try:
+        results = await asyncio.gather(*(analyzer._analyze_uncached(text) for text in texts))
+    finally:
+        await analyzer.close()
+    return [result['label'] if result else None for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка локальных правил и LLM на размеченном наборе")
+    parser.add_argument('--set', default=DEFAULT_SET, help="Размеченный набор (JSON Lines)")
+    parser.add_argument('--llm', action='store_true', help="Сравнить с LLM (нужен OPENROUTER_API_KEY)")
+    parser.add_argument('--show-errors', action='store_true', help="Печатать ошибки правил")
+    args = parser.parse_args()
+
+    from sentiment_rules import MIN_CONFIDENCE, match_rule
+
+    examples = load_set(args.set)
+    covered = []
+    by_rule = defaultdict(lambda: [0, 0])
+    for index, (text, gold) in enumerate(examples):
+        matched = match_rule(text)
+        if matched is None or matched[1]['confidence'] < MIN_CONFIDENCE:
+            continue
+        rule, result = matched
+        covered.append((index, result['label']))
+        by_rule[rule][0] += 1
+        by_rule[rule][1] += result['label'] == gold
+
+    correct = sum(label == examples[index][1] for index, label in covered)
+    print(f"Примеров: {len(examples)}")
+    print(f"Правила взяли: {len(covered)} ({share(len(covered), len(examples))}), "
+          f"в LLM уходит {len(examples) - len(covered)} ({share(len(examples) - len(covered), len(examples))})")
+    print(f"Точность правил по разметке: {correct}/{len(covered)} ({share(correct, len(covered))})")
+
+    print(f"\n{'правило':<14}{'сообщений':>10}{'верно':>8}")
+    for rule, (count, right) in sorted(by_rule.items(), key=lambda item: -item[1][0]):
+        print(f"{rule:<14}{count:>10}{share(right, count):>8}")
+    print_confusion([(examples[index][1], label) for index, label in covered], "Правила: разметка / предсказание")
+
+    if args.show_errors:
+        errors = [(examples[index][0], examples[index][1], label) for index, label in covered
+                  if label != examples[index][1]]
+        if errors:
+            print("\nОшибки правил:")
+            for text, gold, label in errors:
+                print(f"  {gold:>8} -> {label:<8} {text}")
+
+    if not args.llm:
+        return
+    if not os.environ.get('OPENROUTER_API_KEY'):
+        print("\nОшибка: для --llm нужна переменная OPENROUTER_API_KEY")
+        sys.exit(1)
+
+    print("\nЗапросы к LLM...")
+    llm = asyncio.run(llm_labels([text for text, _ in examples]))
+    answered = [index for index, label in enumerate(llm) if label is not None]
+    llm_correct = sum(llm[index] == examples[index][1] for index in answered)
+    agreement = [(label, llm[index]) for index, label in covered if llm[index] is not None]
+    agreed = sum(rule_label == llm_label for rule_label, llm_label in agreement)
+
+    rules_first = {index: label for index, label in covered}
+    tiered = [(examples[index][1], rules_first.get(index, llm[index])) for index in answered]
+    tiered_correct = sum(gold == predicted for gold, predicted in tiered)
+
+    print(f"LLM ответил на {len(answered)} из {len(examples)}")
+    print(f"Согласие правил с LLM: {agreed}/{len(agreement)} ({share(agreed, len(agreement))})")
+    print(f"Точность только LLM: {share(llm_correct, len(answered))}")
+    print(f"Точность правила + LLM: {share(tiered_correct, len(tiered))}, "
+          f"вызовов LLM меньше на {share(len(covered), len(examples))}")
+    print_confusion([(examples[index][1], llm[index]) for index in answered], "LLM: разметка / предсказание")
+
+
+if __name__ == "__main__":
+    main()
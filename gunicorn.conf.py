@@ -0,0 +1,18 @@
+"""
+Gunicorn settings, read from the working directory by `gunicorn main:app`
+
+/api/live keeps a Server-Sent Events stream open per dashboard tab. With the
+default sync worker one open tab would hold the only worker, so requests are
+served by threads: each stream holds one thread for at most
+performance.live_events.max_stream_seconds, the other requests use the rest.
+"""
+
+import os
+
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Open live streams plus concurrent ordinary requests per worker
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+# Threaded workers heartbeat independently of long requests, so streams are not killed
+timeout = 30
+keepalive = 5
@@ -0,0 +1,236 @@
+"""
+Fast JSON responses with compression
+
+Flask's JSON provider is replaced with one backed by orjson (falling back,
+with a warning at startup, to the stdlib encoder when it is not installed). Both paths emit ISO 8601 dates
+(naive datetimes are UTC) and Decimals as numbers.
+
+Large responses are compressed with brotli or gzip, whichever the client
+accepts (brotli only if the module is installed). Streamed responses
+(exports, Server-Sent Events) and files are left alone.
+
+Endpoints whose result is shared by many clients can keep the encoded body
+(and its compressed variants) in a short-lived cache and serve those bytes
+directly, skipping serialization and compression.
+"""
+
+import gzip
+import logging
+import threading
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from config_manager import ConfigManager
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_settings = ConfigManager().get_performance_config().get("responses", {})
+
+COMPRESSION_ENABLED = _settings.get("compression", True)
+COMPRESSION_MIN_SIZE = _settings.get("compression_min_size", 1024)
+GZIP_LEVEL = _settings.get("gzip_level", 6)
+BROTLI_QUALITY = _settings.get("brotli_quality", 4)
+CACHE_TTL = _settings.get("cache_ttl", 5)
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+}
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize values neither encoder knows natively"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes"""
+    if orjson is not None:
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_json_default, option=option)
+
+    import json
+    return json.dumps(obj, default=_json_default, ensure_ascii=False, sort_keys=sort_keys,
+                      indent=2 if indent else None,
+                      separators=None if indent else (",", ":")).encode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider serializing through orjson when available"""
+
+    default = staticmethod(_json_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=self.sort_keys).decode("utf-8")
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps_bytes(obj, indent=indent, sort_keys=self.sort_keys) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def negotiate_encoding() -> Optional[str]:
+    """Best compression the client accepts: 'br', 'gzip' or None"""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with the negotiated encoding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _should_compress(response) -> bool:
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+        return False
+    if "Content-Encoding" in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    return response.content_length is not None and response.content_length >= COMPRESSION_MIN_SIZE
+
+
+def init_response_compression(app):
+    """Install the fast JSON provider and register the compression hook"""
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    # Both are declared dependencies: a missing one means a broken install, not a choice
+    if orjson is None:
+        logger.warning("orjson not installed, using the standard json encoder (slower)")
+
+    if not COMPRESSION_ENABLED:
+        return
+
+    if brotli is None:
+        logger.warning("brotli not installed, compressing responses with gzip only")
+
+    @app.after_request
+    def compress_response(response):
+        response.vary.add("Accept-Encoding")
+        if not _should_compress(response):
+            return response
+
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class EncodedJSON:
+    """Serialized JSON body with lazily computed compressed variants"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_obj(cls, obj: Any) -> "EncodedJSON":
+        return cls(dumps_bytes(obj) + b"\n")
+
+    def variant(self, encoding: str) -> bytes:
+        with self._lock:
+            if encoding not in self._variants:
+                self._variants[encoding] = compress(self.body, encoding)
+            return self._variants[encoding]
+
+
+def encoded_json_response(encoded: EncodedJSON, status: int = 200):
+    """Response serving pre-encoded JSON bytes, compressed if the client accepts it"""
+    from flask import current_app
+
+    body = encoded.body
+    headers = {"Vary": "Accept-Encoding"}
+    if COMPRESSION_ENABLED and len(body) >= COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding()
+        if encoding is not None:
+            body = encoded.variant(encoding)
+            headers["Content-Encoding"] = encoding
+
+    return current_app.response_class(body, status=status, mimetype="application/json", headers=headers)
+
+
+class EncodedResponseCache:
+    """Per-process cache of encoded JSON bodies with a short TTL"""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, EncodedJSON]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: str, build: Callable[[], Any]) -> EncodedJSON:
+        """Encoded body for key, built (and encoded) only if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        encoded = EncodedJSON.from_obj(build())
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (now + self.ttl, encoded)
+        return encoded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = EncodedResponseCache()
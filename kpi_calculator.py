@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from models import Message, Chat, KpiLive
 from config_manager import ConfigManager
 from response_time_analyzer import ResponseTimeAnalyzer
+from request_memo import memoized_call
 
 logger = logging.getLogger(__name__)
 
@@ -32,13 +33,16 @@ class KpiCalculator:
         Returns:
             Dictionary with calculated KPIs
         """
+        return memoized_call(
+            session, "calculate_chat_kpis", (chat_id, start_time, end_time),
+            lambda: self._calculate_chat_kpis(session, chat_id, start_time, end_time)
+        )
+    
+    def _calculate_chat_kpis(self, session: Session, chat_id: int, start_time: datetime, end_time: datetime) -> Optional[Dict]:
+        """Calculate KPIs for a chat without memoization"""
         try:
-            # Get all messages in the period
-            messages = session.query(Message).filter(
-                Message.chat_id == chat_id,
-                Message.timestamp >= start_time,
-                Message.timestamp <= end_time
-            ).order_by(Message.timestamp).all()
+            # Get all messages in the period (shared with the response time analysis)
+            messages = self.response_analyzer.get_chat_messages(session, chat_id, start_time, end_time)
             
             if not messages:
                 return None
@@ -245,6 +249,13 @@ class KpiCalculator:
     
     def get_dashboard_summary(self, session: Session, hours: int = 24) -> Dict:
         """Get summary statistics for dashboard"""
+        return memoized_call(
+            session, "get_dashboard_summary", (hours,),
+            lambda: self._get_dashboard_summary(session, hours)
+        )
+    
+    def _get_dashboard_summary(self, session: Session, hours: int) -> Dict:
+        """Get summary statistics for dashboard without memoization"""
         try:
             end_time = datetime.utcnow()
             start_time = end_time - timedelta(hours=hours)
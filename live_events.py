@@ -0,0 +1,184 @@
+"""
+Live dashboard events over Redis pub/sub
+
+Ingest and the KPI worker publish small delta events (new message, attention
+flag change, SLA breach, sentiment results) on a Redis channel; the
+/api/live Server-Sent Events endpoint relays them to open dashboards, which
+apply them without refetching.
+
+Publishing never raises: live updates are best effort and must not break
+ingest when Redis is down.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import redis
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_settings = ConfigManager().get_performance_config().get("live_events", {})
+
+LIVE_EVENTS_ENABLED = _settings.get("enabled", True)
+LIVE_CHANNEL = _settings.get("channel", "live:dashboard")
+HEARTBEAT_INTERVAL = _settings.get("heartbeat_interval", 15)
+RECONNECT_DELAY_MS = _settings.get("reconnect_delay_ms", 3000)
+# Seconds a stream stays open; EventSource then reconnects (and the dashboard resyncs)
+MAX_STREAM_SECONDS = _settings.get("max_stream_seconds", 300)
+
+_redis_client = None
+_redis_retry_at = 0.0
+
+
+def encode_event(event_type: str, data: Dict) -> str:
+    """Serialize an event for the pub/sub channel"""
+    return json.dumps({"type": event_type, "ts": datetime.utcnow().isoformat(), **data},
+                      ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _get_redis() -> Optional[redis.Redis]:
+    """Get Redis client, backing off for a while after a failure"""
+    global _redis_client, _redis_retry_at
+
+    if _redis_client is not None:
+        return _redis_client
+
+    if time.monotonic() < _redis_retry_at:
+        return None
+
+    try:
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        client = redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        _redis_client = client
+    except redis.RedisError as e:
+        logger.warning(f"Redis unavailable for live events: {e}")
+        _redis_retry_at = time.monotonic() + 30
+
+    return _redis_client
+
+
+def publish_event(event_type: str, data: Dict) -> bool:
+    """
+    Publish an event to open dashboards
+
+    Returns:
+        True if the event was handed to Redis
+    """
+    global _redis_client, _redis_retry_at
+
+    if not LIVE_EVENTS_ENABLED:
+        return False
+
+    client = _get_redis()
+    if client is None:
+        return False
+
+    try:
+        client.publish(LIVE_CHANNEL, encode_event(event_type, data))
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish live event {event_type}: {e}")
+        _redis_client = None
+        _redis_retry_at = time.monotonic() + 30
+        return False
+
+
+def message_event(chat_id: int, user_id: int, is_team_member: bool,
+                  text: Optional[str], timestamp: datetime) -> Dict:
+    """Payload of a 'message' event (a new message was stored)"""
+    return {
+        "chat_id": chat_id,
+        "user_id": user_id,
+        "is_team_member": bool(is_team_member),
+        "length": len(text or ""),
+        "timestamp": timestamp.isoformat() if timestamp else None
+    }
+
+
+def attention_event(chat_id: int, chat_title: str, needs_attention: bool, reasons: List[str]) -> Dict:
+    """Payload of an 'attention' event (the attention flag of a chat changed)"""
+    return {
+        "chat_id": chat_id,
+        "chat_title": chat_title,
+        "needs_attention": bool(needs_attention),
+        "reasons": reasons or []
+    }
+
+
+def sla_breach_event(chat_id: int, response_time_seconds: int, threshold_seconds: int) -> Dict:
+    """Payload of an 'sla_breach' event (a response took longer than allowed)"""
+    return {
+        "chat_id": chat_id,
+        "response_time_seconds": response_time_seconds,
+        "threshold_seconds": threshold_seconds
+    }
+
+
+def sentiment_event(results: List[Dict]) -> Dict:
+    """Payload of a 'sentiment' event: [{message_id, chat_id, is_team_member, timestamp, label, score}, ...]"""
+    return {"results": results}
+
+
+def publish_new_message(chat_id: int, user_id: int, is_team_member: bool,
+                        text: Optional[str], timestamp: datetime) -> bool:
+    """Publish a 'message' event for a newly stored message"""
+    return publish_event("message", message_event(chat_id, user_id, is_team_member, text, timestamp))
+
+
+def iter_sse_events(client: redis.Redis) -> Iterator[str]:
+    """
+    Relay channel events as Server-Sent Events
+
+    Sends a comment line every HEARTBEAT_INTERVAL seconds so proxies keep the
+    connection open and a gone client is noticed on the next write. Ends
+    after MAX_STREAM_SECONDS so a stream never holds its worker thread for
+    long; the browser reconnects after the retry delay.
+    """
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(LIVE_CHANNEL)
+    try:
+        yield f"retry: {RECONNECT_DELAY_MS}\nevent: ready\ndata: {{}}\n\n"
+
+        last_write = started = time.monotonic()
+        while time.monotonic() - started < MAX_STREAM_SECONDS:
+            message = pubsub.get_message(timeout=1.0)
+            if message and message.get("type") == "message":
+                payload = message["data"]
+                if isinstance(payload, bytes):
+                    payload = payload.decode("utf-8")
+                try:
+                    event_type = json.loads(payload).get("type", "message")
+                except ValueError:
+                    continue
+                yield f"event: {event_type}\ndata: {payload}\n\n"
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= HEARTBEAT_INTERVAL:
+                yield ": ping\n\n"
+                last_write = time.monotonic()
+    finally:
+        try:
+            pubsub.close()
+        except redis.RedisError:
+            pass
+
+
+def subscriber_client() -> Optional[redis.Redis]:
+    """Dedicated Redis connection for one SSE subscriber (no read timeout)"""
+    if not LIVE_EVENTS_ENABLED:
+        return None
+
+    try:
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        client = redis.from_url(redis_url, socket_connect_timeout=2, health_check_interval=30)
+        client.ping()
+        return client
+    except redis.RedisError as e:
+        logger.warning(f"Redis unavailable for live subscribers: {e}")
+        return None
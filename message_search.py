@@ -0,0 +1,112 @@
+"""
+Full-text search over message history
+
+Messages carry a search_vector column (tsvector, russian configuration)
+maintained by a trigger and indexed with GIN, see
+migrations/003_message_search.sql. Queries use web search syntax
+("quoted phrases", OR, -excluded), are paginated with keyset cursors and
+only the rows of the returned page get a highlighted snippet, since
+ts_headline re-parses the message text.
+"""
+
+import html
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, TSVECTOR
+
+from models import Chat, Message
+from pagination import CursorError, keyset_condition, paginate_rows
+from timezone_utils import format_configured_time
+
+SEARCH_CONFIG = 'pg_catalog.russian'
+
+search_vector = literal_column('messages.search_vector', type_=TSVECTOR)
+
+# Snippet markers: control characters never present in chat text, so the
+# text can be HTML-escaped before they are turned into <mark> tags
+_MARK_START = '\x02'
+_MARK_STOP = '\x03'
+HEADLINE_OPTIONS = (f'StartSel={_MARK_START}, StopSel={_MARK_STOP}, '
+                    'MaxWords=35, MinWords=12, MaxFragments=2, FragmentDelimiter=" … "')
+
+SEARCH_SORTS = ('date', 'relevance')
+
+
+def search_query(text: str):
+    """tsquery of a user query in web search syntax"""
+    return func.websearch_to_tsquery(SEARCH_CONFIG, text)
+
+
+def snippet_html(headline: Optional[str]) -> str:
+    """HTML-escaped snippet with matches wrapped in <mark>"""
+    escaped = html.escape(headline or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_STOP, '</mark>')
+
+
+def search_messages(session, text: str, filters: Sequence, sort: str = 'date',
+                    limit: int = 50, after: Optional[List] = None) -> Dict:
+    """
+    Find messages matching a query
+
+    Args:
+        session: SQLAlchemy session
+        text: User query (web search syntax)
+        filters: Extra conditions on Message (chat, sender type, period)
+        sort: 'date' (newest first) or 'relevance' (ts_rank_cd, then newest)
+        limit: Page size
+        after: Decoded cursor values of the previous page
+
+    Returns:
+        Dict with 'items', 'next_cursor' and 'has_more'
+
+    Raises:
+        CursorError: If the cursor does not fit the sort order
+    """
+    tsquery = search_query(text)
+    # Double precision so the rank stored in a cursor compares equal to the recomputed one
+    rank = cast(func.ts_rank_cd(search_vector, tsquery, 32), DOUBLE_PRECISION).label('rank')
+
+    if sort == 'relevance':
+        key_columns = [rank, Message.timestamp, Message.id]
+    else:
+        key_columns = [Message.timestamp, Message.id]
+
+    page = select(Message.id, Message.timestamp, rank).where(search_vector.op('@@')(tsquery), *filters)
+    if after is not None:
+        if len(after) != len(key_columns):
+            raise CursorError("Cursor does not match the requested sort order")
+        page = page.where(keyset_condition(key_columns, after, descending=True))
+    page = page.order_by(*[column.desc() for column in key_columns]).limit(limit + 1).subquery()
+
+    # Snippets are computed for the page rows only; joining on the timestamp
+    # too lets a partitioned messages table prune the lookups
+    headline = func.ts_headline(SEARCH_CONFIG, func.coalesce(Message.text, ''), tsquery, HEADLINE_OPTIONS)
+    rows = session.execute(
+        select(
+            Message.id, Message.chat_id, Chat.title.label('chat_title'), Message.user_id,
+            Message.username, Message.full_name, Message.is_team_member, Message.timestamp,
+            Message.sentiment_label, page.c.rank, headline.label('headline')
+        ).join(page, and_(page.c.id == Message.id, page.c.timestamp == Message.timestamp)).join(Chat, Chat.id == Message.chat_id)
+        .order_by(*([page.c.rank.desc()] if sort == 'relevance' else []),
+                  page.c.timestamp.desc(), page.c.id.desc())
+    ).all()
+
+    result = paginate_rows(rows, limit, sort, lambda row: (
+        [row.rank, row.timestamp, row.id] if sort == 'relevance' else [row.timestamp, row.id]
+    ))
+    result['items'] = [{
+        'id': row.id,
+        'chat_id': row.chat_id,
+        'chat_title': row.chat_title,
+        'user_id': row.user_id,
+        'username': row.username,
+        'full_name': row.full_name,
+        'is_team_member': row.is_team_member,
+        'timestamp': row.timestamp.isoformat(),
+        'local_time': format_configured_time(row.timestamp),
+        'sentiment_label': row.sentiment_label,
+        'rank': round(row.rank, 4),
+        'snippet': snippet_html(row.headline)
+    } for row in result['items']]
+    return result
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Применение SQL-миграций из каталога migrations/
+
+Миграции - файлы NNN_описание.sql, применяются по порядку имен, каждая один
+раз. Примененные миграции записываются в system_config с ключом
+schema_migration:<имя файла>.
+
+Файл с первой строкой "-- migrate: no-transaction" выполняется вне
+транзакции, по одной команде (нужно для CREATE INDEX CONCURRENTLY). Команды
+в таком файле разделяются ";" в конце строки, блоки $$ ... $$ не
+поддерживаются. Для секционированных таблиц PostgreSQL не умеет
+CONCURRENTLY - такие индексы создаются и удаляются обычной командой.
+
+Плейсхолдер {{agency_timezone}} заменяется часовым поясом агентства из
+config.yaml (agency.timezone).
+
+Необязательные миграции лежат в migrations/optional/ и применяются только
+явно, ключом --optional (например, перевод messages на помесячное
+секционирование, см. partition_manager.py).
+
+Миграции рассчитаны на PostgreSQL; на других СУБД схему создает
+create_tables.py (db.create_all).
+
+Пример:
+    python migrate.py            # применить новые миграции
+    python migrate.py --list     # показать статус
+    python migrate.py --optional messages_partitioning.sql
+"""
+
+import argparse
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import text
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+OPTIONAL_DIR = MIGRATIONS_DIR / "optional"
+KEY_PREFIX = "schema_migration:"
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+CONCURRENT_INDEX = re.compile(r"\bINDEX\s+CONCURRENTLY\b.*?\bON\s+(?:ONLY\s+)?([\w.]+)", re.IGNORECASE | re.DOTALL)
+DOLLAR_QUOTE = re.compile(r"\$\w*\$")
+CONCURRENT_DROP_INDEX = re.compile(r"\bDROP\s+INDEX\s+CONCURRENTLY\s+(?:IF\s+EXISTS\s+)?([\w.]+)", re.IGNORECASE)
+
+
+def list_migrations():
+    """Файлы миграций по порядку"""
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+
+def migration_name(path):
+    """Имя миграции в system_config (необязательные - с префиксом optional/)"""
+    if path.parent == OPTIONAL_DIR:
+        return f"optional/{path.name}"
+    return path.name
+
+
+def applied_migrations(db):
+    """Имена уже примененных миграций"""
+    from models import SystemConfig
+
+    rows = db.session.query(SystemConfig.key).filter(SystemConfig.key.like(f"{KEY_PREFIX}%")).all()
+    return {row.key[len(KEY_PREFIX):] for row in rows}
+
+
+def split_statements(sql):
+    """Разбивает файл без транзакции на отдельные команды (тела $$ ... $$ не делятся)"""
+    statements = []
+    current = []
+    quote = None
+    for line in sql.splitlines():
+        if line.strip().startswith("--") and not current:
+            continue
+        current.append(line)
+        for tag in DOLLAR_QUOTE.findall(line):
+            if quote is None:
+                quote = tag
+            elif tag == quote:
+                quote = None
+        if quote is None and line.rstrip().endswith(";"):
+            statement = "\n".join(current).strip().rstrip(";")
+            if statement:
+                statements.append(statement)
+            current = []
+    tail = "\n".join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def render_migration(path):
+    """Текст миграции с подставленными плейсхолдерами"""
+    from timezone_utils import LOCAL_TZ_NAME
+
+    return path.read_text(encoding="utf-8").replace("{{agency_timezone}}", LOCAL_TZ_NAME)
+
+
+def execute_script(connection, sql):
+    """Выполняет SQL как есть: без параметров драйвер не трогает знаки % (format('%I', ...))"""
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(sql)
+    finally:
+        cursor.close()
+
+
+def adapt_statement(connection, statement):
+    """Убирает CONCURRENTLY у индексов секционированных таблиц"""
+    drop = CONCURRENT_DROP_INDEX.search(statement)
+    if drop:
+        # Секционированный индекс (relkind 'I') удаляется только обычной командой
+        partitioned = connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(:index) AND relkind = 'I')"
+        ), {"index": drop.group(1)}).scalar()
+    else:
+        match = CONCURRENT_INDEX.search(statement)
+        if not match:
+            return statement
+        partitioned = connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+        ), {"table": match.group(1)}).scalar()
+    if not partitioned:
+        return statement
+    return re.sub(r"\bCONCURRENTLY\s+", "", statement, count=1, flags=re.IGNORECASE)
+
+
+def apply_migration(db, path):
+    """Применяет одну миграцию и записывает ее в system_config"""
+    from models import SystemConfig
+
+    sql = render_migration(path)
+
+    if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            for statement in split_statements(sql):
+                execute_script(connection, adapt_statement(connection, statement))
+    else:
+        with db.engine.begin() as connection:
+            execute_script(connection, sql)
+
+    db.session.add(SystemConfig(
+        key=f"{KEY_PREFIX}{migration_name(path)}",
+        value=datetime.utcnow().isoformat(),
+        description="Applied database migration"
+    ))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Применение SQL-миграций")
+    parser.add_argument("--list", action="store_true", help="Показать статус миграций")
+    parser.add_argument("--dry-run", action="store_true", help="Показать, какие миграции будут применены")
+    parser.add_argument("--optional", metavar="FILE", help="Применить необязательную миграцию из migrations/optional/")
+    args = parser.parse_args()
+
+    from app import app, db
+
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            print(f"Миграции рассчитаны на PostgreSQL, текущая СУБД: {db.engine.dialect.name}. "
+                  f"Используйте create_tables.py")
+            return
+
+        db.create_all()
+        applied = applied_migrations(db)
+        migrations = list_migrations()
+
+        if args.list:
+            for path in migrations:
+                status = "применена" if path.name in applied else "ожидает"
+                print(f"{path.name:<50} {status}")
+            for path in sorted(OPTIONAL_DIR.glob("*.sql")):
+                status = "применена" if migration_name(path) in applied else "не применялась"
+                print(f"{migration_name(path):<50} {status}")
+            return
+
+        if args.optional:
+            path = OPTIONAL_DIR / args.optional
+            if not path.is_file():
+                print(f"Нет такой миграции: {path}")
+                sys.exit(1)
+            if migration_name(path) in applied:
+                print(f"Миграция {migration_name(path)} уже применена")
+                return
+            if any(item.name not in applied for item in migrations):
+                print("Сначала примените обычные миграции: python migrate.py")
+                sys.exit(1)
+            if args.dry_run:
+                print(f"Будет применена: {migration_name(path)}")
+                return
+
+            print(f"Применение {migration_name(path)}...")
+            try:
+                apply_migration(db, path)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Ошибка в миграции {migration_name(path)}: {e}")
+                sys.exit(1)
+            print("Готово")
+            return
+
+        pending = [path for path in migrations if path.name not in applied]
+        if not pending:
+            print("Новых миграций нет")
+            return
+
+        for path in pending:
+            if args.dry_run:
+                print(f"Будет применена: {path.name}")
+                continue
+
+            print(f"Применение {path.name}...")
+            try:
+                apply_migration(db, path)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Ошибка в миграции {path.name}: {e}")
+                sys.exit(1)
+
+        if not args.dry_run:
+            print(f"Применено миграций: {len(pending)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+-- Change tracking for delta sync: every insert or update of a message bumps
+-- updated_at, including writes made with raw SQL by the ingest scripts.
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+UPDATE messages SET updated_at = COALESCE(created_at, timestamp) WHERE updated_at IS NULL;
+
+ALTER TABLE messages ALTER COLUMN updated_at SET DEFAULT (now() AT TIME ZONE 'utc');
+
+CREATE INDEX IF NOT EXISTS idx_messages_updated_at ON messages (updated_at);
+
+CREATE OR REPLACE FUNCTION messages_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now() AT TIME ZONE 'utc';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_messages_updated_at ON messages;
+CREATE TRIGGER trg_messages_updated_at
+    BEFORE INSERT OR UPDATE ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_touch_updated_at();
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Expression index for grouping and filtering messages by agency-local day
+-- (timezone_utils.local_date). {{agency_timezone}} is replaced by
+-- agency.timezone from config.yaml; after changing the timezone drop the
+-- index, delete the schema_migration:002_message_local_date.sql row from
+-- system_config and run migrate.py again.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_local_date
+    ON messages ((date(timezone('{{agency_timezone}}', timezone('UTC', "timestamp")))));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_chat_local_date
+    ON messages (chat_id, (date(timezone('{{agency_timezone}}', timezone('UTC', "timestamp")))));
@@ -0,0 +1,58 @@
+-- Full-text search over messages.text (message_search.py).
+--
+-- The stock russian configuration already handles mixed-language chats: it
+-- stems Cyrillic words with the Russian stemmer, Latin words with the English
+-- one, and keeps numbers, e-mails and URLs as they are. A custom copy would
+-- only repeat those mappings, so it is used as is.
+-- search_vector is filled by a trigger on insert and on text edits; rows
+-- stored before this migration are filled in batches by
+-- messages_backfill_search_vector(), called from migration 004 (which also
+-- builds the GIN index without locking writes). The backfill only derives a
+-- column, so it keeps updated_at and delta sync (migrations/001) does not
+-- resend every message.
+
+-- Writes that only fill derived columns set messages.keep_updated_at for
+-- their transaction; all other writes still bump updated_at
+CREATE OR REPLACE FUNCTION messages_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND current_setting('messages.keep_updated_at', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.updated_at := now() AT TIME ZONE 'utc';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION messages_update_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('pg_catalog.russian', coalesce(NEW.text, ''));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_messages_search_vector ON messages;
+CREATE TRIGGER trg_messages_search_vector
+    BEFORE INSERT OR UPDATE OF text ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_update_search_vector();
+
+-- Fills search_vector of existing rows, committing after every batch of ids
+CREATE OR REPLACE PROCEDURE messages_backfill_search_vector(batch_size integer DEFAULT 20000)
+LANGUAGE plpgsql AS $$
+DECLARE
+    last_id integer := 0;
+    max_id integer;
+BEGIN
+    SELECT coalesce(max(id), 0) INTO max_id FROM messages;
+    WHILE last_id < max_id LOOP
+        -- Transaction-local, so it ends with the COMMIT below
+        PERFORM set_config('messages.keep_updated_at', 'on', true);
+        UPDATE messages
+        SET search_vector = to_tsvector('pg_catalog.russian', coalesce(text, ''))
+        WHERE id > last_id AND id <= last_id + batch_size AND search_vector IS NULL;
+        last_id := last_id + batch_size;
+        COMMIT;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- Backfill search_vector of existing messages (batched commits), then build
+-- the GIN index used by /api/search/messages without blocking writes.
+
+CALL messages_backfill_search_vector(20000);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_search_vector
+    ON messages USING gin (search_vector);
@@ -0,0 +1,144 @@
+-- users dimension (models.User): latest username / full name per user_id
+-- with first/last seen times and message counters, for user lookup without
+-- grouping over messages. The table itself is created by db.create_all(),
+-- which migrate.py runs first; this migration fills it and adds the
+-- triggers that keep it current on every ingest path (ORM or raw SQL).
+
+-- No new messages between the backfill snapshot and the triggers
+LOCK TABLE messages IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO users (user_id, username, full_name, first_seen_at, last_seen_at,
+                   message_count, character_count, client_message_count, client_character_count)
+SELECT s.user_id, l.username, l.full_name, s.first_seen_at, s.last_seen_at,
+       s.message_count, s.character_count, s.client_message_count, s.client_character_count
+FROM (
+    SELECT user_id,
+           min("timestamp") AS first_seen_at,
+           max("timestamp") AS last_seen_at,
+           count(*) AS message_count,
+           coalesce(sum(length(text)), 0) AS character_count,
+           count(*) FILTER (WHERE NOT is_team_member) AS client_message_count,
+           coalesce(sum(length(text)) FILTER (WHERE NOT is_team_member), 0) AS client_character_count
+    FROM messages
+    GROUP BY user_id
+) s
+JOIN (
+    SELECT DISTINCT ON (user_id) user_id, username, full_name
+    FROM messages
+    ORDER BY user_id, "timestamp" DESC, id DESC
+) l ON l.user_id = s.user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    username = EXCLUDED.username,
+    full_name = EXCLUDED.full_name,
+    first_seen_at = EXCLUDED.first_seen_at,
+    last_seen_at = EXCLUDED.last_seen_at,
+    message_count = EXCLUDED.message_count,
+    character_count = EXCLUDED.character_count,
+    client_message_count = EXCLUDED.client_message_count,
+    client_character_count = EXCLUDED.client_character_count;
+
+-- Inserts: one upsert per user and statement, so bulk loads stay cheap.
+-- Names are taken from the newest message; older backfilled messages only
+-- update the counters and first_seen_at.
+CREATE OR REPLACE FUNCTION users_messages_inserted() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO users AS u (user_id, username, full_name, first_seen_at, last_seen_at,
+                            message_count, character_count, client_message_count, client_character_count)
+    SELECT s.user_id, l.username, l.full_name, s.first_seen_at, s.last_seen_at,
+           s.message_count, s.character_count, s.client_message_count, s.client_character_count
+    FROM (
+        SELECT user_id,
+               min("timestamp") AS first_seen_at,
+               max("timestamp") AS last_seen_at,
+               count(*) AS message_count,
+               coalesce(sum(length(text)), 0) AS character_count,
+               count(*) FILTER (WHERE NOT is_team_member) AS client_message_count,
+               coalesce(sum(length(text)) FILTER (WHERE NOT is_team_member), 0) AS client_character_count
+        FROM new_messages
+        GROUP BY user_id
+    ) s
+    JOIN (
+        SELECT DISTINCT ON (user_id) user_id, username, full_name
+        FROM new_messages
+        ORDER BY user_id, "timestamp" DESC, id DESC
+    ) l ON l.user_id = s.user_id
+    ORDER BY s.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = CASE WHEN u.last_seen_at IS NULL OR EXCLUDED.last_seen_at >= u.last_seen_at
+                        THEN EXCLUDED.username ELSE u.username END,
+        full_name = CASE WHEN u.last_seen_at IS NULL OR EXCLUDED.last_seen_at >= u.last_seen_at
+                         THEN EXCLUDED.full_name ELSE u.full_name END,
+        first_seen_at = least(u.first_seen_at, EXCLUDED.first_seen_at),
+        last_seen_at = greatest(u.last_seen_at, EXCLUDED.last_seen_at),
+        message_count = u.message_count + EXCLUDED.message_count,
+        character_count = u.character_count + EXCLUDED.character_count,
+        client_message_count = u.client_message_count + EXCLUDED.client_message_count,
+        client_character_count = u.client_character_count + EXCLUDED.client_character_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_messages_inserted ON messages;
+CREATE TRIGGER trg_users_messages_inserted
+    AFTER INSERT ON messages
+    REFERENCING NEW TABLE AS new_messages
+    FOR EACH STATEMENT EXECUTE FUNCTION users_messages_inserted();
+
+-- Team linking flips is_team_member, edits change the text: adjust counters.
+-- Row level with a WHEN clause, so frequent updates of other columns
+-- (sentiment, response times) cost nothing.
+CREATE OR REPLACE FUNCTION users_messages_updated() RETURNS trigger AS $$
+BEGIN
+    UPDATE users SET
+        character_count = character_count + coalesce(length(NEW.text), 0) - coalesce(length(OLD.text), 0),
+        client_message_count = client_message_count
+            + (NOT NEW.is_team_member)::int - (NOT OLD.is_team_member)::int,
+        client_character_count = client_character_count
+            + CASE WHEN NEW.is_team_member THEN 0 ELSE coalesce(length(NEW.text), 0) END
+            - CASE WHEN OLD.is_team_member THEN 0 ELSE coalesce(length(OLD.text), 0) END
+    WHERE user_id = NEW.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_messages_updated ON messages;
+CREATE TRIGGER trg_users_messages_updated
+    AFTER UPDATE OF is_team_member, text ON messages
+    FOR EACH ROW
+    WHEN (OLD.is_team_member IS DISTINCT FROM NEW.is_team_member OR OLD.text IS DISTINCT FROM NEW.text)
+    EXECUTE FUNCTION users_messages_updated();
+
+CREATE OR REPLACE FUNCTION users_messages_deleted() RETURNS trigger AS $$
+BEGIN
+    UPDATE users SET
+        message_count = message_count - 1,
+        character_count = character_count - coalesce(length(OLD.text), 0),
+        client_message_count = client_message_count - (NOT OLD.is_team_member)::int,
+        client_character_count = client_character_count
+            - CASE WHEN OLD.is_team_member THEN 0 ELSE coalesce(length(OLD.text), 0) END
+    WHERE user_id = OLD.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_messages_deleted ON messages;
+CREATE TRIGGER trg_users_messages_deleted
+    AFTER DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION users_messages_deleted();
+
+-- Prefix lookups (autocomplete while typing the first letters)
+CREATE INDEX IF NOT EXISTS idx_users_username_prefix ON users (lower(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_full_name_prefix ON users (lower(full_name) text_pattern_ops);
+
+-- Substring lookups (ILIKE on any part of the name) need pg_trgm; without it they scan the
+-- users table, which is still far smaller than messages
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING gin (username gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops);
+EXCEPTION WHEN OTHERS THEN
+    -- No format placeholders: percent signs clash with the driver's paramstyle
+    RAISE WARNING USING MESSAGE = 'pg_trgm unavailable (' || SQLERRM || '), substring user search will not be indexed';
+END
+$$;
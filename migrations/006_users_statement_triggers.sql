@@ -0,0 +1,102 @@
+-- users counters (migrations/005_users.sql): apply UPDATE and DELETE changes
+-- once per user and statement. The row-level triggers updated the same users
+-- row once per message, which made bulk deletes and team-member flips
+-- (routes.api_chat_team) quadratic in the number of rows of one user.
+--
+-- UPDATE cannot use transition tables here: PostgreSQL does not allow them
+-- together with a column list, and without one every UPDATE of messages
+-- (sentiment, response times) would capture both tables. Instead a row
+-- trigger, filtered by columns and WHEN, appends the changed rows to
+-- users_counter_deltas, and a statement trigger on the same columns folds
+-- them into users and empties it. Updates of other columns fire neither.
+
+DROP TRIGGER IF EXISTS trg_users_messages_updated ON messages;
+DROP TRIGGER IF EXISTS trg_users_messages_deleted ON messages;
+
+-- Only ever holds the rows of the running statement, so it needs no WAL
+CREATE UNLOGGED TABLE IF NOT EXISTS users_counter_deltas (
+    user_id BIGINT NOT NULL,
+    message_count INTEGER NOT NULL,
+    character_count INTEGER NOT NULL,
+    client_message_count INTEGER NOT NULL,
+    client_character_count INTEGER NOT NULL
+);
+
+-- The old row is subtracted from its user, the new row added to its user
+CREATE OR REPLACE FUNCTION users_messages_updated_row() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO users_counter_deltas (user_id, message_count, character_count,
+                                      client_message_count, client_character_count)
+    VALUES (OLD.user_id, -1, -coalesce(length(OLD.text), 0),
+            -(NOT OLD.is_team_member)::int,
+            CASE WHEN OLD.is_team_member THEN 0 ELSE -coalesce(length(OLD.text), 0) END),
+           (NEW.user_id, 1, coalesce(length(NEW.text), 0),
+            (NOT NEW.is_team_member)::int,
+            CASE WHEN NEW.is_team_member THEN 0 ELSE coalesce(length(NEW.text), 0) END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Other transactions' deltas are invisible here and are consumed by their own statements
+CREATE OR REPLACE FUNCTION users_messages_updated() RETURNS trigger AS $$
+BEGIN
+    WITH consumed AS (
+        DELETE FROM users_counter_deltas RETURNING *
+    )
+    UPDATE users u SET
+        message_count = u.message_count + d.message_count,
+        character_count = u.character_count + d.character_count,
+        client_message_count = u.client_message_count + d.client_message_count,
+        client_character_count = u.client_character_count + d.client_character_count
+    FROM (
+        SELECT user_id,
+               sum(message_count) AS message_count,
+               sum(character_count) AS character_count,
+               sum(client_message_count) AS client_message_count,
+               sum(client_character_count) AS client_character_count
+        FROM consumed
+        GROUP BY user_id
+    ) d
+    WHERE u.user_id = d.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row AFTER triggers of a statement fire before its statement AFTER triggers
+CREATE TRIGGER trg_users_messages_updated_rows
+    AFTER UPDATE OF user_id, is_team_member, text ON messages
+    FOR EACH ROW
+    WHEN (OLD.is_team_member IS DISTINCT FROM NEW.is_team_member
+          OR OLD.text IS DISTINCT FROM NEW.text
+          OR OLD.user_id <> NEW.user_id)
+    EXECUTE FUNCTION users_messages_updated_row();
+
+CREATE TRIGGER trg_users_messages_updated
+    AFTER UPDATE OF user_id, is_team_member, text ON messages
+    FOR EACH STATEMENT EXECUTE FUNCTION users_messages_updated();
+
+CREATE OR REPLACE FUNCTION users_messages_deleted() RETURNS trigger AS $$
+BEGIN
+    UPDATE users u SET
+        message_count = u.message_count - d.message_count,
+        character_count = u.character_count - d.character_count,
+        client_message_count = u.client_message_count - d.client_message_count,
+        client_character_count = u.client_character_count - d.client_character_count
+    FROM (
+        SELECT user_id,
+               count(*) AS message_count,
+               coalesce(sum(length(text)), 0) AS character_count,
+               count(*) FILTER (WHERE NOT is_team_member) AS client_message_count,
+               coalesce(sum(length(text)) FILTER (WHERE NOT is_team_member), 0) AS client_character_count
+        FROM old_messages
+        GROUP BY user_id
+    ) d
+    WHERE u.user_id = d.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_users_messages_deleted
+    AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS old_messages
+    FOR EACH STATEMENT EXECUTE FUNCTION users_messages_deleted();
@@ -0,0 +1,37 @@
+-- migrate: no-transaction
+-- Partial and covering indexes for hot query shapes the composite indexes of
+-- models.py do not serve well. check_query_plans.py verifies that these
+-- queries keep using an index on a large fixture.
+
+-- Unanswered client messages: worker.calculate_response_time (latest one
+-- before a team reply) and KpiCalculator._calculate_unanswered_messages
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_unanswered
+    ON messages (chat_id, "timestamp")
+    WHERE is_team_member = false AND is_answered = false;
+
+-- Sentiment backlog: worker.process_sentiment_analysis and the recent-messages
+-- mode of analyze_sentiment_batch.py; stays small once the backlog is drained
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sentiment_backlog
+    ON messages ("timestamp")
+    WHERE processed_for_sentiment = false AND text IS NOT NULL AND text <> '';
+
+-- Response times (response_time_seconds > 0): per chat and per member
+-- statistics read the time from the index without visiting the table
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_chat_responses
+    ON messages (chat_id, "timestamp") INCLUDE (user_id, is_team_member, response_time_seconds)
+    WHERE response_time_seconds > 0;
+
+-- Response time trend over all chats (routes.build_response_time_trend)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_responses
+    ON messages ("timestamp") INCLUDE (chat_id, response_time_seconds)
+    WHERE response_time_seconds > 0;
+
+-- Latest KPI row per chat (worker attention flag), index-only
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kpi_live_chat_latest
+    ON kpi_live (chat_id, calculated_at DESC) INCLUDE (needs_attention);
+
+-- Latest chats needing attention (dashboard); replaces scanning the boolean
+-- idx_needs_attention
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kpi_live_attention
+    ON kpi_live (calculated_at DESC)
+    WHERE needs_attention = true;
@@ -0,0 +1,7 @@
+-- Which tier produced a message's sentiment: 'rules' (sentiment_rules.py),
+-- 'llm' (OpenRouter, including cached LLM results) or 'model' (the local
+-- model of sentiment_model.py). NULL for rows analyzed before this column,
+-- which all came from the LLM. train_sentiment_model.py trains only on LLM
+-- labels, so the local model never learns from its own predictions.
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS sentiment_source VARCHAR(10);
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Sentiment work queue (sentiment_queue.py): unprocessed client messages,
+-- read newest first by time window, with chat_id in the index for the
+-- attention-chat priority. Replaces idx_messages_sentiment_backlog of
+-- migrations/007, which also covered team messages the worker no longer
+-- analyzes.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sentiment_queue
+    ON messages ("timestamp") INCLUDE (chat_id)
+    WHERE processed_for_sentiment = false AND is_team_member = false AND text IS NOT NULL AND text <> '';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_sentiment_backlog;
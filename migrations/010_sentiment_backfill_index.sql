@@ -0,0 +1,31 @@
+-- migrate: no-transaction
+-- Keyset pages of analyze_sentiment_batch.py (id > last id ORDER BY id) over
+-- unprocessed client messages: each page starts where the previous one
+-- ended instead of filtering the whole table again.
+
+-- Rows inserted with raw SQL without the flag count as not analyzed, so the
+-- partial indexes see them. Filled in batches of ids, each committed on its
+-- own; only the flag changes, so updated_at is kept and delta sync
+-- (migrations/001) does not resend the rows.
+DO $$
+DECLARE
+    last_id integer := 0;
+    max_id integer;
+BEGIN
+    SELECT coalesce(max(id), 0) INTO max_id FROM messages;
+    WHILE last_id < max_id LOOP
+        -- Transaction-local, so it ends with the COMMIT below
+        PERFORM set_config('messages.keep_updated_at', 'on', true);
+        UPDATE messages SET processed_for_sentiment = false
+        WHERE id > last_id AND id <= last_id + 20000 AND processed_for_sentiment IS NULL;
+        last_id := last_id + 20000;
+        COMMIT;
+    END LOOP;
+END
+$$;
+
+ALTER TABLE messages ALTER COLUMN processed_for_sentiment SET DEFAULT false;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sentiment_pending_id
+    ON messages (id)
+    WHERE processed_for_sentiment = false AND is_team_member = false AND text IS NOT NULL AND text <> '';
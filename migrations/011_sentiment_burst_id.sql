@@ -0,0 +1,5 @@
+-- Conversation-level sentiment (sentiment_bursts.py): messages scored as one
+-- client burst share the id of the burst's first message. NULL for messages
+-- scored on their own.
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS sentiment_burst_id BIGINT;
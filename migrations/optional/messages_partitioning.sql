@@ -0,0 +1,97 @@
+-- Optional: convert messages to declarative monthly range partitions on
+-- "timestamp" (python migrate.py --optional messages_partitioning.sql).
+--
+-- Requires PostgreSQL 13+. The table is copied into the partitions inside a
+-- single transaction under an exclusive lock, so run it in a maintenance
+-- window, with the bot and worker stopped, after a backup. Indexes,
+-- constraints and triggers of the current table (models.Message.__table_args__
+-- and migrations 001-005) are re-created on the partitioned table, which
+-- creates them on every partition, including partitions added later.
+-- Partitions are named messages_pYYYY_MM; rows outside them land in
+-- messages_default. partition_manager.py (run daily by the worker) creates
+-- upcoming months and detaches old ones.
+
+LOCK TABLE messages IN ACCESS EXCLUSIVE MODE;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'messages'::regclass) THEN
+        RAISE EXCEPTION 'messages is already partitioned';
+    END IF;
+END
+$$;
+
+-- Definitions to replay, taken while they still name public.messages
+CREATE TEMP TABLE messages_partitioning_ddl ON COMMIT DROP AS
+SELECT 1 AS step, pg_get_indexdef(i.indexrelid) AS ddl
+FROM pg_index i
+WHERE i.indrelid = 'messages'::regclass
+  AND NOT i.indisprimary
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+UNION ALL
+SELECT 2, format('ALTER TABLE messages ADD CONSTRAINT %I %s', c.conname, pg_get_constraintdef(c.oid))
+FROM pg_constraint c
+WHERE c.conrelid = 'messages'::regclass
+  AND c.contype IN ('c', 'f')
+UNION ALL
+SELECT 3, pg_get_triggerdef(t.oid)
+FROM pg_trigger t
+WHERE t.tgrelid = 'messages'::regclass
+  AND NOT t.tgisinternal;
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_unpartitioned_pkey;
+
+-- The primary key of a partitioned table must include the partition key;
+-- id stays unique through its sequence
+CREATE TABLE messages (
+    LIKE messages_unpartitioned INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS,
+    CONSTRAINT messages_pkey PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+
+CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+-- Months present in the data plus three months ahead
+DO $$
+DECLARE
+    first_month date;
+    last_month date;
+    month date;
+BEGIN
+    SELECT date_trunc('month', coalesce(min("timestamp"), now() AT TIME ZONE 'utc'))::date
+    INTO first_month FROM messages_unpartitioned;
+    last_month := (date_trunc('month', greatest(
+        coalesce((SELECT max("timestamp") FROM messages_unpartitioned), now() AT TIME ZONE 'utc'),
+        now() AT TIME ZONE 'utc')) + interval '3 months')::date;
+
+    month := first_month;
+    WHILE month <= last_month LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                       'messages_p' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date);
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END
+$$;
+
+-- No triggers exist on the new table yet: updated_at, search_vector and the
+-- users counters are copied as they are
+INSERT INTO messages SELECT * FROM messages_unpartitioned;
+
+DO $$
+DECLARE
+    sequence_name text := pg_get_serial_sequence('messages_unpartitioned', 'id');
+    statement record;
+BEGIN
+    IF sequence_name IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY messages.id', sequence_name);
+    END IF;
+
+    DROP TABLE messages_unpartitioned;
+
+    FOR statement IN SELECT ddl FROM messages_partitioning_ddl ORDER BY step LOOP
+        EXECUTE statement.ddl;
+    END LOOP;
+END
+$$;
+
+ANALYZE messages;
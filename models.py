@@ -34,11 +34,17 @@ class Message(db.Model):
     is_team_member = db.Column(db.Boolean, nullable=False)  # True if sender is team member
     timestamp = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Last insert/update, drives delta sync (also maintained by a trigger, see migrations/)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # search_vector (tsvector for full-text search) is added by migrations/003 and
+    # deliberately not mapped, so ORM queries never load it; see message_search.py
     
     # Sentiment analysis results
     sentiment_score = db.Column(db.Float)  # -1 to 1 scale
     sentiment_label = db.Column(db.String(20))  # positive, negative, neutral
     sentiment_confidence = db.Column(db.Float)  # 0 to 1
+    sentiment_source = db.Column(db.String(10))  # rules, llm, model, burst (NULL: llm, analyzed before migrations/008)
+    sentiment_burst_id = db.Column(db.BigInteger)  # id of the first message of the scored client burst
     processed_for_sentiment = db.Column(db.Boolean, default=False)
     
     # Response tracking
@@ -50,6 +56,25 @@ class Message(db.Model):
         Index('idx_chat_timestamp', 'chat_id', 'timestamp'),
         Index('idx_chat_team_timestamp', 'chat_id', 'is_team_member', 'timestamp'),
         Index('idx_user_timestamp', 'user_id', 'timestamp'),
+        Index('idx_messages_updated_at', 'updated_at'),
+        # Partial/covering indexes for hot query shapes (migrations/007_query_shape_indexes.sql)
+        Index('idx_messages_unanswered', 'chat_id', 'timestamp',
+              postgresql_where=db.text("is_team_member = false AND is_answered = false")),
+        # Sentiment work queue (migrations/009_sentiment_queue_index.sql)
+        Index('idx_messages_sentiment_queue', 'timestamp',
+              postgresql_include=['chat_id'],
+              postgresql_where=db.text("processed_for_sentiment = false AND is_team_member = false "
+                                       "AND text IS NOT NULL AND text <> ''")),
+        # Keyset pages of analyze_sentiment_batch.py (migrations/010_sentiment_backfill_index.sql)
+        Index('idx_messages_sentiment_pending_id', 'id',
+              postgresql_where=db.text("processed_for_sentiment = false AND is_team_member = false "
+                                       "AND text IS NOT NULL AND text <> ''")),
+        Index('idx_messages_chat_responses', 'chat_id', 'timestamp',
+              postgresql_include=['user_id', 'is_team_member', 'response_time_seconds'],
+              postgresql_where=db.text("response_time_seconds > 0")),
+        Index('idx_messages_responses', 'timestamp',
+              postgresql_include=['chat_id', 'response_time_seconds'],
+              postgresql_where=db.text("response_time_seconds > 0")),
     )
 
 
@@ -111,9 +136,38 @@ class KpiLive(db.Model):
         Index('idx_chat_calculated_at', 'chat_id', 'calculated_at'),
         Index('idx_calculated_at', 'calculated_at'),
         Index('idx_needs_attention', 'needs_attention'),
+        Index('idx_kpi_live_chat_latest', 'chat_id', db.text('calculated_at DESC'),
+              postgresql_include=['needs_attention']),
+        Index('idx_kpi_live_attention', db.text('calculated_at DESC'),
+              postgresql_where=db.text("needs_attention = true")),
     )
 
 
+class User(db.Model):
+    """Latest known identity and activity counters of a Telegram user"""
+    __tablename__ = 'users'
+    
+    user_id = db.Column(db.BigInteger, primary_key=True)  # Telegram user ID
+    username = db.Column(db.String(255))
+    full_name = db.Column(db.String(255))
+    first_seen_at = db.Column(db.DateTime)
+    last_seen_at = db.Column(db.DateTime)
+    
+    # Maintained by triggers on messages (migrations/005_users.sql)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    character_count = db.Column(db.BigInteger, nullable=False, default=0)
+    client_message_count = db.Column(db.Integer, nullable=False, default=0)
+    client_character_count = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    # Trigram indexes for substring search are created by migrations/005_users.sql
+    __table_args__ = (
+        Index('idx_users_client_message_count', 'client_message_count'),
+    )
+    
+    def __repr__(self):
+        return f'<User {self.user_id}: {self.full_name}>'
+
+
 class TeamMember(db.Model):
     """Team members configuration"""
     __tablename__ = 'team_members'
@@ -129,6 +183,31 @@ class TeamMember(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class SentimentCacheEntry(db.Model):
+    """Cached sentiment of a normalized message text (sentiment_cache.py)"""
+    __tablename__ = 'sentiment_cache'
+    
+    # sha256 of the model/prompt version and the normalized text
+    cache_key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.String(150), nullable=False)
+    normalized_text = db.Column(db.Text, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    label = db.Column(db.String(20), nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    # API calls saved by this entry
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_sentiment_cache_created_at', 'created_at'),
+        Index('idx_sentiment_cache_last_used_at', 'last_used_at'),
+    )
+    
+    def __repr__(self):
+        return f'<SentimentCacheEntry {self.label}: {self.normalized_text[:30]}>'
+
+
 class SystemConfig(db.Model):
     """System configuration settings"""
     __tablename__ = 'system_config'
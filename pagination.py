@@ -0,0 +1,102 @@
+"""
+Keyset (cursor) pagination helpers
+
+A cursor is an opaque URL-safe token holding the sort key values of the last
+row of a page. The next page continues strictly after that row, so each page
+is a single index range scan no matter how deep the client has scrolled, and
+rows inserted meanwhile neither shift nor duplicate results (unlike OFFSET).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, or_
+
+
+class CursorError(ValueError):
+    """Malformed or mismatching pagination cursor"""
+
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    """
+    Build an opaque cursor from the sort key values of the last row
+
+    Args:
+        sort: Name of the sort order the cursor belongs to
+        values: Sort key values of the last row (last one must be unique, e.g. id)
+
+    Returns:
+        URL-safe cursor string
+    """
+    payload = {
+        "s": sort,
+        "v": [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    }
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+    """
+    Extract the sort key values from a cursor
+
+    Raises:
+        CursorError: If the cursor is malformed or was issued for another sort order
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        cursor_sort = payload["s"]
+        values = payload["v"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorError(f"Invalid cursor: {e}")
+
+    if cursor_sort != sort or not isinstance(values, list):
+        raise CursorError("Cursor does not match the requested sort order")
+
+    return values
+
+
+def keyset_condition(columns: Sequence, values: Sequence[Any], descending: bool = False):
+    """
+    Condition selecting rows strictly after `values` in (columns) order
+
+    Expands (a, b) > (x, y) into `a > x OR (a = x AND b > y)`, which every
+    backend can serve from a composite index.
+    """
+    conditions = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        after = column < values[i] if descending else column > values[i]
+        conditions.append(and_(*equal_prefix, after))
+    return or_(*conditions)
+
+
+def parse_limit(raw_limit: Optional[str], default: int, max_limit: int) -> int:
+    """Clamp a page size query parameter to 1..max_limit"""
+    try:
+        limit = int(raw_limit) if raw_limit not in (None, "") else default
+    except ValueError:
+        raise CursorError(f"Invalid limit: {raw_limit}")
+    return max(1, min(limit, max_limit))
+
+
+def paginate_rows(rows: List, limit: int, sort: str, key_of) -> Dict:
+    """
+    Split a `limit + 1` query result into a page and the cursor of the next one
+
+    Args:
+        rows: Rows fetched with LIMIT limit + 1
+        limit: Page size
+        sort: Sort order name stored in the cursor
+        key_of: Callable returning the sort key values of a row
+
+    Returns:
+        Dict with 'items', 'next_cursor' and 'has_more'
+    """
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = encode_cursor(sort, key_of(items[-1])) if has_more and items else None
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
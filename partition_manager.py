@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Maintenance of the monthly messages partitions
+
+Only relevant after migrations/optional/messages_partitioning.sql. Creates
+the partitions of the coming months ahead of time (rows that already landed
+in messages_default for such a month are moved into the new partition) and
+detaches partitions older than the retention period, then keeps them as
+standalone messages_archive_YYYY_MM tables or drops them. Settings are read
+from performance.partitioning in config.yaml; the worker runs
+maintain_partitions() once a day.
+
+Detached months disappear from every report; the users counters
+(migrations/005_users.sql) keep counting their messages.
+
+Usage:
+    python partition_manager.py              # list partitions
+    python partition_manager.py --maintain   # create / detach partitions now
+"""
+
+import argparse
+import logging
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'messages'
+PARTITION_PREFIX = 'messages_p'
+DEFAULT_PARTITION = 'messages_default'
+ARCHIVE_PREFIX = 'messages_archive_'
+ARCHIVE_ACTIONS = ('keep', 'drop')
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partitioning_config() -> Dict:
+    """performance.partitioning with defaults"""
+    config = ConfigManager().get_performance_config().get('partitioning', {})
+    action = config.get('archive_action', 'keep')
+    if action not in ARCHIVE_ACTIONS:
+        logger.error(f"Unknown partitioning.archive_action {action!r}, using 'keep'")
+        action = 'keep'
+    return {
+        'premake_months': int(config.get('premake_months', 3)),
+        'retention_months': int(config.get('retention_months', 0)),
+        'archive_action': action,
+        'lock_timeout': config.get('lock_timeout', '5s'),
+        'maintenance_interval': int(config.get('maintenance_interval', 86400)),
+    }
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month `months` after the month of `month`"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding the given month"""
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def is_partitioned(connection) -> bool:
+    """Whether messages is a partitioned table"""
+    return bool(connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {'table': PARENT_TABLE}).scalar())
+
+
+def list_partitions(connection) -> List[Dict]:
+    """
+    Partitions of messages with their bounds
+
+    Returns:
+        Dicts with name, lower and upper (dates, None for the default
+        partition), estimated rows and size in bytes, ordered by lower bound
+    """
+    rows = connection.execute(text(
+        "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound, "
+        "c.reltuples AS rows, pg_total_relation_size(c.oid) AS size "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {'table': PARENT_TABLE}).all()
+
+    partitions = []
+    for row in rows:
+        match = _BOUND_PATTERN.search(row.bound or '')
+        partitions.append({
+            'name': row.name,
+            'lower': datetime.fromisoformat(match.group(1)).date() if match else None,
+            'upper': datetime.fromisoformat(match.group(2)).date() if match else None,
+            'rows': max(int(row.rows), 0),
+            'size': row.size,
+        })
+    return sorted(partitions, key=lambda item: (item['lower'] is None, item['lower'] or date.min))
+
+
+def create_partition(connection, month: date, lock_timeout: str = '5s') -> int:
+    """
+    Create the partition of one month
+
+    Rows of that month already in the default partition are moved into it:
+    the partition cannot be attached while the default partition holds rows
+    of its range. They are re-inserted through the parent, so the triggers
+    keep updated_at and the users counters consistent.
+
+    Returns:
+        Number of rows moved out of the default partition
+    """
+    name = partition_name(month)
+    bounds = {'lower': datetime.combine(month, datetime.min.time()),
+              'upper': datetime.combine(add_months(month, 1), datetime.min.time())}
+
+    connection.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+    connection.execute(text(f"CREATE TEMP TABLE partition_rows (LIKE {PARENT_TABLE}) ON COMMIT DROP"))
+    moved = connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE \"timestamp\" >= :lower AND \"timestamp\" < :upper RETURNING *) "
+        f"INSERT INTO partition_rows SELECT * FROM moved"
+    ), bounds).rowcount
+
+    connection.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{bounds['lower']:%Y-%m-%d}') TO ('{bounds['upper']:%Y-%m-%d}')"
+    ))
+    if moved:
+        connection.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM partition_rows"))
+    return moved
+
+
+def ensure_partitions(engine, months_ahead: int, today: Optional[date] = None, lock_timeout: str = '5s') -> List[str]:
+    """
+    Create missing partitions from the current month to months_ahead months ahead
+
+    Each partition is created in its own transaction.
+
+    Returns:
+        Names of the created partitions
+    """
+    current = (today or datetime.utcnow().date()).replace(day=1)
+    with engine.connect() as connection:
+        existing = {item['name'] for item in list_partitions(connection)}
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        with engine.begin() as connection:
+            moved = create_partition(connection, month, lock_timeout)
+        created.append(name)
+        logger.info(f"Created partition {name}" + (f", moved {moved} rows from {DEFAULT_PARTITION}" if moved else ""))
+    return created
+
+
+def detach_old_partitions(engine, retention_months: int, action: str = 'keep',
+                          today: Optional[date] = None, lock_timeout: str = '5s') -> List[str]:
+    """
+    Detach partitions whose whole month is older than retention_months
+
+    Args:
+        engine: SQLAlchemy engine
+        retention_months: Months kept attached besides the current one (0 disables detaching)
+        action: 'keep' renames detached partitions to messages_archive_YYYY_MM, 'drop' drops them
+
+    Returns:
+        Names of the detached partitions
+    """
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months((today or datetime.utcnow().date()).replace(day=1), -retention_months)
+    with engine.connect() as connection:
+        expired = [item for item in list_partitions(connection)
+                   if item['upper'] is not None and item['upper'] <= cutoff]
+
+    detached = []
+    for partition in expired:
+        name = partition['name']
+        with engine.begin() as connection:
+            connection.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+            connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if action == 'drop':
+                connection.execute(text(f"DROP TABLE {name}"))
+            else:
+                connection.execute(text(f"ALTER TABLE {name} RENAME TO {ARCHIVE_PREFIX}{partition['lower']:%Y_%m}"))
+        detached.append(name)
+        logger.info(f"Detached partition {name} ({'dropped' if action == 'drop' else 'archived'})")
+    return detached
+
+
+def maintain_partitions(engine, today: Optional[date] = None) -> Dict:
+    """
+    Create upcoming partitions and detach expired ones, as configured
+
+    Does nothing when messages is not partitioned.
+
+    Returns:
+        Dict with 'created' and 'detached' partition names
+    """
+    with engine.connect() as connection:
+        if engine.dialect.name != 'postgresql' or not is_partitioned(connection):
+            return {'created': [], 'detached': []}
+
+    config = partitioning_config()
+    return {
+        'created': ensure_partitions(engine, config['premake_months'], today, config['lock_timeout']),
+        'detached': detach_old_partitions(engine, config['retention_months'], config['archive_action'],
+                                          today, config['lock_timeout']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monthly partitions of the messages table")
+    parser.add_argument("--maintain", action="store_true", help="Create upcoming and detach expired partitions")
+    args = parser.parse_args()
+
+    from app import app, db
+
+    with app.app_context():
+        if args.maintain:
+            result = maintain_partitions(db.engine)
+            print(f"Created: {', '.join(result['created']) or '-'}")
+            print(f"Detached: {', '.join(result['detached']) or '-'}")
+
+        with db.engine.connect() as connection:
+            if not is_partitioned(connection):
+                print("messages is not partitioned "
+                      "(python migrate.py --optional messages_partitioning.sql)")
+                return
+            for partition in list_partitions(connection):
+                bounds = (f"{partition['lower']} .. {partition['upper']}"
+                          if partition['lower'] else "default")
+                print(f"{partition['name']:<28} {bounds:<26} ~{partition['rows']:>10} rows "
+                      f"{partition['size'] / 1024 / 1024:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,188 @@
+"""
+Per-request SQL query instrumentation
+
+SQLAlchemy cursor events count the statements executed while serving a
+request and the time spent in the database. Admin requests get the totals
+back as X-Query-Count / X-DB-Time headers, slow requests are logged with
+their most expensive statements, and the budget helpers let checks fail
+when an endpoint starts issuing more queries than it should (N+1), see
+check_query_budgets.py.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize_statement(statement: str) -> str:
+    """Collapse whitespace so identical statements group together"""
+    return _WHITESPACE.sub(" ", statement).strip()[:300]
+
+
+class QueryStats:
+    """Statements executed during one request (or budget block)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self._statements = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            entry = self._statements[_normalize_statement(statement)]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def top_statements(self, limit: int = 5) -> List[Dict]:
+        """Statements with the largest total time"""
+        with self._lock:
+            ranked = sorted(self._statements.items(), key=lambda item: item[1][1], reverse=True)
+            return [
+                {"statement": statement, "count": count, "total_ms": round(seconds * 1000, 1)}
+                for statement, (count, seconds) in ranked[:limit]
+            ]
+
+    def summary(self, limit: int = 5) -> str:
+        lines = [f"{self.count} queries, {self.total_seconds * 1000:.1f} ms in DB"]
+        for entry in self.top_statements(limit):
+            lines.append(f"  {entry['count']}x {entry['total_ms']} ms: {entry['statement']}")
+        return "\n".join(lines)
+
+
+# Extra collectors (budget blocks) that receive every statement, any thread
+_collectors: List[QueryStats] = []
+_collectors_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_statement(conn, statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute: close its entry
+    # here, or the connection's stack keeps growing (and the time is lost)
+    if exception_context.connection is not None and exception_context.execution_context is not None:
+        _finish_statement(exception_context.connection, exception_context.statement)
+
+
+def _finish_statement(conn, statement):
+    """Pop the statement's start time and record it"""
+    start_times = conn.info.get("query_start_times")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    if has_app_context():
+        stats = g.get("_query_stats")
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    if _collectors:
+        with _collectors_lock:
+            collectors = list(_collectors)
+        for collector in collectors:
+            collector.record(statement, elapsed)
+
+
+def bind_query_stats(stats: QueryStats):
+    """Count queries of another app context (e.g. a worker thread) into a request's stats"""
+    g._query_stats = stats
+
+
+def get_query_stats():
+    """Query stats of the current request, if any"""
+    return g.get("_query_stats") if has_app_context() else None
+
+
+def init_query_metrics(app, is_admin: Callable[[], bool]):
+    """
+    Register request hooks collecting query statistics
+
+    Args:
+        app: Flask application
+        is_admin: Callable telling whether the current request may see the headers
+    """
+    performance = ConfigManager().get_performance_config()
+    slow_request_ms = performance.get("slow_request_ms", 1000)
+    top_statements = performance.get("slow_request_top_statements", 5)
+
+    @app.before_request
+    def start_query_stats():
+        g._query_stats = QueryStats()
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get("_query_stats")
+        if stats is None:
+            return response
+
+        elapsed_ms = (time.perf_counter() - g._request_started) * 1000
+        if elapsed_ms >= slow_request_ms:
+            logger.warning(f"Slow request {request.method} {request.full_path} took {elapsed_ms:.0f} ms, "
+                           f"{stats.summary(top_statements)}")
+
+        if is_admin():
+            response.headers["X-Query-Count"] = str(stats.count)
+            response.headers["X-DB-Time"] = f"{stats.total_seconds * 1000:.1f}ms"
+
+        return response
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Fail if the block executes more than max_queries SQL statements
+
+    Counts statements from every thread, so it also covers bundle sections
+    computed on the thread pool. Used by check_query_budgets.py:
+
+        with query_budget(10):
+            client.get('/api/team-members', headers=admin_headers)
+    """
+    stats = QueryStats()
+    with _collectors_lock:
+        _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        with _collectors_lock:
+            _collectors.remove(stats)
+
+    if stats.count > max_queries:
+        raise AssertionError(f"Query budget exceeded: {stats.count} > {max_queries}\n{stats.summary(10)}")
+
+
+def assert_response_query_budget(response, max_queries: int):
+    """Check the X-Query-Count header of an admin response against a budget"""
+    header = response.headers.get("X-Query-Count")
+    if header is None:
+        raise AssertionError("Response has no X-Query-Count header (was the admin token sent?)")
+
+    count = int(header)
+    if count > max_queries:
+        raise AssertionError(f"Query budget exceeded: {count} > {max_queries}")
@@ -0,0 +1,202 @@
+"""
+Coalescing of identical in-flight computations (single-flight)
+
+When several requests ask for the same expensive computation at the same
+time, only one of them computes it and the others wait for and share the
+result. Within a process the waiters block on a threading.Event; across
+processes (gunicorn workers) the leader holds a Redis lock and publishes the
+serialized result under a short-lived key that the other processes poll.
+
+The result is serialized once, with the encoder of the JSON responses
+(json_response.dumps_bytes), and every caller, the leader included, gets its
+own copy decoded from it. So callers see the same types (ISO date strings,
+Decimals as numbers) whichever of them ran the computation.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import redis
+
+from config_manager import ConfigManager
+from json_response import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+# Release the lock only if it still belongs to us
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _InFlightCall:
+    """A computation currently running in this process"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.payload = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run identical concurrent computations once and share the result"""
+
+    def __init__(self, namespace: str = "singleflight"):
+        self.namespace = namespace
+        self.config = ConfigManager()
+
+        settings = self.config.get_performance_config().get("request_coalescing", {})
+        self.enabled = settings.get("enabled", True)
+        self.wait_timeout = settings.get("wait_timeout", 30)
+        self.lock_ttl = settings.get("lock_ttl", 60)
+        self.result_ttl = settings.get("result_ttl", 5)
+        self.poll_interval = settings.get("poll_interval", 0.1)
+
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+    def make_key(self, name: str, params: Dict) -> str:
+        """Build a stable key from a computation name and its parameters"""
+        normalized = json.dumps(params, sort_keys=True, default=str)
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return f"{name}:{digest}"
+
+    def do(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Return the result of compute(), sharing it with identical concurrent calls
+
+        Args:
+            key: Identity of the computation (see make_key)
+            compute: Callable producing a JSON-serializable result
+
+        Returns:
+            The computed (or shared) result, decoded from its JSON
+        """
+        if not self.enabled:
+            return compute()
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+
+        if not is_leader:
+            if call.event.wait(self.wait_timeout):
+                logger.debug(f"Coalesced in-process request for {key}")
+                if call.error is not None:
+                    raise call.error
+                return json.loads(call.payload)
+            logger.warning(f"Timed out waiting for in-flight {key}, computing independently")
+            return json.loads(dumps_bytes(compute()))
+
+        try:
+            call.payload = self._do_across_processes(key, compute)
+            return json.loads(call.payload)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _do_across_processes(self, key: str, compute: Callable[[], Any]) -> bytes:
+        """Coordinate with other processes through a Redis lock, return the serialized result"""
+        client = self._get_redis()
+        if client is None:
+            return dumps_bytes(compute())
+
+        lock_key = f"{self.namespace}:lock:{key}"
+        result_key = f"{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            cached = client.get(result_key)
+            if cached is not None:
+                logger.debug(f"Reusing result published by another process for {key}")
+                return cached
+
+            acquired = client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except redis.RedisError as e:
+            self._mark_redis_down(e)
+            return dumps_bytes(compute())
+
+        if acquired:
+            try:
+                payload = dumps_bytes(compute())
+                try:
+                    client.set(result_key, payload, px=int(self.result_ttl * 1000))
+                except redis.RedisError as e:
+                    logger.warning(f"Could not publish coalesced result for {key}: {e}")
+                return payload
+            finally:
+                try:
+                    client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except redis.RedisError as e:
+                    logger.warning(f"Could not release coalescing lock for {key}: {e}")
+
+        return self._wait_for_other_process(client, key, lock_key, result_key, compute)
+
+    def _wait_for_other_process(self, client, key: str, lock_key: str, result_key: str,
+                                compute: Callable[[], Any]) -> bytes:
+        """Poll for the result of a computation running in another process"""
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            while time.monotonic() < deadline:
+                cached = client.get(result_key)
+                if cached is not None:
+                    logger.debug(f"Coalesced cross-process request for {key}")
+                    return cached
+
+                # Lock gone without a result: the leader failed
+                if not client.exists(lock_key):
+                    break
+
+                time.sleep(self.poll_interval)
+        except redis.RedisError as e:
+            self._mark_redis_down(e)
+
+        logger.warning(f"No shared result for {key}, computing independently")
+        return dumps_bytes(compute())
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        """Get Redis client, backing off for a while after a failure"""
+        if self._redis is not None:
+            return self._redis
+
+        if time.monotonic() < self._redis_retry_at:
+            return None
+
+        try:
+            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+            client = redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+            client.ping()
+            self._redis = client
+        except redis.RedisError as e:
+            self._mark_redis_down(e)
+
+        return self._redis
+
+    def _mark_redis_down(self, error: Exception):
+        """Fall back to in-process coalescing for the next 30 seconds"""
+        logger.warning(f"Redis unavailable for request coalescing: {error}")
+        self._redis = None
+        self._redis_retry_at = time.monotonic() + 30
+
+
+# Global coalescer instance
+request_coalescer = SingleFlight()
@@ -0,0 +1,124 @@
+"""
+Request-scoped memoization of expensive analyzer and KPI calls
+
+Inside a Flask app context the memo lives on `g`, so every call made while
+serving one request (including bundle sections running in worker threads,
+see bind_request_memo) shares it. Outside Flask it lives in the
+SQLAlchemy session's `info` dict and is dropped together with the session.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from flask import g, has_app_context
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_SESSION_INFO_KEY = "request_memo"
+
+
+class RequestMemo:
+    """Results of calls made during one request, keyed on their arguments"""
+
+    def __init__(self):
+        self._values: Dict[tuple, Any] = {}
+        self._durations: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.saved_seconds = defaultdict(float)
+
+    def get_or_compute(self, namespace: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the memoized result for (namespace, key), computing it on first use
+
+        Args:
+            namespace: Name of the memoized call, used in the statistics
+            key: Hashable call arguments
+            compute: Callable producing the result
+
+        Returns:
+            The computed or memoized result
+        """
+        full_key = (namespace, key)
+        with self._lock:
+            if full_key in self._values:
+                self.hits[namespace] += 1
+                self.saved_seconds[namespace] += self._durations[full_key]
+                return self._values[full_key]
+
+        started = time.perf_counter()
+        value = compute()
+        duration = time.perf_counter() - started
+
+        with self._lock:
+            self.misses[namespace] += 1
+            self._values[full_key] = value
+            self._durations[full_key] = duration
+        return value
+
+    def stats(self) -> Dict:
+        """Hit/miss counts and estimated time saved per namespace"""
+        with self._lock:
+            namespaces = set(self.hits) | set(self.misses)
+            return {
+                namespace: {
+                    "hits": self.hits[namespace],
+                    "misses": self.misses[namespace],
+                    "saved_ms": round(self.saved_seconds[namespace] * 1000, 1)
+                }
+                for namespace in sorted(namespaces)
+            }
+
+    def log_savings(self, label: str = "request"):
+        """Report memo savings in debug logs"""
+        stats = self.stats()
+        if not stats:
+            return
+
+        total_hits = sum(s["hits"] for s in stats.values())
+        total_saved = sum(s["saved_ms"] for s in stats.values())
+        details = ", ".join(
+            f"{namespace}: {s['hits']} hits/{s['misses']} misses, {s['saved_ms']} ms"
+            for namespace, s in stats.items()
+        )
+        logger.debug(f"Memo for {label}: {total_hits} repeated calls avoided, "
+                     f"~{total_saved:.1f} ms saved ({details})")
+
+
+def get_request_memo(session: Optional[Session] = None) -> Optional[RequestMemo]:
+    """
+    Get the memo of the current request (Flask `g`) or of the given session
+
+    Returns:
+        RequestMemo, or None when there is neither an app context nor a session
+    """
+    if has_app_context():
+        memo = g.get("_request_memo")
+        if memo is None:
+            memo = RequestMemo()
+            g._request_memo = memo
+        return memo
+
+    if session is not None:
+        return session.info.setdefault(_SESSION_INFO_KEY, RequestMemo())
+
+    return None
+
+
+def bind_request_memo(memo: RequestMemo):
+    """Share a request's memo with another app context (e.g. a worker thread)"""
+    g._request_memo = memo
+
+
+def memoized_call(session: Optional[Session], namespace: str, key: Hashable,
+                  compute: Callable[[], Any]) -> Any:
+    """Run compute() through the current memo, or directly when there is none"""
+    memo = get_request_memo(session)
+    if memo is None:
+        return compute()
+    return memo.get_or_compute(namespace, key, compute)
@@ -11,10 +11,38 @@ from sqlalchemy import and_, desc, func
 
 from models import Message, Chat, TeamMember
 from config_manager import ConfigManager
+from request_memo import memoized_call
 
 logger = logging.getLogger(__name__)
 
 
+def conversation_turns(messages: List[Message]) -> List[Tuple[List[Message], Optional[Message]]]:
+    """
+    Делит сообщения чата на ходы диалога: серия подряд идущих сообщений
+    клиента и первое сообщение сотрудника после нее (None, если ответа еще
+    нет). Сообщения сотрудника без предшествующей серии клиента пропускаются.
+    
+    Args:
+        messages: Список сообщений, отсортированный по времени
+        
+    Returns:
+        Список пар (сообщения клиента, ответ сотрудника)
+    """
+    turns = []
+    client_messages = []
+    
+    for message in messages:
+        if not message.is_team_member:
+            client_messages.append(message)
+        elif client_messages:
+            turns.append((client_messages, message))
+            client_messages = []
+    
+    if client_messages:
+        turns.append((client_messages, None))
+    return turns
+
+
 class ResponseTimeAnalyzer:
     """Анализатор времени ответа сотрудников на сообщения клиентов"""
     
@@ -35,13 +63,18 @@ class ResponseTimeAnalyzer:
         Returns:
             Словарь с метриками времени ответа
         """
+        # Результат переиспользуется в рамках одного запроса
+        return memoized_call(
+            session, "analyze_chat_response_times", (chat_id, start_time, end_time),
+            lambda: self._analyze_chat_response_times(session, chat_id, start_time, end_time)
+        )
+    
+    def _analyze_chat_response_times(self, session: Session, chat_id: int,
+                                     start_time: datetime, end_time: datetime) -> Dict:
+        """Анализ времени ответа для чата без мемоизации"""
         try:
             # Получаем все сообщения в указанном периоде
-            messages = session.query(Message).filter(
-                Message.chat_id == chat_id,
-                Message.timestamp >= start_time,
-                Message.timestamp <= end_time
-            ).order_by(Message.timestamp).all()
+            messages = self.get_chat_messages(session, chat_id, start_time, end_time)
             
             if not messages:
                 return self._empty_response_metrics()
@@ -59,6 +92,32 @@ class ResponseTimeAnalyzer:
             logger.error(f"Ошибка анализа времени ответа для чата {chat_id}: {e}")
             return self._empty_response_metrics()
     
+    def get_chat_messages(self, session: Session, chat_id: int,
+                          start_time: datetime, end_time: datetime) -> List[Message]:
+        """
+        Сообщения чата за период, отсортированные по времени
+        
+        Загружаются не более одного раза за запрос; возвращаемый список
+        используется только для чтения.
+        
+        Args:
+            session: Сессия базы данных
+            chat_id: ID чата
+            start_time: Начало периода
+            end_time: Конец периода
+            
+        Returns:
+            Список сообщений
+        """
+        return memoized_call(
+            session, "chat_messages", (chat_id, start_time, end_time),
+            lambda: session.query(Message).filter(
+                Message.chat_id == chat_id,
+                Message.timestamp >= start_time,
+                Message.timestamp <= end_time
+            ).order_by(Message.timestamp).all()
+        )
+    
     def _calculate_conversation_response_times(self, messages: List[Message]) -> List[int]:
         """
         Рассчитывает время ответа для каждого диалога клиент-сотрудник
@@ -71,31 +130,15 @@ class ResponseTimeAnalyzer:
         """
         response_times = []
         
-        # Группируем сообщения по диалогам
-        current_client_message = None
-        
-        for message in messages:
-            if not message.is_team_member:
-                # Сообщение от клиента
-                if current_client_message is None:
-                    current_client_message = message
-                else:
-                    # Если предыдущее сообщение клиента не получило ответа,
-                    # обновляем на более новое
-                    current_client_message = message
-                    
-            else:
-                # Сообщение от сотрудника
-                if current_client_message is not None:
-                    # Рассчитываем время ответа
-                    response_time = (message.timestamp - current_client_message.timestamp).total_seconds()
-                    
-                    # Добавляем только положительные времена ответа
-                    if response_time > 0:
-                        response_times.append(int(response_time))
-                    
-                    # Сбрасываем текущее сообщение клиента
-                    current_client_message = None
+        for client_messages, reply in conversation_turns(messages):
+            if reply is None:
+                continue
+            # Время ответа считается от последнего сообщения клиента
+            response_time = (reply.timestamp - client_messages[-1].timestamp).total_seconds()
+            
+            # Добавляем только положительные времена ответа
+            if response_time > 0:
+                response_times.append(int(response_time))
         
         return response_times
     
@@ -232,10 +275,6 @@ class ResponseTimeAnalyzer:
             
             # Анализируем каждый чат
             for (chat_id,) in chats_with_member:
-                chat_metrics = self.analyze_chat_response_times(
-                    session, chat_id, start_time, end_time
-                )
-                
                 # Получаем времена ответа только этого сотрудника
                 member_response_times = self._get_member_response_times(
                     session, chat_id, user_id, start_time, end_time
@@ -1,17 +1,34 @@
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from flask import request, jsonify, render_template, redirect, url_for, flash
-from sqlalchemy import desc, func
+from flask import request, jsonify, render_template, redirect, url_for, flash, g, Response, stream_with_context
+from sqlalchemy import case, desc, func
 from sqlalchemy.orm import sessionmaker
 
 from app import app, db
-from models import Chat, Message, KpiLive, TeamMember, SystemConfig
+from models import Chat, Message, KpiLive, TeamMember, SystemConfig, User
 from config_manager import ConfigManager
 from kpi_calculator import KpiCalculator
 from response_time_analyzer import ResponseTimeAnalyzer
 from sentiment_analyzer import SentimentAnalyzer
-from timezone_utils import moscow_date_to_utc_range, utc_to_moscow, format_moscow_date, get_moscow_now, format_configured_time
+from sentiment_metrics import load_backfill_snapshots, load_snapshot, pipeline_status, prometheus_lines
+from sentiment_queue import backlog_stats
+from request_coalescer import request_coalescer
+from request_memo import get_request_memo, bind_request_memo
+from query_metrics import init_query_metrics, get_query_stats, bind_query_stats
+from json_response import encoded_json_response, init_response_compression, response_cache
+from data_export import (EXPORT_FORMATS, MESSAGE_EXPORT_FIELDS, KPI_EXPORT_FIELDS,
+                         build_messages_export_query, build_kpis_export_query, export_stream)
+from delta_sync import changed_values, current_watermark, decode_since, encode_since
+from live_events import iter_sse_events, subscriber_client
+from message_search import SEARCH_SORTS, search_messages
+from user_search import search_users
+from db_routing import bind_replica_state, get_replica_state, replica_reads, replica_router
+from pagination import CursorError, decode_cursor, encode_cursor, keyset_condition, paginate_rows, parse_limit
+from timezone_utils import (moscow_date_to_utc_range, utc_to_moscow, format_moscow_date, get_moscow_now,
+                            local_date, local_date_to_utc_range, local_day_key, local_timestamp,
+                            to_local_naive_many, format_configured_time)
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +59,13 @@ def verify_admin_token():
     return token == expected_token
 
 
+# Query count / DB time headers for admins, slow request logging
+init_query_metrics(app, verify_admin_token)
+
+# orjson serialization, gzip/brotli compression of large responses
+init_response_compression(app)
+
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -57,6 +81,7 @@ def response_time_analysis_page():
 
 
 @app.route('/dashboard-data')
+@replica_reads
 def dashboard_data():
     """API endpoint for dashboard data"""
     
@@ -121,14 +146,15 @@ def dashboard_data():
 def get_chats_needing_attention():
     """Get chats that need attention"""
     try:
-        # Get latest KPIs for chats needing attention
-        attention_kpis = db.session.query(KpiLive).filter(
+        # Get latest KPIs for chats needing attention, with their chats in the same query
+        attention_kpis = db.session.query(KpiLive, Chat).join(
+            Chat, Chat.id == KpiLive.chat_id
+        ).filter(
             KpiLive.needs_attention == True
         ).order_by(desc(KpiLive.calculated_at)).limit(20).all()
         
         chats_attention = []
-        for kpi in attention_kpis:
-            chat = db.session.query(Chat).filter_by(id=kpi.chat_id).first()
+        for kpi, chat in attention_kpis:
             if chat:
                 chats_attention.append({
                     "chat_id": chat.id,
@@ -152,7 +178,7 @@ def get_activity_data(start_time, end_time):
     try:
         # Hourly message counts
         hourly_data = db.session.query(
-            func.date_trunc('hour', Message.timestamp).label('hour'),
+            func.date_trunc('hour', local_timestamp(Message.timestamp)).label('hour'),
             func.count(Message.id).label('total_messages'),
             func.sum(func.cast(~Message.is_team_member, db.Integer)).label('client_messages'),
             func.sum(func.cast(Message.is_team_member, db.Integer)).label('team_messages')
@@ -162,7 +188,7 @@ def get_activity_data(start_time, end_time):
         ).group_by('hour').order_by('hour').all()
         
         activity_chart = {
-            "labels": [format_configured_time(row.hour, '%H:00') or row.hour.strftime('%H:00') for row in hourly_data],
+            "labels": [row.hour.strftime('%H:00') for row in hourly_data],
             "datasets": [
                 {
                     "label": "Client Messages",
@@ -215,7 +241,7 @@ def get_sentiment_data(start_time, end_time):
         
         # Average sentiment over time
         daily_sentiment = db.session.query(
-            func.date(Message.timestamp).label('date'),
+            local_date(Message.timestamp).label('date'),
             func.avg(Message.sentiment_score).label('avg_sentiment')
         ).filter(
             Message.timestamp >= start_time,
@@ -371,9 +397,11 @@ def health_check():
         r = redis.from_url(redis_url)
         r.ping()
         
+        # A replica that is down or lagging only moves reads to the primary
         return jsonify({
             "status": "healthy",
             "database": "connected",
+            "read_replica": replica_router.status(),
             "redis": "connected",
             "recent_messages": recent_messages,
             "timestamp": datetime.utcnow().isoformat()
@@ -396,6 +424,64 @@ def chat_management():
     return render_template('chat_management.html', admin_token=admin_token)
 
 
+# Keyset pagination of list endpoints
+pagination_config = config_manager.get_performance_config().get("pagination", {})
+
+CHAT_SORTS = {
+    'title': ((Chat.title, Chat.id), False),
+    'id': ((Chat.id,), False),
+}
+
+TEAM_MEMBER_SORTS = {
+    'full_name': ((TeamMember.full_name, TeamMember.id), False),
+    'id': ((TeamMember.id,), False),
+}
+
+
+def parse_page_args(sorts, default_sort):
+    """
+    Read cursor, limit and sort query parameters
+
+    Pagination is opt-in: without `cursor` and `limit` the whole list is returned.
+
+    Returns:
+        Tuple (sort, limit or None, cursor values or None)
+
+    Raises:
+        CursorError: On unknown sort, bad limit or malformed cursor
+    """
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        raise CursorError(f"Unknown sort: {sort}")
+
+    cursor = request.args.get('cursor')
+    if cursor is None and 'limit' not in request.args:
+        return sort, None, None
+
+    limit = parse_limit(request.args.get('limit'),
+                        pagination_config.get('default_limit', 50),
+                        pagination_config.get('max_limit', 200))
+    after = decode_cursor(cursor, sort) if cursor else None
+    return sort, limit, after
+
+
+def fetch_keyset_page(query, sorts, sort, limit=None, after=None):
+    """Run a query in the given sort order, starting after the cursor values"""
+    columns, descending = sorts[sort]
+    if after is not None:
+        if len(after) != len(columns):
+            raise CursorError("Cursor does not match the requested sort order")
+        query = query.filter(keyset_condition(columns, after, descending))
+    query = query.order_by(*[column.desc() if descending else column for column in columns])
+
+    if limit is None:
+        return {'items': query.all(), 'next_cursor': None, 'has_more': False}
+
+    rows = query.limit(limit + 1).all()
+    return paginate_rows(rows, limit, sort,
+                         lambda row: [getattr(row, column.key) for column in columns])
+
+
 @app.route('/api/chats-management')
 def api_chats_management():
     """API endpoint for chat management data"""
@@ -403,69 +489,89 @@ def api_chats_management():
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        # Получаем все чаты с участниками и статистикой
-        chats_data = []
-        
-        chats = Chat.query.filter_by(is_active=True).all()
-        
-        for chat in chats:
-            # Получаем уникальных участников чата
-            users_query = db.session.query(
-                Message.user_id,
-                Message.username,
-                Message.full_name,
-                Message.is_team_member,
-                func.count(Message.id).label('message_count'),
-                func.sum(func.length(Message.text)).label('character_count')
-            ).filter(
-                Message.chat_id == chat.id
-            ).group_by(
-                Message.user_id,
-                Message.username, 
-                Message.full_name,
-                Message.is_team_member
-            ).all()
-            
-            users = []
-            total_messages = 0
-            team_messages = 0
-            client_messages = 0
-            
-            for user in users_query:
-                total_messages += user.message_count
-                if user.is_team_member:
-                    team_messages += user.message_count
-                else:
-                    client_messages += user.message_count
-                
-                users.append({
-                    'user_id': user.user_id,
-                    'username': user.username,
-                    'full_name': user.full_name,
-                    'is_team_member': user.is_team_member,
-                    'message_count': user.message_count,
-                    'character_count': user.character_count or 0
-                })
-            
-            chats_data.append({
-                'id': chat.id,
-                'title': chat.title,
-                'chat_type': chat.chat_type,
-                'users': users,
-                'stats': {
-                    'total_messages': total_messages,
-                    'team_messages': team_messages,
-                    'client_messages': client_messages
-                }
-            })
-        
-        return jsonify({'chats': chats_data})
+        sort, limit, after = parse_page_args(CHAT_SORTS, 'title')
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        return jsonify(build_chats_management(sort, limit, after))
         
     except Exception as e:
         logger.error(f"Error getting chats management data: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_chats_management(sort='title', limit=None, after=None):
+    """Active chats of one page with participants and statistics (two queries)"""
+    page = fetch_keyset_page(Chat.query.filter_by(is_active=True), CHAT_SORTS, sort, limit, after)
+    chats = page['items']
+    
+    # Участники всех чатов страницы одним сгруппированным запросом
+    users_by_chat = {chat.id: [] for chat in chats}
+    if chats:
+        users_query = db.session.query(
+            Message.chat_id,
+            Message.user_id,
+            Message.username,
+            Message.full_name,
+            Message.is_team_member,
+            func.count(Message.id).label('message_count'),
+            func.sum(func.length(Message.text)).label('character_count')
+        ).filter(
+            Message.chat_id.in_(list(users_by_chat))
+        ).group_by(
+            Message.chat_id,
+            Message.user_id,
+            Message.username, 
+            Message.full_name,
+            Message.is_team_member
+        ).all()
+        
+        for user in users_query:
+            users_by_chat[user.chat_id].append(user)
+    
+    chats_data = []
+    for chat in chats:
+        users = []
+        total_messages = 0
+        team_messages = 0
+        client_messages = 0
+        
+        for user in users_by_chat[chat.id]:
+            total_messages += user.message_count
+            if user.is_team_member:
+                team_messages += user.message_count
+            else:
+                client_messages += user.message_count
+            
+            users.append({
+                'user_id': user.user_id,
+                'username': user.username,
+                'full_name': user.full_name,
+                'is_team_member': user.is_team_member,
+                'message_count': user.message_count,
+                'character_count': user.character_count or 0
+            })
+        
+        chats_data.append({
+            'id': chat.id,
+            'title': chat.title,
+            'chat_type': chat.chat_type,
+            'users': users,
+            'stats': {
+                'total_messages': total_messages,
+                'team_messages': team_messages,
+                'client_messages': client_messages
+            }
+        })
+    
+    return {
+        'chats': chats_data,
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    }
+
+
 @app.route('/api/chat-users/<int:chat_id>')
 def api_chat_users(chat_id):
     """Get users for specific chat"""
@@ -555,6 +661,7 @@ def chat_details():
 
 
 @app.route('/api/chat-stats/<int:chat_id>')
+@replica_reads
 def api_chat_detailed_stats(chat_id):
     """Get detailed statistics for specific chat"""
     if not verify_admin_token():
@@ -588,11 +695,11 @@ def api_chat_detailed_stats(chat_id):
         
         # Почасовая активность
         hourly_stats = db.session.query(
-            func.date_trunc('hour', Message.timestamp).label('hour'),
-            func.count(func.case([(Message.is_team_member == True, 1)])).label('team_messages'),
-            func.count(func.case([(Message.is_team_member == False, 1)])).label('client_messages'),
-            func.sum(func.case([(Message.is_team_member == True, func.length(Message.text))])).label('team_characters'),
-            func.sum(func.case([(Message.is_team_member == False, func.length(Message.text))])).label('client_characters')
+            func.date_trunc('hour', local_timestamp(Message.timestamp)).label('hour'),
+            func.count(case((Message.is_team_member == True, 1))).label('team_messages'),
+            func.count(case((Message.is_team_member == False, 1))).label('client_messages'),
+            func.sum(case((Message.is_team_member == True, func.length(Message.text)))).label('team_characters'),
+            func.sum(case((Message.is_team_member == False, func.length(Message.text)))).label('client_characters')
         ).filter(
             Message.chat_id == chat_id,
             Message.timestamp >= start_time,
@@ -628,7 +735,7 @@ def api_chat_detailed_stats(chat_id):
         hourly_data = []
         for hour in hourly_stats:
             hourly_data.append({
-                'hour': format_configured_time(hour.hour, '%H:00') if format_configured_time(hour.hour, '%H:00') else hour.hour.strftime('%H:00'),
+                'hour': hour.hour.strftime('%H:00'),
                 'team_messages': hour.team_messages or 0,
                 'client_messages': hour.client_messages or 0,
                 'team_characters': hour.team_characters or 0,
@@ -663,6 +770,7 @@ def api_chat_detailed_stats(chat_id):
 
 
 @app.route('/api/filtered-dashboard-data')
+@replica_reads
 def filtered_dashboard_data():
     """API endpoint for filtered dashboard data"""
     try:
@@ -672,284 +780,378 @@ def filtered_dashboard_data():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Default time range (last 7 days if no dates provided)
-        if start_date and end_date:
-            # Convert Moscow dates to UTC range
-            start_time, _ = moscow_date_to_utc_range(start_date)
-            _, end_time = moscow_date_to_utc_range(end_date)
-        else:
-            # Default to last 7 days in Moscow time
-            moscow_now = get_moscow_now()
-            moscow_end = moscow_now.replace(hour=23, minute=59, second=59, microsecond=999999)
-            moscow_start = (moscow_now - timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # Convert to UTC
-            from timezone_utils import moscow_to_utc
-            end_time = moscow_to_utc(moscow_end).replace(tzinfo=None)
-            start_time = moscow_to_utc(moscow_start).replace(tzinfo=None)
-        
-        # Build query filters
-        query_filters = [
-            Message.timestamp >= start_time,
-            Message.timestamp <= end_time
-        ]
+        start_time, end_time = dashboard_time_range(start_date, end_date)
+        scope = {'view': 'dashboard', 'chat_id': chat_id, 'employee_id': employee_id,
+                 'start': start_time, 'end': end_time}
+        since = decode_since(request.args.get('since'), scope)
+        
+        # Identical concurrent requests share a single computation
+        key = request_coalescer.make_key('filtered-dashboard-data', {
+            'chat_id': chat_id,
+            'employee_id': employee_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'since': since
+        })
         
-        if chat_id:
-            query_filters.append(Message.chat_id == chat_id)
+        def build():
+            next_cursor = encode_since(current_watermark(db.session), scope)
+            data = request_coalescer.do(
+                key, lambda: build_filtered_dashboard_data(chat_id, employee_id, start_date, end_date, since=since)
+            )
+            return dict(data, cursor=next_cursor, delta=since is not None)
         
-        if employee_id:
-            query_filters.append(Message.user_id == employee_id)
+        if since is None:
+            # Full responses are the same for every open dashboard: reuse the encoded body
+            return encoded_json_response(response_cache.get_or_build(key, build))
         
-        # Get filtered messages
-        messages = db.session.query(Message).filter(*query_filters).all()
+        return jsonify(build())
         
-        # Debug log
-        logger.info(f"Filtered messages count: {len(messages)}")
-        logger.info(f"Query filters: {query_filters}")
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting filtered dashboard data: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def dashboard_time_range(start_date, end_date):
+    """UTC range of the dashboard filters (last 7 Moscow days if no dates provided)"""
+    if start_date and end_date:
+        # Convert Moscow dates to UTC range
+        start_time, _ = moscow_date_to_utc_range(start_date)
+        _, end_time = moscow_date_to_utc_range(end_date)
+    else:
+        # Default to last 7 days in Moscow time
+        moscow_now = get_moscow_now()
+        moscow_end = moscow_now.replace(hour=23, minute=59, second=59, microsecond=999999)
+        moscow_start = (moscow_now - timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        # Convert to UTC
+        from timezone_utils import moscow_to_utc
+        end_time = moscow_to_utc(moscow_end).replace(tzinfo=None)
+        start_time = moscow_to_utc(moscow_start).replace(tzinfo=None)
+    
+    return start_time, end_time
+
+
+def dashboard_message_filters(chat_id, employee_id, start_time, end_time):
+    """Message filters shared by the dashboard and the exports"""
+    query_filters = [
+        Message.timestamp >= start_time,
+        Message.timestamp <= end_time
+    ]
+    
+    if chat_id:
+        query_filters.append(Message.chat_id == chat_id)
+    
+    if employee_id:
+        query_filters.append(Message.user_id == employee_id)
+    
+    return query_filters
+
+
+def build_filtered_dashboard_data(chat_id, employee_id, start_date, end_date, analyzer=None, since=None):
+    """
+    Compute filtered dashboard data
+    
+    With `since` (a watermark, see delta_sync) only the clients and employees
+    touched by messages updated after it are recomputed; their ids are listed
+    in 'changed' so the client can also drop entries that disappeared.
+    """
+    start_time, end_time = dashboard_time_range(start_date, end_date)
+    
+    # Build query filters
+    query_filters = dashboard_message_filters(chat_id, employee_id, start_time, end_time)
+    
+    # Calculate enhanced response times using new analyzer
+    analyzer = analyzer or ResponseTimeAnalyzer()
+    
+    general_stats = build_dashboard_general_stats(chat_id, query_filters, start_time, end_time, analyzer)
+    
+    changed_chat_ids = changed_user_ids = None
+    if since is not None:
+        changed_chat_ids = changed_values(db.session, Message.chat_id, query_filters, since)
+        changed_user_ids = changed_values(db.session, Message.user_id, query_filters, since)
+    
+    employees_data = build_dashboard_employees(query_filters, changed_user_ids)
+    clients_data = build_dashboard_clients(query_filters, start_time, end_time, analyzer, changed_chat_ids)
+    
+    result = {
+        'general_stats': general_stats,
+        'employees': employees_data,
+        'clients': clients_data,
+        'period': {
+            'start': format_moscow_date(start_time),
+            'end': format_moscow_date(end_time)
+        }
+    }
+    
+    if since is not None:
+        result['changed'] = {
+            'clients': changed_chat_ids,
+            'employees': changed_user_ids
+        }
+    
+    return result
+
+
+def build_dashboard_general_stats(chat_id, query_filters, start_time, end_time, analyzer):
+    """Totals of the dashboard period, aggregated in SQL"""
+    totals = db.session.query(
+        func.count(Message.id).label('total_messages'),
+        func.count(case((Message.is_team_member == False, 1))).label('client_messages'),
+        func.count(case((Message.is_team_member == True, 1))).label('team_messages'),
+        func.coalesce(func.sum(func.length(Message.text)), 0).label('total_symbols'),
+        func.avg(case((Message.is_team_member == False, Message.sentiment_score))).label('avg_sentiment_score'),
+        func.count(case((Message.is_team_member == False, Message.sentiment_score))).label('sentiment_messages')
+    ).filter(*query_filters).one()
+    
+    total_messages = totals.total_messages or 0
+    client_messages = totals.client_messages or 0
+    team_messages = totals.team_messages or 0
+    total_symbols = int(totals.total_symbols or 0)
+    
+    logger.info(f"Stats: total={total_messages}, client={client_messages}, team={team_messages}, symbols={total_symbols}")
+    
+    # Get overall response metrics for all active chats in the period
+    overall_response_metrics = {
+        'avg_response_time_minutes': 0,
+        'max_response_time_minutes': 0,
+        'median_response_time_minutes': 0,
+        'total_responses': 0
+    }
+    
+    if chat_id:
+        # For specific chat, use detailed analysis
+        chat_metrics = analyzer.analyze_chat_response_times(db.session, chat_id, start_time, end_time)
+        overall_response_metrics = chat_metrics
+    else:
+        # For overall view, calculate aggregated metrics
+        active_chats = db.session.query(Chat).join(Message).filter(*query_filters).distinct().all()
+        all_response_times = []
         
-        # Calculate statistics
-        total_messages = len(messages)
-        client_messages = len([m for m in messages if not m.is_team_member])
-        team_messages = len([m for m in messages if m.is_team_member])
-        total_symbols = sum(len(m.text or '') for m in messages)
+        for chat in active_chats:
+            chat_metrics = analyzer.analyze_chat_response_times(db.session, chat.id, start_time, end_time)
+            if chat_metrics['total_responses'] > 0:
+                # Collect all response times for overall calculation
+                # We'll use the basic response_time_seconds from messages for aggregation
+                chat_response_times = db.session.query(Message.response_time_seconds).filter(
+                    Message.chat_id == chat.id,
+                    Message.timestamp >= start_time,
+                    Message.timestamp <= end_time,
+                    Message.response_time_seconds.isnot(None),
+                    Message.response_time_seconds > 0
+                ).all()
+                all_response_times.extend([rt[0] for rt in chat_response_times])
+        
+        if all_response_times:
+            overall_response_metrics = {
+                'avg_response_time_minutes': round(sum(all_response_times) / len(all_response_times) / 60, 1),
+                'max_response_time_minutes': round(max(all_response_times) / 60, 1),
+                'median_response_time_minutes': round(sorted(all_response_times)[len(all_response_times)//2] / 60, 1),
+                'total_responses': len(all_response_times)
+            }
+    
+    # Calculate active clients (clients who wrote in the last month)
+    one_month_ago = datetime.utcnow() - timedelta(days=30)
+    active_client_count = db.session.query(func.count(func.distinct(Message.user_id))).filter(
+        Message.timestamp >= one_month_ago,
+        Message.is_team_member == False
+    ).scalar() or 0
+    
+    return {
+        'total_messages': total_messages,
+        'client_messages': client_messages,
+        'team_messages': team_messages,
+        'total_symbols': total_symbols,
+        'avg_response_time_minutes': overall_response_metrics.get('avg_response_time_minutes', 0),
+        'max_response_time_minutes': overall_response_metrics.get('max_response_time_minutes', 0),
+        'median_response_time_minutes': overall_response_metrics.get('median_response_time_minutes', 0),
+        'total_responses': overall_response_metrics.get('total_responses', 0),
+        'avg_sentiment_score': round(totals.avg_sentiment_score or 0, 2),
+        'sentiment_messages': totals.sentiment_messages or 0,
+        'active_clients': active_client_count,
+        'client_percentage': round((client_messages / total_messages * 100), 1) if total_messages else 0,
+        'team_percentage': round((team_messages / total_messages * 100), 1) if total_messages else 0
+    }
+
+
+def build_dashboard_employees(query_filters, user_ids=None):
+    """Employee activity of the dashboard period, optionally only for the given users"""
+    # Get employee activity data (by individual users)
+    extra_filters = []
+    if user_ids is not None:
+        extra_filters.append(Message.user_id.in_(user_ids))
+    
+    employee_stats = db.session.query(
+        Message.user_id,
+        Message.full_name,
+        func.count(Message.id).label('message_count'),
+        func.sum(func.length(Message.text)).label('character_count')
+    ).filter(*query_filters, *extra_filters, Message.is_team_member == True).group_by(
+        Message.user_id, Message.full_name
+    ).all()
+    
+    employees_data = []
+    for emp in employee_stats:
+        employees_data.append({
+            'user_id': emp.user_id,
+            'name': emp.full_name or 'Unknown',
+            'message_count': emp.message_count,
+            'character_count': emp.character_count or 0
+        })
+    
+    employees_data.sort(key=lambda x: x['message_count'], reverse=True)
+    return employees_data
+
+
+def build_dashboard_clients(query_filters, start_time, end_time, analyzer, chat_ids=None):
+    """Per-chat client statistics of the dashboard period, optionally only for the given chats"""
+    # Get all chats with messages in the filtered period (exclude private chats)
+    extra_filters = []
+    if chat_ids is not None:
+        extra_filters.append(Message.chat_id.in_(chat_ids))
+    
+    active_chats = db.session.query(Chat).join(Message).filter(
+        Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
+        *query_filters,
+        *extra_filters
+    ).distinct().all()
+    
+    clients_data = []
+    for chat in active_chats:
+        # Get team messages for this chat
+        team_stats = db.session.query(
+            func.count(Message.id).label('count'),
+            func.sum(func.length(Message.text)).label('characters')
+        ).filter(
+            Message.chat_id == chat.id,
+            Message.is_team_member == True,
+            *query_filters
+        ).first()
         
-        logger.info(f"Stats: total={total_messages}, client={client_messages}, team={team_messages}, symbols={total_symbols}")
+        # Get client messages for this chat
+        client_stats = db.session.query(
+            func.count(Message.id).label('count'),
+            func.sum(func.length(Message.text)).label('characters')
+        ).filter(
+            Message.chat_id == chat.id,
+            Message.is_team_member == False,
+            *query_filters
+        ).first()
         
-        # Calculate enhanced response times using new analyzer
-        analyzer = ResponseTimeAnalyzer()
+        chat_team_messages = team_stats.count or 0
+        chat_team_characters = team_stats.characters or 0
+        chat_client_messages = client_stats.count or 0
+        chat_client_characters = client_stats.characters or 0
         
-        # Get overall response metrics for all active chats in the period
-        overall_response_metrics = {
-            'avg_response_time_minutes': 0,
-            'max_response_time_minutes': 0,
-            'median_response_time_minutes': 0,
-            'total_responses': 0
-        }
+        chat_total_messages = chat_team_messages + chat_client_messages
+        chat_total_characters = chat_team_characters + chat_client_characters
         
-        if chat_id:
-            # For specific chat, use detailed analysis
-            chat_metrics = analyzer.analyze_chat_response_times(db.session, chat_id, start_time, end_time)
-            overall_response_metrics = chat_metrics
+        if chat_total_messages > 0:
+            team_message_ratio = (chat_team_messages / chat_total_messages) * 100
+            client_message_ratio = (chat_client_messages / chat_total_messages) * 100
         else:
-            # For overall view, calculate aggregated metrics
-            active_chats = db.session.query(Chat).join(Message).filter(*query_filters).distinct().all()
-            all_response_times = []
-            
-            for chat in active_chats:
-                chat_metrics = analyzer.analyze_chat_response_times(db.session, chat.id, start_time, end_time)
-                if chat_metrics['total_responses'] > 0:
-                    # Collect all response times for overall calculation
-                    # We'll use the basic response_time_seconds from messages for aggregation
-                    chat_response_times = db.session.query(Message.response_time_seconds).filter(
-                        Message.chat_id == chat.id,
-                        Message.timestamp >= start_time,
-                        Message.timestamp <= end_time,
-                        Message.response_time_seconds.isnot(None),
-                        Message.response_time_seconds > 0
-                    ).all()
-                    all_response_times.extend([rt[0] for rt in chat_response_times])
-            
-            if all_response_times:
-                overall_response_metrics = {
-                    'avg_response_time_minutes': round(sum(all_response_times) / len(all_response_times) / 60, 1),
-                    'max_response_time_minutes': round(max(all_response_times) / 60, 1),
-                    'median_response_time_minutes': round(sorted(all_response_times)[len(all_response_times)//2] / 60, 1),
-                    'total_responses': len(all_response_times)
-                }
-        
-        # Get employee activity data (by individual users)
-        employee_stats = db.session.query(
-            Message.user_id,
-            Message.full_name,
-            func.count(Message.id).label('message_count'),
-            func.sum(func.length(Message.text)).label('character_count')
-        ).filter(*query_filters, Message.is_team_member == True).group_by(
-            Message.user_id, Message.full_name
-        ).all()
+            team_message_ratio = 0
+            client_message_ratio = 0
         
-        employees_data = []
-        for emp in employee_stats:
-            employees_data.append({
-                'user_id': emp.user_id,
-                'name': emp.full_name or 'Unknown',
-                'message_count': emp.message_count,
-                'character_count': emp.character_count or 0
-            })
-        
-        # Get all chats with messages in the filtered period (exclude private chats)
-        active_chats = db.session.query(Chat).join(Message).filter(
-            Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
-            *query_filters
-        ).distinct().all()
+        if chat_total_characters > 0:
+            team_char_ratio = (chat_team_characters / chat_total_characters) * 100
+            client_char_ratio = (chat_client_characters / chat_total_characters) * 100
+        else:
+            team_char_ratio = 0
+            client_char_ratio = 0
         
-        clients_data = []
-        for chat in active_chats:
-            # Get team messages for this chat
-            team_stats = db.session.query(
-                func.count(Message.id).label('count'),
-                func.sum(func.length(Message.text)).label('characters')
-            ).filter(
-                Message.chat_id == chat.id,
-                Message.is_team_member == True,
-                *query_filters
-            ).first()
+        if chat_total_messages > 0:  # Only include chats with messages
+            # Get detailed response time metrics for this chat
+            chat_response_metrics = analyzer.analyze_chat_response_times(db.session, chat.id, start_time, end_time)
             
-            # Get client messages for this chat
-            client_stats = db.session.query(
-                func.count(Message.id).label('count'),
-                func.sum(func.length(Message.text)).label('characters')
+            # Calculate average sentiment for this client chat
+            client_sentiment_query = db.session.query(
+                func.avg(Message.sentiment_score).label('avg_sentiment')
             ).filter(
                 Message.chat_id == chat.id,
                 Message.is_team_member == False,
+                Message.sentiment_score.isnot(None),
                 *query_filters
             ).first()
             
-            chat_team_messages = team_stats.count or 0
-            chat_team_characters = team_stats.characters or 0
-            chat_client_messages = client_stats.count or 0
-            chat_client_characters = client_stats.characters or 0
-            
-            chat_total_messages = chat_team_messages + chat_client_messages
-            chat_total_characters = chat_team_characters + chat_client_characters
-            
-            if chat_total_messages > 0:
-                team_message_ratio = (chat_team_messages / chat_total_messages) * 100
-                client_message_ratio = (chat_client_messages / chat_total_messages) * 100
-            else:
-                team_message_ratio = 0
-                client_message_ratio = 0
-            
-            if chat_total_characters > 0:
-                team_char_ratio = (chat_team_characters / chat_total_characters) * 100
-                client_char_ratio = (chat_client_characters / chat_total_characters) * 100
-            else:
-                team_char_ratio = 0
-                client_char_ratio = 0
+            avg_sentiment = client_sentiment_query.avg_sentiment if client_sentiment_query.avg_sentiment else 0
             
-            if chat_total_messages > 0:  # Only include chats with messages
-                # Get detailed response time metrics for this chat
-                chat_response_metrics = analyzer.analyze_chat_response_times(db.session, chat.id, start_time, end_time)
-                
-                # Calculate average sentiment for this client chat
-                client_sentiment_query = db.session.query(
-                    func.avg(Message.sentiment_score).label('avg_sentiment')
-                ).filter(
-                    Message.chat_id == chat.id,
-                    Message.is_team_member == False,
-                    Message.sentiment_score.isnot(None),
-                    *query_filters
-                ).first()
+            clients_data.append({
+                'chat_id': chat.id,
+                'name': chat.title,
+                'team_messages': chat_team_messages,
+                'client_messages': chat_client_messages,
+                'team_characters': chat_team_characters,
+                'client_characters': chat_client_characters,
+                'total_messages': chat_total_messages,
+                'total_characters': chat_total_characters,
+                'team_message_ratio': round(team_message_ratio, 1),
+                'client_message_ratio': round(client_message_ratio, 1),
+                'team_char_ratio': round(team_char_ratio, 1),
+                'client_char_ratio': round(client_char_ratio, 1),
+                'communication_intensity': chat_total_messages,  # For sorting
                 
-                avg_sentiment = client_sentiment_query.avg_sentiment if client_sentiment_query.avg_sentiment else 0
+                # Response time metrics
+                'avg_response_time_minutes': chat_response_metrics.get('avg_response_time_minutes', 0),
+                'max_response_time_minutes': chat_response_metrics.get('max_response_time_minutes', 0),
+                'median_response_time_minutes': chat_response_metrics.get('median_response_time_minutes', 0),
+                'total_responses': chat_response_metrics.get('total_responses', 0),
+                'responses_under_5min': chat_response_metrics.get('responses_under_5min', 0),
+                'responses_over_1hour': chat_response_metrics.get('responses_over_1hour', 0),
+                'percentage_under_5min': chat_response_metrics.get('percentage_under_5min', 0),
+                'percentage_over_1hour': chat_response_metrics.get('percentage_over_1hour', 0),
                 
-                clients_data.append({
-                    'chat_id': chat.id,
-                    'name': chat.title,
-                    'team_messages': chat_team_messages,
-                    'client_messages': chat_client_messages,
-                    'team_characters': chat_team_characters,
-                    'client_characters': chat_client_characters,
-                    'total_messages': chat_total_messages,
-                    'total_characters': chat_total_characters,
-                    'team_message_ratio': round(team_message_ratio, 1),
-                    'client_message_ratio': round(client_message_ratio, 1),
-                    'team_char_ratio': round(team_char_ratio, 1),
-                    'client_char_ratio': round(client_char_ratio, 1),
-                    'communication_intensity': chat_total_messages,  # For sorting
-                    
-                    # Response time metrics
-                    'avg_response_time_minutes': chat_response_metrics.get('avg_response_time_minutes', 0),
-                    'max_response_time_minutes': chat_response_metrics.get('max_response_time_minutes', 0),
-                    'median_response_time_minutes': chat_response_metrics.get('median_response_time_minutes', 0),
-                    'total_responses': chat_response_metrics.get('total_responses', 0),
-                    'responses_under_5min': chat_response_metrics.get('responses_under_5min', 0),
-                    'responses_over_1hour': chat_response_metrics.get('responses_over_1hour', 0),
-                    'percentage_under_5min': chat_response_metrics.get('percentage_under_5min', 0),
-                    'percentage_over_1hour': chat_response_metrics.get('percentage_over_1hour', 0),
-                    
-                    # Sentiment metrics
-                    'avg_sentiment': round(avg_sentiment, 2)
-                })
-        
-        # Sort by communication intensity
-        employees_data.sort(key=lambda x: x['message_count'], reverse=True)
-        clients_data.sort(key=lambda x: x['communication_intensity'], reverse=True)
-        
-        # Calculate average sentiment score
-        sentiment_messages = [m for m in messages if m.sentiment_score is not None and not m.is_team_member]
-        avg_sentiment_score = 0
-        if sentiment_messages:
-            avg_sentiment_score = sum(m.sentiment_score for m in sentiment_messages) / len(sentiment_messages)
-
-        # Calculate active clients (clients who wrote in the last month)
-        one_month_ago = datetime.utcnow() - timedelta(days=30)
-        active_client_count = db.session.query(func.count(func.distinct(Message.user_id))).filter(
-            Message.timestamp >= one_month_ago,
-            Message.is_team_member == False
-        ).scalar() or 0
-
-        return jsonify({
-            'general_stats': {
-                'total_messages': total_messages,
-                'client_messages': client_messages,
-                'team_messages': team_messages,
-                'total_symbols': total_symbols,
-                'avg_response_time_minutes': overall_response_metrics.get('avg_response_time_minutes', 0),
-                'max_response_time_minutes': overall_response_metrics.get('max_response_time_minutes', 0),
-                'median_response_time_minutes': overall_response_metrics.get('median_response_time_minutes', 0),
-                'total_responses': overall_response_metrics.get('total_responses', 0),
-                'avg_sentiment_score': round(avg_sentiment_score, 2),
-                'active_clients': active_client_count,
-                'client_percentage': round((client_messages / total_messages * 100), 1) if total_messages else 0,
-                'team_percentage': round((team_messages / total_messages * 100), 1) if total_messages else 0
-            },
-            'employees': employees_data,
-            'clients': clients_data,
-            'period': {
-                'start': format_moscow_date(start_time),
-                'end': format_moscow_date(end_time)
-            }
-        })
-        
-    except Exception as e:
-        logger.error(f"Error getting filtered dashboard data: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+                # Sentiment metrics
+                'avg_sentiment': round(avg_sentiment, 2)
+            })
+    
+    clients_data.sort(key=lambda x: x['communication_intensity'], reverse=True)
+    return clients_data
 
 
 @app.route('/api/filter-options')
+@replica_reads
 def filter_options():
     """Get available filter options (chats and employees)"""
     try:
-        # Get active chats
-        chats = db.session.query(Chat).filter_by(is_active=True).all()
-        chats_data = [{'id': chat.id, 'title': chat.title} for chat in chats]
-        
-        # Get team members
-        team_members = db.session.query(
-            Message.user_id,
-            Message.full_name
-        ).filter(
-            Message.is_team_member == True
-        ).group_by(
-            Message.user_id, Message.full_name
-        ).all()
-        
-        employees_data = [
-            {'id': emp.user_id, 'name': emp.full_name or 'Unknown'}
-            for emp in team_members
-        ]
-        
-        return jsonify({
-            'chats': chats_data,
-            'employees': employees_data
-        })
+        return encoded_json_response(response_cache.get_or_build('filter-options', build_filter_options))
         
     except Exception as e:
         logger.error(f"Error getting filter options: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_filter_options():
+    """Compute available filter options (chats and employees)"""
+    # Get active chats
+    chats = db.session.query(Chat).filter_by(is_active=True).all()
+    chats_data = [{'id': chat.id, 'title': chat.title} for chat in chats]
+    
+    # Get team members
+    team_members = db.session.query(
+        Message.user_id,
+        Message.full_name
+    ).filter(
+        Message.is_team_member == True
+    ).group_by(
+        Message.user_id, Message.full_name
+    ).all()
+    
+    employees_data = [
+        {'id': emp.user_id, 'name': emp.full_name or 'Unknown'}
+        for emp in team_members
+    ]
+    
+    return {
+        'chats': chats_data,
+        'employees': employees_data
+    }
+
+
 @app.route('/api/sentiment-trend')
+@replica_reads
 def sentiment_trend():
     """Get historical sentiment trend data"""
     if not verify_admin_token():
@@ -959,48 +1161,95 @@ def sentiment_trend():
         days = request.args.get('days', 7, type=int)
         chat_id = request.args.get('chat_id', type=int)
         
-        # Calculate date range
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=days)
-        
-        # Build query filters
-        filters = [
-            Message.timestamp >= start_time,
-            Message.timestamp <= end_time,
-            Message.is_team_member == False,
-            Message.sentiment_score.isnot(None)
-        ]
-        
-        if chat_id:
-            filters.append(Message.chat_id == chat_id)
-        
-        # Get daily sentiment averages
-        daily_sentiment = db.session.query(
-            func.date(Message.timestamp).label('date'),
-            func.avg(Message.sentiment_score).label('avg_sentiment'),
-            func.count(Message.id).label('message_count')
-        ).filter(*filters).group_by('date').order_by('date').all()
-        
-        # Format data for chart
-        labels = []
-        data = []
+        scope = {'view': 'sentiment_trend', 'days': days, 'chat_id': chat_id}
+        since = decode_since(request.args.get('since'), scope)
+        next_cursor = encode_since(current_watermark(db.session), scope)
         
-        for row in daily_sentiment:
-            labels.append(row.date.strftime('%m/%d'))
-            data.append(round(row.avg_sentiment, 3))
-        
-        return jsonify({
-            'labels': labels,
-            'data': data,
-            'period_days': days
-        })
+        data = build_sentiment_trend(days, chat_id, since)
+        return jsonify(dict(data, cursor=next_cursor, delta=since is not None))
         
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting sentiment trend: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_sentiment_trend(days, chat_id=None, since=None):
+    """
+    Compute historical sentiment trend data
+    
+    With `since` only the days touched by messages updated after it (and the
+    first day, which shrinks as the window slides) are returned.
+    """
+    # Calculate date range
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(days=days)
+    
+    # Build query filters
+    window_filters = [
+        Message.timestamp >= start_time,
+        Message.timestamp <= end_time
+    ]
+    
+    if chat_id:
+        window_filters.append(Message.chat_id == chat_id)
+    
+    filters = window_filters + [
+        Message.is_team_member == False,
+        Message.sentiment_score.isnot(None)
+    ]
+    
+    changed_dates = trend_changed_dates(window_filters, start_time, since)
+    if changed_dates is not None:
+        filters.append(local_date(Message.timestamp).in_(changed_dates))
+    
+    # Get daily sentiment averages
+    daily_sentiment = db.session.query(
+        local_date(Message.timestamp).label('date'),
+        func.avg(Message.sentiment_score).label('avg_sentiment'),
+        func.count(Message.id).label('message_count')
+    ).filter(*filters).group_by('date').order_by('date').all()
+    
+    # Format data for chart
+    labels = []
+    data = []
+    dates = []
+    
+    for row in daily_sentiment:
+        labels.append(row.date.strftime('%m/%d'))
+        data.append(round(row.avg_sentiment, 3))
+        dates.append(row.date.isoformat())
+    
+    return trend_result(labels, data, dates, days, start_time, changed_dates)
+
+
+def trend_changed_dates(base_filters, start_time, since):
+    """Days with messages updated after `since` (plus the window's first day), None without since"""
+    if since is None:
+        return None
+    
+    changed_dates = set(changed_values(db.session, local_date(Message.timestamp), base_filters, since))
+    changed_dates.add(local_day_key(start_time))
+    return sorted(changed_dates)
+
+
+def trend_result(labels, data, dates, days, start_time, changed_dates):
+    """Trend payload; delta responses list the days they cover in 'changed_dates'"""
+    result = {
+        'labels': labels,
+        'data': data,
+        'dates': dates,
+        'start_date': local_day_key(start_time).isoformat(),
+        'period_days': days
+    }
+    if changed_dates is not None:
+        result['changed_dates'] = [day.isoformat() for day in changed_dates]
+    return result
+
+
 @app.route('/api/response-time-trend')
+@replica_reads
 def response_time_trend():
     """Get historical response time trend data"""
     if not verify_admin_token():
@@ -1010,51 +1259,69 @@ def response_time_trend():
         days = request.args.get('days', 7, type=int)
         chat_id = request.args.get('chat_id', type=int)
         
-        # Calculate date range
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=days)
-        
-        # Build query filters
-        filters = [
-            Message.timestamp >= start_time,
-            Message.timestamp <= end_time,
-            Message.response_time_seconds.isnot(None),
-            Message.response_time_seconds > 0
-        ]
-        
-        if chat_id:
-            filters.append(Message.chat_id == chat_id)
-        
-        # Get daily response time averages
-        daily_response_times = db.session.query(
-            func.date(Message.timestamp).label('date'),
-            func.avg(Message.response_time_seconds).label('avg_response_seconds'),
-            func.count(Message.id).label('response_count')
-        ).filter(*filters).group_by('date').order_by('date').all()
-        
-        # Format data for chart
-        labels = []
-        data = []
-        
-        for row in daily_response_times:
-            labels.append(row.date.strftime('%m/%d'))
-            # Convert to minutes and ensure it's a float
-            avg_minutes = float(row.avg_response_seconds) / 60
-            data.append(round(avg_minutes, 1))
+        scope = {'view': 'response_time_trend', 'days': days, 'chat_id': chat_id}
+        since = decode_since(request.args.get('since'), scope)
+        next_cursor = encode_since(current_watermark(db.session), scope)
         
-        return jsonify({
-            'labels': labels,
-            'data': data,
-            'period_days': days
-        })
+        data = build_response_time_trend(days, chat_id, since)
+        return jsonify(dict(data, cursor=next_cursor, delta=since is not None))
         
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting response time trend: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route('/api/response-time-analysis')
-def response_time_analysis():
+def build_response_time_trend(days, chat_id=None, since=None):
+    """Compute historical response time trend data (delta with `since`, see build_sentiment_trend)"""
+    # Calculate date range
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(days=days)
+    
+    # Build query filters
+    window_filters = [
+        Message.timestamp >= start_time,
+        Message.timestamp <= end_time
+    ]
+    
+    if chat_id:
+        window_filters.append(Message.chat_id == chat_id)
+    
+    filters = window_filters + [
+        Message.response_time_seconds.isnot(None),
+        Message.response_time_seconds > 0
+    ]
+    
+    changed_dates = trend_changed_dates(window_filters, start_time, since)
+    if changed_dates is not None:
+        filters.append(local_date(Message.timestamp).in_(changed_dates))
+    
+    # Get daily response time averages
+    daily_response_times = db.session.query(
+        local_date(Message.timestamp).label('date'),
+        func.avg(Message.response_time_seconds).label('avg_response_seconds'),
+        func.count(Message.id).label('response_count')
+    ).filter(*filters).group_by('date').order_by('date').all()
+    
+    # Format data for chart
+    labels = []
+    data = []
+    
+    dates = []
+    for row in daily_response_times:
+        labels.append(row.date.strftime('%m/%d'))
+        # Convert to minutes and ensure it's a float
+        avg_minutes = float(row.avg_response_seconds) / 60
+        data.append(round(avg_minutes, 1))
+        dates.append(row.date.isoformat())
+    
+    return trend_result(labels, data, dates, days, start_time, changed_dates)
+
+
+@app.route('/api/response-time-analysis')
+@replica_reads
+def response_time_analysis():
     """Get detailed response time analysis"""
     try:
         verify_admin_token()
@@ -1066,110 +1333,128 @@ def response_time_analysis():
         end_date = request.args.get('end_date')
         hours = request.args.get('hours', default=24, type=int)
         
-        # Initialize response time analyzer
-        analyzer = ResponseTimeAnalyzer()
+        # Identical concurrent requests share a single computation
+        key = request_coalescer.make_key('response-time-analysis', {
+            'chat_id': chat_id,
+            'employee_id': employee_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'hours': hours
+        })
+        data = request_coalescer.do(
+            key, lambda: build_response_time_analysis(chat_id, employee_id, start_date, end_date, hours)
+        )
         
-        # Determine time range
-        if start_date and end_date:
-            start_time, end_time = moscow_date_to_utc_range(start_date, end_date)
-        else:
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(hours=hours)
+        return jsonify(data)
         
-        if chat_id:
-            # Analysis for specific chat
-            metrics = analyzer.analyze_chat_response_times(db.session, chat_id, start_time, end_time)
-            
-            # Get chat info
-            chat = db.session.query(Chat).filter_by(id=chat_id).first()
-            chat_title = chat.title if chat else f"Chat {chat_id}"
-            
-            return jsonify({
-                'type': 'chat',
-                'chat_id': chat_id,
-                'chat_title': chat_title,
-                'metrics': metrics,
-                'period': {
-                    'start': format_moscow_date(start_time),
-                    'end': format_moscow_date(end_time)
-                }
-            })
-            
-        elif employee_id:
-            # Analysis for specific employee
-            metrics = analyzer.analyze_team_member_performance(db.session, employee_id, start_time, end_time)
-            
-            # Get employee info
-            employee = db.session.query(Message.full_name).filter(
-                Message.user_id == employee_id,
-                Message.is_team_member == True
-            ).first()
-            
-            employee_name = employee.full_name if employee else f"Employee {employee_id}"
-            
-            return jsonify({
-                'type': 'employee',
-                'employee_id': employee_id,
-                'employee_name': employee_name,
-                'metrics': metrics,
-                'period': {
-                    'start': format_moscow_date(start_time),
-                    'end': format_moscow_date(end_time)
-                }
-            })
-            
-        else:
-            # Overall analysis for all chats
-            all_metrics = {
-                'total_responses': 0,
-                'all_response_times': [],
-                'chat_analyses': []
-            }
-            
-            # Get all active chats
-            active_chats = db.session.query(Chat).filter_by(is_active=True).all()
-            
-            for chat in active_chats:
-                chat_metrics = analyzer.analyze_chat_response_times(db.session, chat.id, start_time, end_time)
-                
-                if chat_metrics['total_responses'] > 0:
-                    all_metrics['chat_analyses'].append({
-                        'chat_id': chat.id,
-                        'chat_title': chat.title,
-                        'metrics': chat_metrics
-                    })
-                    all_metrics['total_responses'] += chat_metrics['total_responses']
-            
-            # Calculate overall statistics
-            if all_metrics['total_responses'] > 0:
-                # Collect all response times for overall calculation
-                overall_response_times = []
-                for chat_analysis in all_metrics['chat_analyses']:
-                    # We'll need to get individual response times for overall calculation
-                    # For now, use weighted averages based on chat metrics
-                    pass
-                
-                # Sort chats by max response time
-                all_metrics['chat_analyses'].sort(
-                    key=lambda x: x['metrics']['max_response_time_minutes'] or 0, 
-                    reverse=True
-                )
-            
-            return jsonify({
-                'type': 'overall',
-                'metrics': all_metrics,
-                'period': {
-                    'start': format_moscow_date(start_time),
-                    'end': format_moscow_date(end_time)
-                }
-            })
-            
     except Exception as e:
         logger.error(f"Error in response time analysis: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_response_time_analysis(chat_id, employee_id, start_date, end_date, hours, analyzer=None):
+    """Compute detailed response time analysis"""
+    # Initialize response time analyzer
+    analyzer = analyzer or ResponseTimeAnalyzer()
+    
+    # Determine time range
+    if start_date and end_date:
+        start_time, end_time = moscow_date_to_utc_range(start_date, end_date)
+    else:
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=hours)
+    
+    if chat_id:
+        # Analysis for specific chat
+        metrics = analyzer.analyze_chat_response_times(db.session, chat_id, start_time, end_time)
+        
+        # Get chat info
+        chat = db.session.query(Chat).filter_by(id=chat_id).first()
+        chat_title = chat.title if chat else f"Chat {chat_id}"
+        
+        return {
+            'type': 'chat',
+            'chat_id': chat_id,
+            'chat_title': chat_title,
+            'metrics': metrics,
+            'period': {
+                'start': format_moscow_date(start_time),
+                'end': format_moscow_date(end_time)
+            }
+        }
+        
+    elif employee_id:
+        # Analysis for specific employee
+        metrics = analyzer.analyze_team_member_performance(db.session, employee_id, start_time, end_time)
+        
+        # Get employee info
+        employee = db.session.query(Message.full_name).filter(
+            Message.user_id == employee_id,
+            Message.is_team_member == True
+        ).first()
+        
+        employee_name = employee.full_name if employee else f"Employee {employee_id}"
+        
+        return {
+            'type': 'employee',
+            'employee_id': employee_id,
+            'employee_name': employee_name,
+            'metrics': metrics,
+            'period': {
+                'start': format_moscow_date(start_time),
+                'end': format_moscow_date(end_time)
+            }
+        }
+        
+    else:
+        # Overall analysis for all chats
+        all_metrics = {
+            'total_responses': 0,
+            'all_response_times': [],
+            'chat_analyses': []
+        }
+        
+        # Get all active chats
+        active_chats = db.session.query(Chat).filter_by(is_active=True).all()
+        
+        for chat in active_chats:
+            chat_metrics = analyzer.analyze_chat_response_times(db.session, chat.id, start_time, end_time)
+            
+            if chat_metrics['total_responses'] > 0:
+                all_metrics['chat_analyses'].append({
+                    'chat_id': chat.id,
+                    'chat_title': chat.title,
+                    'metrics': chat_metrics
+                })
+                all_metrics['total_responses'] += chat_metrics['total_responses']
+        
+        # Calculate overall statistics
+        if all_metrics['total_responses'] > 0:
+            # Collect all response times for overall calculation
+            overall_response_times = []
+            for chat_analysis in all_metrics['chat_analyses']:
+                # We'll need to get individual response times for overall calculation
+                # For now, use weighted averages based on chat metrics
+                pass
+            
+            # Sort chats by max response time
+            all_metrics['chat_analyses'].sort(
+                key=lambda x: x['metrics']['max_response_time_minutes'] or 0, 
+                reverse=True
+            )
+        
+        return {
+            'type': 'overall',
+            'metrics': all_metrics,
+            'period': {
+                'start': format_moscow_date(start_time),
+                'end': format_moscow_date(end_time)
+            }
+        }
+
+
 @app.route('/api/slow-response-alerts')
+@replica_reads
 def slow_response_alerts():
     """Get alerts for slow responses"""
     try:
@@ -1198,6 +1483,7 @@ def slow_response_alerts():
 
 
 @app.route('/api/sentiment-overview')
+@replica_reads
 def sentiment_overview():
     """API endpoint for sentiment overview section"""
     if not verify_admin_token():
@@ -1209,98 +1495,104 @@ def sentiment_overview():
         end_date = request.args.get('end_date')
         chat_id = request.args.get('chat_id')
         
-        # Parse date filters
-        if start_date and end_date:
-            start_time, end_time = moscow_date_to_utc_range(start_date, end_date)
-        else:
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(hours=hours)
-        
-        # Build query filters
-        filters = [
-            Message.timestamp >= start_time,
-            Message.timestamp <= end_time,
-            Message.is_team_member == False,  # Only client messages
-            Message.sentiment_label.isnot(None)
-        ]
-        
-        if chat_id:
-            filters.append(Message.chat_id == int(chat_id))
-        
-        # Get sentiment distribution for client messages (exclude private chats)
-        sentiment_counts = db.session.query(
-            Message.sentiment_label,
-            func.count(Message.id).label('count'),
-            func.avg(Message.sentiment_score).label('avg_score')
-        ).join(Chat).filter(
-            Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
-            *filters
-        ).group_by(Message.sentiment_label).all()
-        
-        # Calculate overall sentiment statistics
-        total_messages = sum(row.count for row in sentiment_counts)
-        sentiment_data = {
-            'positive': 0,
-            'negative': 0,
-            'neutral': 0,
-            'positive_percentage': 0,
-            'negative_percentage': 0,
-            'neutral_percentage': 0,
-            'avg_score': 0
-        }
-        
-        total_score = 0
-        for row in sentiment_counts:
-            label = row.sentiment_label.lower()
-            if label in sentiment_data:
-                sentiment_data[label] = row.count
-                sentiment_data[f'{label}_percentage'] = round((row.count / total_messages * 100), 1) if total_messages > 0 else 0
-                total_score += (row.avg_score or 0) * row.count
-        
-        sentiment_data['avg_score'] = round(total_score / total_messages, 2) if total_messages > 0 else 0
-        sentiment_data['total_messages'] = total_messages
-        
-        # Get sentiment trend by day
-        daily_sentiment = db.session.query(
-            func.date(Message.timestamp).label('date'),
-            Message.sentiment_label,
-            func.count(Message.id).label('count'),
-            func.avg(Message.sentiment_score).label('avg_score')
-        ).filter(*filters).group_by('date', Message.sentiment_label).order_by('date').all()
-        
-        # Process daily data
-        daily_data = {}
-        for row in daily_sentiment:
-            date_str = row.date.strftime('%Y-%m-%d')
-            if date_str not in daily_data:
-                daily_data[date_str] = {'positive': 0, 'negative': 0, 'neutral': 0}
-            daily_data[date_str][row.sentiment_label.lower()] = row.count
-        
-        # Format for chart
-        dates = sorted(daily_data.keys())
-        trend_data = {
-            'labels': [datetime.strptime(d, '%Y-%m-%d').strftime('%m/%d') for d in dates],
-            'positive': [daily_data[d]['positive'] for d in dates],
-            'negative': [daily_data[d]['negative'] for d in dates],
-            'neutral': [daily_data[d]['neutral'] for d in dates]
-        }
-        
-        return jsonify({
-            'summary': sentiment_data,
-            'trend': trend_data,
-            'period': {
-                'start': start_time.strftime('%Y-%m-%d'),
-                'end': end_time.strftime('%Y-%m-%d'),
-                'hours': hours
-            }
-        })
+        return jsonify(build_sentiment_overview(hours, start_date, end_date, chat_id))
         
     except Exception as e:
         logger.error(f"Error getting sentiment overview: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_sentiment_overview(hours, start_date=None, end_date=None, chat_id=None):
+    """Compute sentiment overview section data"""
+    # Parse date filters
+    if start_date and end_date:
+        start_time, end_time = moscow_date_to_utc_range(start_date, end_date)
+    else:
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=hours)
+    
+    # Build query filters
+    filters = [
+        Message.timestamp >= start_time,
+        Message.timestamp <= end_time,
+        Message.is_team_member == False,  # Only client messages
+        Message.sentiment_label.isnot(None)
+    ]
+    
+    if chat_id:
+        filters.append(Message.chat_id == int(chat_id))
+    
+    # Get sentiment distribution for client messages (exclude private chats)
+    sentiment_counts = db.session.query(
+        Message.sentiment_label,
+        func.count(Message.id).label('count'),
+        func.avg(Message.sentiment_score).label('avg_score')
+    ).join(Chat).filter(
+        Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
+        *filters
+    ).group_by(Message.sentiment_label).all()
+    
+    # Calculate overall sentiment statistics
+    total_messages = sum(row.count for row in sentiment_counts)
+    sentiment_data = {
+        'positive': 0,
+        'negative': 0,
+        'neutral': 0,
+        'positive_percentage': 0,
+        'negative_percentage': 0,
+        'neutral_percentage': 0,
+        'avg_score': 0
+    }
+    
+    total_score = 0
+    for row in sentiment_counts:
+        label = row.sentiment_label.lower()
+        if label in sentiment_data:
+            sentiment_data[label] = row.count
+            sentiment_data[f'{label}_percentage'] = round((row.count / total_messages * 100), 1) if total_messages > 0 else 0
+            total_score += (row.avg_score or 0) * row.count
+    
+    sentiment_data['avg_score'] = round(total_score / total_messages, 2) if total_messages > 0 else 0
+    sentiment_data['total_messages'] = total_messages
+    
+    # Get sentiment trend by day
+    daily_sentiment = db.session.query(
+        local_date(Message.timestamp).label('date'),
+        Message.sentiment_label,
+        func.count(Message.id).label('count'),
+        func.avg(Message.sentiment_score).label('avg_score')
+    ).filter(*filters).group_by('date', Message.sentiment_label).order_by('date').all()
+    
+    # Process daily data
+    daily_data = {}
+    for row in daily_sentiment:
+        date_str = row.date.strftime('%Y-%m-%d')
+        if date_str not in daily_data:
+            daily_data[date_str] = {'positive': 0, 'negative': 0, 'neutral': 0}
+        daily_data[date_str][row.sentiment_label.lower()] = row.count
+    
+    # Format for chart
+    dates = sorted(daily_data.keys())
+    trend_data = {
+        'labels': [datetime.strptime(d, '%Y-%m-%d').strftime('%m/%d') for d in dates],
+        'positive': [daily_data[d]['positive'] for d in dates],
+        'negative': [daily_data[d]['negative'] for d in dates],
+        'neutral': [daily_data[d]['neutral'] for d in dates]
+    }
+    
+    return {
+        'summary': sentiment_data,
+        'trend': trend_data,
+        'period': {
+            'start': start_time.strftime('%Y-%m-%d'),
+            'end': end_time.strftime('%Y-%m-%d'),
+            'hours': hours
+        }
+    }
+
+
 @app.route('/api/recent-communications')
+@replica_reads
 def recent_communications():
     """API endpoint for recent communications section"""
     if not verify_admin_token():
@@ -1310,72 +1602,109 @@ def recent_communications():
         limit = request.args.get('limit', 50, type=int)
         chat_id = request.args.get('chat_id')
         hours = request.args.get('hours', 24, type=int)
+        cursor = request.args.get('cursor')
         
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(hours=hours)
+        limit = parse_limit(limit, 50, pagination_config.get('max_limit', 200))
+        after = decode_cursor(cursor, 'recent') if cursor else None
         
-        # Build query filters
-        filters = [
-            Message.timestamp >= start_time,
-            Message.timestamp <= end_time
-        ]
+        return jsonify(build_recent_communications(limit, hours, chat_id, after))
         
-        if chat_id:
-            filters.append(Message.chat_id == int(chat_id))
-        
-        # Get recent messages with chat info (exclude private chats)
-        recent_messages = db.session.query(
-            Message.id,
-            Message.message_id,
-            Message.text,
-            Message.timestamp,
-            Message.user_id,
-            Message.username,
-            Message.full_name,
-            Message.is_team_member,
-            Message.sentiment_label,
-            Message.sentiment_score,
-            Chat.title.label('chat_title'),
-            Chat.id.label('chat_id')
-        ).join(Chat, Message.chat_id == Chat.id).filter(
-            Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
-            *filters
-        ).order_by(desc(Message.timestamp)).limit(limit).all()
-        
-        # Format messages
-        messages_data = []
-        for msg in recent_messages:
-            # Determine sender type and name
-            if msg.is_team_member:
-                sender_type = 'team'
-                sender_name = msg.full_name or msg.username or 'Сотрудник'
-            else:
-                sender_type = 'client'
-                sender_name = msg.full_name or msg.username or 'Клиент'
-            
-            # Format sentiment
-            sentiment_info = None
-            if msg.sentiment_label and msg.sentiment_score is not None:
-                sentiment_info = {
-                    'label': msg.sentiment_label,
-                    'score': round(msg.sentiment_score, 2),
-                    'emoji': '😊' if msg.sentiment_label == 'positive' else '😠' if msg.sentiment_label == 'negative' else '😐'
-                }
-            
-            messages_data.append({
-                'id': msg.id,
-                'text': msg.text[:200] + '...' if msg.text and len(msg.text) > 200 else msg.text,
-                'full_text': msg.text,
-                'timestamp': msg.timestamp.strftime('%H:%M:%S'),
-                'date': msg.timestamp.strftime('%Y-%m-%d'),
-                'sender_name': sender_name,
-                'sender_type': sender_type,
-                'chat_title': msg.chat_title,
-                'chat_id': msg.chat_id,
-                'sentiment': sentiment_info
-            })
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting recent communications: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def build_recent_communications(limit, hours, chat_id=None, after=None):
+    """
+    Compute recent communications section data
+    
+    `after` holds the (timestamp, id) of the last message of the previous page;
+    per-chat statistics are only aggregated for the first page.
+    """
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=hours)
+    
+    # Build query filters
+    filters = [
+        Message.timestamp >= start_time,
+        Message.timestamp <= end_time
+    ]
+    
+    if chat_id:
+        filters.append(Message.chat_id == int(chat_id))
+    
+    if after is not None:
+        try:
+            after_timestamp, after_id = datetime.fromisoformat(after[0]), int(after[1])
+        except (TypeError, ValueError, IndexError):
+            raise CursorError("Invalid cursor for recent communications")
+        filters.append(keyset_condition((Message.timestamp, Message.id),
+                                        (after_timestamp, after_id), descending=True))
+    
+    # Get recent messages with chat info (exclude private chats)
+    recent_messages = db.session.query(
+        Message.id,
+        Message.message_id,
+        Message.text,
+        Message.timestamp,
+        Message.user_id,
+        Message.username,
+        Message.full_name,
+        Message.is_team_member,
+        Message.sentiment_label,
+        Message.sentiment_score,
+        Chat.title.label('chat_title'),
+        Chat.id.label('chat_id')
+    ).join(Chat, Message.chat_id == Chat.id).filter(
+        Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
+        *filters
+    ).order_by(desc(Message.timestamp), desc(Message.id)).limit(limit + 1).all()
+    
+    has_more = len(recent_messages) > limit
+    recent_messages = recent_messages[:limit]
+    next_cursor = None
+    if has_more:
+        last = recent_messages[-1]
+        next_cursor = encode_cursor('recent', [last.timestamp, last.id])
+    
+    # Format messages
+    messages_data = []
+    for msg in recent_messages:
+        # Determine sender type and name
+        if msg.is_team_member:
+            sender_type = 'team'
+            sender_name = msg.full_name or msg.username or 'Сотрудник'
+        else:
+            sender_type = 'client'
+            sender_name = msg.full_name or msg.username or 'Клиент'
+        
+        # Format sentiment
+        sentiment_info = None
+        if msg.sentiment_label and msg.sentiment_score is not None:
+            sentiment_info = {
+                'label': msg.sentiment_label,
+                'score': round(msg.sentiment_score, 2),
+                'emoji': '😊' if msg.sentiment_label == 'positive' else '😠' if msg.sentiment_label == 'negative' else '😐'
+            }
         
-        # Get chat statistics (exclude private chats)
+        messages_data.append({
+            'id': msg.id,
+            'text': msg.text[:200] + '...' if msg.text and len(msg.text) > 200 else msg.text,
+            'full_text': msg.text,
+            'timestamp': msg.timestamp.strftime('%H:%M:%S'),
+            'date': msg.timestamp.strftime('%Y-%m-%d'),
+            'sender_name': sender_name,
+            'sender_type': sender_type,
+            'chat_title': msg.chat_title,
+            'chat_id': msg.chat_id,
+            'sentiment': sentiment_info
+        })
+    
+    # Get chat statistics (exclude private chats); later pages only add messages
+    chat_stats = []
+    if after is None:
         chat_stats = db.session.query(
             Chat.id,
             Chat.title,
@@ -1388,31 +1717,347 @@ def recent_communications():
             Message.timestamp >= start_time,
             Message.timestamp <= end_time
         ).group_by(Chat.id, Chat.title).order_by(desc('last_activity')).all()
+    
+    chats_data = []
+    for chat in chat_stats:
+        chats_data.append({
+            'chat_id': chat.id,
+            'title': chat.title,
+            'message_count': chat.message_count,
+            'client_messages': chat.client_messages,
+            'team_messages': chat.team_messages,
+            'last_activity': chat.last_activity.strftime('%H:%M:%S')
+        })
+    
+    return {
+        'messages': messages_data,
+        'chats': chats_data,
+        'total_messages': len(messages_data),
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'period': {
+            'start': start_time.strftime('%Y-%m-%d %H:%M'),
+            'end': end_time.strftime('%Y-%m-%d %H:%M'),
+            'hours': hours
+        }
+    }
+
+
+# Dashboard bundle: several dashboard sections in one round-trip
+
+def _coalesced_dashboard_section(filters, analyzer):
+    """Filtered dashboard data, shared with identical concurrent requests"""
+    key = request_coalescer.make_key('filtered-dashboard-data', {
+        'chat_id': filters['chat_id'],
+        'employee_id': filters['employee_id'],
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'since': filters['since']
+    })
+    return request_coalescer.do(key, lambda: build_filtered_dashboard_data(
+        filters['chat_id'], filters['employee_id'], filters['start_date'], filters['end_date'],
+        analyzer=analyzer, since=filters['since']
+    ))
+
+
+def _coalesced_response_time_section(filters, analyzer):
+    """Response time analysis, shared with identical concurrent requests"""
+    key = request_coalescer.make_key('response-time-analysis', {
+        'chat_id': filters['chat_id'],
+        'employee_id': filters['employee_id'],
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'hours': filters['hours']
+    })
+    return request_coalescer.do(key, lambda: build_response_time_analysis(
+        filters['chat_id'], filters['employee_id'], filters['start_date'], filters['end_date'],
+        filters['hours'], analyzer=analyzer
+    ))
+
+
+BUNDLE_SECTIONS = {
+    'filter_options': lambda f, analyzer: build_filter_options(),
+    'dashboard': _coalesced_dashboard_section,
+    'response_time_analysis': _coalesced_response_time_section,
+    'sentiment_trend': lambda f, analyzer: build_sentiment_trend(f['days'], f['chat_id'], f['since']),
+    'response_time_trend': lambda f, analyzer: build_response_time_trend(f['days'], f['chat_id'], f['since']),
+    'sentiment_overview': lambda f, analyzer: build_sentiment_overview(
+        f['hours'], f['start_date'], f['end_date'], f['chat_id']
+    ),
+    'activity': lambda f, analyzer: build_activity_data(
+        str(f['chat_id'] or ''), str(f['employee_id'] or ''),
+        f['start_date'] or '', f['end_date'] or '', f['grouping']
+    ),
+    'communications': lambda f, analyzer: build_recent_communications(f['limit'], f['hours'], f['chat_id'])
+}
+
+DEFAULT_BUNDLE_SECTIONS = ['filter_options', 'dashboard', 'sentiment_trend', 'response_time_trend']
+
+# Bounded pool shared by all bundle requests so a burst of page loads
+# cannot open more concurrent DB sessions than the pool allows
+bundle_executor = ThreadPoolExecutor(
+    max_workers=config_manager.get_performance_config().get("bundle_max_workers", 4),
+    thread_name_prefix="dashboard-bundle"
+)
+
+
+def _run_bundle_section(name, filters, analyzer, memo, query_stats, replica_state):
+    """Run one bundle section in its own app context (and DB session)"""
+    with app.app_context():
+        bind_request_memo(memo)
+        bind_replica_state(replica_state)
+        if query_stats is not None:
+            bind_query_stats(query_stats)
+        return BUNDLE_SECTIONS[name](filters, analyzer)
+
+
+@app.route('/api/dashboard-bundle')
+@replica_reads
+def dashboard_bundle():
+    """Several dashboard sections for one shared filter set in a single response"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        sections_param = request.args.get('sections', '').strip()
+        sections = [s.strip() for s in sections_param.split(',') if s.strip()] or DEFAULT_BUNDLE_SECTIONS
+
+        unknown = [s for s in sections if s not in BUNDLE_SECTIONS]
+        if unknown:
+            return jsonify({"error": f"Unknown sections: {', '.join(unknown)}"}), 400
+
+        filters = {
+            'chat_id': request.args.get('chat_id', type=int),
+            'employee_id': request.args.get('employee_id', type=int),
+            'start_date': request.args.get('start_date') or None,
+            'end_date': request.args.get('end_date') or None,
+            'days': request.args.get('days', 7, type=int),
+            'hours': request.args.get('hours', 24, type=int),
+            'grouping': request.args.get('grouping', 'day'),
+            'limit': request.args.get('limit', 50, type=int)
+        }
+
+        # Delta sync: dashboard and trend sections only return what changed since the cursor
+        start_time, end_time = dashboard_time_range(filters['start_date'], filters['end_date'])
+        scope = {'view': 'bundle', 'sections': sorted(set(sections)), 'start': start_time, 'end': end_time,
+                 **{k: v for k, v in filters.items() if k not in ('start_date', 'end_date')}}
+        filters['since'] = decode_since(request.args.get('since'), scope)
+        next_cursor = encode_since(current_watermark(db.session), scope)
+
+        # Sections share the request memo, so per-chat response time
+        # analyses computed by one section are reused by the others
+        analyzer = ResponseTimeAnalyzer()
+        memo = get_request_memo()
+        query_stats = get_query_stats()
+        replica_state = get_replica_state()
+
+        futures = {
+            bundle_executor.submit(_run_bundle_section, name, filters, analyzer, memo, query_stats,
+                                   replica_state): name
+            for name in dict.fromkeys(sections)
+        }
+
+        bundle = {}
+        errors = {}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                bundle[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error computing dashboard bundle section {name}: {e}")
+                errors[name] = "Internal server error"
+
+        bundle['errors'] = errors
+        bundle['cursor'] = next_cursor
+        bundle['delta'] = filters['since'] is not None
+        return jsonify(bundle)
+
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting dashboard bundle: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+# Live dashboard events (Server-Sent Events)
+
+@app.route('/api/live')
+def live_events_stream():
+    """
+    Stream live dashboard deltas published by ingest and the KPI worker
+    
+    EventSource cannot send headers, so the admin token may also be passed
+    as the `token` query parameter. Each open stream holds one worker
+    thread (gunicorn.conf.py runs threaded workers) and one Redis
+    connection for at most live_events.max_stream_seconds.
+    """
+    import os
+    token = request.args.get('token')
+    expected_token = os.getenv("ADMIN_TOKEN") or config_manager.get_api_config().get("admin_token")
+    if not verify_admin_token() and not (token and token == expected_token):
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    client = subscriber_client()
+    if client is None:
+        return jsonify({"error": "Live events unavailable"}), 503
+    
+    response = Response(iter_sse_events(client), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Streaming exports
+
+export_config = config_manager.get_performance_config().get("export", {})
+
+
+def _export_response(query, fields, name):
+    """Stream an export query in the requested format"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format: {export_format}"}), 400
+    
+    compress = request.args.get('compress', '').lower() in ('1', 'true', 'gzip')
+    
+    body = export_stream(
+        db.session, query, fields,
+        export_format=export_format,
+        compress=compress,
+        yield_per=export_config.get('yield_per', 2000),
+        chunk_size=export_config.get('chunk_size', 65536)
+    )
+    
+    filename = f"{name}_{get_moscow_now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    mimetype = EXPORT_FORMATS[export_format]
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/export/messages')
+@replica_reads
+def export_messages():
+    """Stream messages matching the dashboard filters as NDJSON or CSV"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        chat_id = request.args.get('chat_id', type=int)
+        employee_id = request.args.get('employee_id', type=int)
+        start_time, end_time = dashboard_time_range(request.args.get('start_date'),
+                                                    request.args.get('end_date'))
         
-        chats_data = []
-        for chat in chat_stats:
-            chats_data.append({
-                'chat_id': chat.id,
-                'title': chat.title,
-                'message_count': chat.message_count,
-                'client_messages': chat.client_messages,
-                'team_messages': chat.team_messages,
-                'last_activity': chat.last_activity.strftime('%H:%M:%S')
-            })
+        filters = dashboard_message_filters(chat_id, employee_id, start_time, end_time)
+        return _export_response(build_messages_export_query(filters), MESSAGE_EXPORT_FIELDS, 'messages')
+        
+    except Exception as e:
+        logger.error(f"Error exporting messages: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/api/export/kpis')
+@replica_reads
+def export_kpis():
+    """Stream KPI history matching the dashboard filters as NDJSON or CSV"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        chat_id = request.args.get('chat_id', type=int)
+        employee_id = request.args.get('employee_id', type=int)
+        start_time, end_time = dashboard_time_range(request.args.get('start_date'),
+                                                    request.args.get('end_date'))
+        
+        filters = [
+            KpiLive.calculated_at >= start_time,
+            KpiLive.calculated_at <= end_time
+        ]
+        if chat_id:
+            filters.append(KpiLive.chat_id == chat_id)
+        if employee_id:
+            # KPIs are per chat: limit to chats the employee wrote in during the period
+            filters.append(KpiLive.chat_id.in_(
+                db.session.query(Message.chat_id).filter(
+                    Message.user_id == employee_id,
+                    Message.timestamp >= start_time,
+                    Message.timestamp <= end_time
+                ).distinct()
+            ))
+        
+        return _export_response(build_kpis_export_query(filters), KPI_EXPORT_FIELDS, 'kpis')
         
+    except Exception as e:
+        logger.error(f"Error exporting KPIs: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+# Full-text message search
+@app.route('/search')
+def search_page():
+    """Message search page"""
+    import os
+    admin_token = os.getenv("ADMIN_TOKEN")
+    return render_template('search.html', admin_token=admin_token)
+
+
+@app.route('/api/search/messages')
+@replica_reads
+def api_search_messages():
+    """Search message history (query, chat, sender type, local date range)"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    query_text = request.args.get('q', '').strip()
+    if not query_text:
+        return jsonify({"error": "Query parameter q is required"}), 400
+    
+    if db.engine.dialect.name != 'postgresql':
+        return jsonify({"error": "Full-text search requires PostgreSQL"}), 501
+    
+    try:
+        sort = request.args.get('sort', 'date')
+        if sort not in SEARCH_SORTS:
+            raise CursorError(f"Unknown sort: {sort}")
+        limit = parse_limit(request.args.get('limit'),
+                            pagination_config.get('default_limit', 50),
+                            pagination_config.get('max_limit', 200))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor, sort) if cursor else None
+        
+        filters = []
+        chat_id = request.args.get('chat_id', type=int)
+        if chat_id:
+            filters.append(Message.chat_id == chat_id)
+        user_id = request.args.get('user_id', type=int)
+        if user_id:
+            filters.append(Message.user_id == user_id)
+        sender = request.args.get('sender')
+        if sender in ('team', 'client'):
+            filters.append(Message.is_team_member == (sender == 'team'))
+        start_date = request.args.get('start_date')
+        if start_date:
+            filters.append(Message.timestamp >= local_date_to_utc_range(start_date)[0].replace(tzinfo=None))
+        end_date = request.args.get('end_date')
+        if end_date:
+            filters.append(Message.timestamp <= local_date_to_utc_range(end_date)[1].replace(tzinfo=None))
+        
+        result = search_messages(db.session, query_text, filters, sort, limit, after)
         return jsonify({
-            'messages': messages_data,
-            'chats': chats_data,
-            'total_messages': len(messages_data),
-            'period': {
-                'start': start_time.strftime('%Y-%m-%d %H:%M'),
-                'end': end_time.strftime('%Y-%m-%d %H:%M'),
-                'hours': hours
-            }
+            'results': result['items'],
+            'next_cursor': result['next_cursor'],
+            'has_more': result['has_more']
         })
         
+    except (CursorError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error getting recent communications: {e}")
+        logger.error(f"Error searching messages: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
@@ -1428,48 +2073,82 @@ def team_management():
 
 @app.route('/api/team-members')
 def api_team_members():
-    """Get all team members"""
+    """Get team members, optionally one cursor page at a time"""
     if not verify_admin_token():
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        team_members = TeamMember.query.order_by(TeamMember.full_name).all()
-        
-        members_data = []
-        for member in team_members:
-            # Get message statistics for each member
-            message_stats = db.session.query(
-                func.count(Message.id).label('total_messages'),
-                func.sum(func.length(Message.text)).label('total_characters'),
-                func.max(Message.timestamp).label('last_activity')
-            ).filter(
-                Message.user_id == member.user_id,
-                Message.is_team_member == True
-            ).first()
-            
-            members_data.append({
-                'id': member.id,
-                'user_id': member.user_id,
-                'username': member.username,
-                'full_name': member.full_name,
-                'role': member.role,
-                'is_active': member.is_active,
-                'created_at': member.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'updated_at': member.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'stats': {
-                    'total_messages': message_stats.total_messages or 0,
-                    'total_characters': message_stats.total_characters or 0,
-                    'last_activity': message_stats.last_activity.strftime('%Y-%m-%d %H:%M:%S') if message_stats.last_activity else None
-                }
-            })
-        
-        return jsonify({'team_members': members_data})
+        sort, limit, after = parse_page_args(TEAM_MEMBER_SORTS, 'full_name')
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        return jsonify(build_team_members(sort, limit, after))
         
     except Exception as e:
         logger.error(f"Error getting team members: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_team_members(sort='full_name', limit=None, after=None):
+    """Team members of one page with their message statistics (constant query count)"""
+    page = fetch_keyset_page(TeamMember.query, TEAM_MEMBER_SORTS, sort, limit, after)
+    team_members = page['items']
+    
+    # Message statistics of all members of the page in one grouped query
+    stats_by_user = {}
+    user_ids = [member.user_id for member in team_members if member.user_id is not None]
+    if user_ids:
+        message_stats = db.session.query(
+            Message.user_id,
+            func.count(Message.id).label('total_messages'),
+            func.sum(func.length(Message.text)).label('total_characters'),
+            func.max(Message.timestamp).label('last_activity')
+        ).filter(
+            Message.user_id.in_(user_ids),
+            Message.is_team_member == True
+        ).group_by(Message.user_id).all()
+        stats_by_user = {row.user_id: row for row in message_stats}
+    
+    members_data = []
+    for member in team_members:
+        message_stats = stats_by_user.get(member.user_id)
+        last_activity = message_stats.last_activity if message_stats else None
+        
+        members_data.append({
+            'id': member.id,
+            'user_id': member.user_id,
+            'username': member.username,
+            'full_name': member.full_name,
+            'role': member.role,
+            'is_active': member.is_active,
+            'is_linked': member.is_linked,
+            'created_at': member.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': member.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'stats': {
+                'total_messages': message_stats.total_messages if message_stats else 0,
+                'total_characters': (message_stats.total_characters or 0) if message_stats else 0,
+                'last_activity': last_activity.strftime('%Y-%m-%d %H:%M:%S') if last_activity else None
+            }
+        })
+    
+    result = {
+        'team_members': members_data,
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    }
+    
+    # Totals for the page header, computed once on the first page
+    if after is None:
+        totals = db.session.query(
+            func.count(TeamMember.id).label('total'),
+            func.sum(func.cast(TeamMember.is_active, db.Integer)).label('active')
+        ).one()
+        result['totals'] = {'total': totals.total or 0, 'active': totals.active or 0}
+    
+    return result
+
+
 @app.route('/api/team-members', methods=['POST'])
 def api_add_team_member():
     """Add new team member"""
@@ -1490,6 +2169,14 @@ def api_add_team_member():
         if not user_id and not username:
             return jsonify({"error": "Необходимо указать либо Telegram ID, либо Username"}), 400
         
+        # Resolve the Telegram ID of a username that has already written in a chat
+        if not user_id:
+            known_user = User.query.filter(
+                func.lower(User.username) == username.lstrip('@').lower()
+            ).order_by(User.last_seen_at.desc()).first()
+            if known_user:
+                user_id = known_user.user_id
+        
         # Check if user_id already exists (if provided)
         if user_id:
             existing_member = TeamMember.query.filter_by(user_id=user_id).first()
@@ -1627,26 +2314,15 @@ def api_potential_team_members():
     
     try:
         # Get users who are not currently team members but have significant activity
-        potential_members = db.session.query(
-            Message.user_id,
-            Message.username,
-            Message.full_name,
-            func.count(Message.id).label('message_count'),
-            func.sum(func.length(Message.text)).label('character_count'),
-            func.max(Message.timestamp).label('last_activity')
-        ).filter(
-            Message.is_team_member == False,
-            Message.user_id.notin_(
-                db.session.query(TeamMember.user_id).filter(TeamMember.is_active == True)
-            )
-        ).group_by(
-            Message.user_id,
-            Message.username,
-            Message.full_name
-        ).having(
-            func.count(Message.id) >= 5  # At least 5 messages
+        # (counters of the users table, maintained at ingest)
+        potential_members = db.session.query(User).filter(
+            User.client_message_count >= 5,  # At least 5 messages
+            ~db.session.query(TeamMember.id).filter(
+                TeamMember.user_id == User.user_id,
+                TeamMember.is_active == True
+            ).exists()
         ).order_by(
-            func.count(Message.id).desc()
+            User.client_message_count.desc()
         ).limit(20).all()
         
         potential_data = []
@@ -1655,9 +2331,9 @@ def api_potential_team_members():
                 'user_id': user.user_id,
                 'username': user.username,
                 'full_name': user.full_name,
-                'message_count': user.message_count,
-                'character_count': user.character_count or 0,
-                'last_activity': user.last_activity.strftime('%Y-%m-%d %H:%M:%S') if user.last_activity else None
+                'message_count': user.client_message_count,
+                'character_count': user.client_character_count or 0,
+                'last_activity': user.last_seen_at.strftime('%Y-%m-%d %H:%M:%S') if user.last_seen_at else None
             })
         
         return jsonify({'potential_members': potential_data})
@@ -1667,7 +2343,79 @@ def api_potential_team_members():
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route('/api/users/search')
+def api_users_search():
+    """Autocomplete users by username, full name or Telegram ID"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        query_text = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        exclude_team = request.args.get('exclude_team', '').lower() in ('1', 'true', 'yes')
+        
+        return jsonify({'users': search_users(db.session, query_text, limit, exclude_team)})
+        
+    except Exception as e:
+        logger.error(f"Error searching users: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/api/sentiment-cache/stats')
+def api_sentiment_cache_stats():
+    """Sentiment cache hit rate and API calls saved"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        return jsonify(sentiment_analyzer.cache.stats())
+        
+    except Exception as e:
+        logger.error(f"Error getting sentiment cache stats: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/api/sentiment-metrics')
+@replica_reads
+def api_sentiment_metrics():
+    """Sentiment API metrics of the worker and the backfill runs and the backlog, JSON or ?format=prometheus"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        snapshot = load_snapshot()
+        backfill = load_backfill_snapshots()
+        backlog = backlog_stats(db.session)
+        
+        if request.args.get('format') == 'prometheus':
+            text = "\n".join(prometheus_lines(snapshot or {}, backlog, backfill)) + "\n"
+            return Response(text, mimetype='text/plain; version=0.0.4')
+        
+        return jsonify({"worker": snapshot, "backfill": backfill, "backlog": backlog})
+        
+    except Exception as e:
+        logger.error(f"Error getting sentiment metrics: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/api/sentiment-pipeline-status')
+@replica_reads
+def api_sentiment_pipeline_status():
+    """Compact sentiment pipeline health for the admin UI"""
+    if not verify_admin_token():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        return jsonify(pipeline_status(load_snapshot(), backlog_stats(db.session),
+                                       backfill=load_backfill_snapshots()))
+        
+    except Exception as e:
+        logger.error(f"Error getting sentiment pipeline status: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @app.route('/api/activity-data')
+@replica_reads
 def api_activity_data():
     """API endpoint for activity analytics with grouping support"""
     if not verify_admin_token():
@@ -1681,54 +2429,65 @@ def api_activity_data():
         end_date = request.args.get('end_date', '').strip()
         grouping = request.args.get('grouping', 'day').strip()
         
-        # Parse dates
-        if start_date:
-            start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-        else:
-            start_datetime = datetime.now() - timedelta(days=7)
-            
-        if end_date:
-            end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-        else:
-            end_datetime = datetime.now()
-        
-        # Build base query (exclude private chats)
-        query = db.session.query(Message).join(Chat).filter(
-            Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
-            Message.timestamp >= start_datetime,
-            Message.timestamp < end_datetime
-        )
-        
-        # Apply filters
-        if chat_id:
-            try:
-                chat_id_int = int(chat_id)
-                query = query.filter(Message.chat_id == chat_id_int)
-            except ValueError:
-                pass
-                
-        if employee_id:
-            try:
-                employee_id_int = int(employee_id)
-                query = query.filter(Message.user_id == employee_id_int)
-            except ValueError:
-                pass
-        
-        # Get messages
-        messages = query.order_by(Message.timestamp).all()
-        
-        # Process data based on grouping
-        activity_data = process_activity_data(messages, grouping, start_datetime, end_datetime)
-        
-        return jsonify(activity_data)
+        return jsonify(build_activity_data(chat_id, employee_id, start_date, end_date, grouping))
         
     except Exception as e:
         logger.error(f"Error in activity data API: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+def build_activity_data(chat_id='', employee_id='', start_date='', end_date='', grouping='day'):
+    """Compute activity analytics with grouping support"""
+    # Dates are agency-local days; the query bounds are UTC
+    if start_date:
+        start_utc, _ = local_date_to_utc_range(start_date)
+        start_utc = start_utc.replace(tzinfo=None)
+    else:
+        start_utc = datetime.utcnow() - timedelta(days=7)
+        
+    if end_date:
+        _, end_utc = local_date_to_utc_range(end_date)
+        end_utc = end_utc.replace(tzinfo=None)
+    else:
+        end_utc = datetime.utcnow()
+    
+    # Only the columns bucketing needs (exclude private chats)
+    query = db.session.query(Message.timestamp, Message.is_team_member).join(Chat).filter(
+        Chat.chat_type.in_(['group', 'supergroup']),  # Only group chats
+        Message.timestamp >= start_utc,
+        Message.timestamp < end_utc
+    )
+    
+    # Apply filters
+    if chat_id:
+        try:
+            chat_id_int = int(chat_id)
+            query = query.filter(Message.chat_id == chat_id_int)
+        except ValueError:
+            pass
+            
+    if employee_id:
+        try:
+            employee_id_int = int(employee_id)
+            query = query.filter(Message.user_id == employee_id_int)
+        except ValueError:
+            pass
+    
+    # Get messages
+    messages = query.order_by(Message.timestamp).all()
+    
+    # Process data based on grouping, in local time
+    start_datetime, end_datetime = to_local_naive_many([start_utc, end_utc])
+    return process_activity_data(messages, grouping, start_datetime, end_datetime)
+
+
 def process_activity_data(messages, grouping, start_datetime, end_datetime):
-    """Process messages for activity analysis with different grouping levels"""
+    """
+    Process messages for activity analysis with different grouping levels
+    
+    Messages need `timestamp` (naive UTC, ascending) and `is_team_member`;
+    start_datetime and end_datetime are naive local times.
+    """
     from collections import defaultdict
     import calendar
     
@@ -1743,9 +2502,11 @@ def process_activity_data(messages, grouping, start_datetime, end_datetime):
     total_client_messages = 0
     total_team_messages = 0
     
+    # Local times of all messages in one pass over the offset transition table
+    local_times = to_local_naive_many(message.timestamp for message in messages)
+    
     # Process each message
-    for message in messages:
-        msg_time = message.timestamp
+    for message, msg_time in zip(messages, local_times):
         hour = msg_time.hour
         weekday = msg_time.weekday()  # 0=Monday, 6=Sunday
         
@@ -1861,6 +2622,14 @@ def process_activity_data(messages, grouping, start_datetime, end_datetime):
     }
 
 
+@app.teardown_request
+def log_request_memo_savings(error=None):
+    """Report how many repeated analyzer/KPI calls the request memo avoided"""
+    memo = g.get('_request_memo')
+    if memo is not None:
+        memo.log_savings(request.path)
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
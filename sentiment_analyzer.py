@@ -1,24 +1,104 @@
 import asyncio
+import json
 import logging
 import os
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional
 
 import aiohttp
 
+from config_manager import ConfigManager
+from sentiment_cache import normalize_text, sentiment_cache
+from sentiment_metrics import SentimentMetrics, tier_rates
+from sentiment_model import MODEL_MIN_CONFIDENCE, MODEL_MODE, local_model
+from sentiment_rules import classify as classify_locally
+from sentiment_pipeline import (CONCURRENCY, MAX_RETRIES, RateLimiter, is_retryable_status,
+                                parse_retry_after, retry_delay)
+
 logger = logging.getLogger(__name__)
 
+_config = ConfigManager().get_performance_config().get("sentiment", {})
+BATCH_SIZE = _config.get("batch_size", 20)
+# Completion tokens reserved per message of a batched prompt
+BATCH_TOKENS_PER_ITEM = _config.get("batch_tokens_per_item", 40)
+MAX_TEXT_LENGTH = 500
+# Bump when the prompts or their parsing change: cached results of other versions are not used
+PROMPT_VERSION = "1"
+VALID_LABELS = ("positive", "negative", "neutral")
+
+_http_config = _config.get("http", {})
+CONNECTION_LIMIT = _http_config.get("connection_limit", 20)
+CONNECTION_LIMIT_PER_HOST = _http_config.get("connection_limit_per_host", 10)
+DNS_CACHE_TTL = _http_config.get("dns_cache_ttl", 300)
+KEEPALIVE_TIMEOUT = _http_config.get("keepalive_timeout", 60)
+REQUEST_TIMEOUT = _http_config.get("request_timeout", 30)
+
 
 class SentimentAnalyzer:
     """Sentiment analysis using OpenRouter API with Mistral model"""
     
-    def __init__(self):
+    def __init__(self, cache=sentiment_cache):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.base_url = "https://openrouter.ai/api/v1"
         self.model = "mistralai/mistral-7b-instruct"
+        self.batch_size = max(1, BATCH_SIZE)
+        self.cache = cache
+        # Messages answered by each tier: local rules, local model, cache, LLM, provisional
+        # local model answers while the LLM fails (fallback), and those given up on
+        self.tier_counts = {"rules": 0, "model": 0, "cache": 0, "llm": 0, "fallback": 0, "failed": 0}
+        self.metrics = SentimentMetrics()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.rate_limiter: Optional[RateLimiter] = None
         
         if not self.api_key:
             logger.warning("OPENROUTER_API_KEY not found, sentiment analysis will be disabled")
     
+    @property
+    def cache_version(self) -> str:
+        return f"{self.model}:{PROMPT_VERSION}"
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Shared HTTP session with a pooled keep-alive connector
+        
+        Created on first use in the running event loop, together with the
+        concurrency limit and the rate limiter; a session left over from
+        another (finished) loop is replaced.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._session = None
+            self._semaphore = asyncio.Semaphore(max(1, CONCURRENCY))
+            self.rate_limiter = RateLimiter()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT,
+                limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+        return self._session
+    
+    async def close(self):
+        """Close the HTTP session and its pooled connections, write pending cache counters"""
+        self.cache.flush()
+        session, self._session = self._session, None
+        if session is not None and not session.closed and self._loop is asyncio.get_running_loop():
+            await session.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
     async def analyze_sentiment(self, text: str) -> Optional[Dict]:
         """
         Analyze sentiment of given text
@@ -27,27 +107,120 @@ class SentimentAnalyzer:
             text: Text to analyze
             
         Returns:
-            Dict with keys: score (-1 to 1), label (positive/negative/neutral), confidence (0-1)
+            Dict with keys: score (-1 to 1), label (positive/negative/neutral), confidence (0-1),
+            source (rules/model/llm), provisional (local model result while the LLM failed,
+            see fallback_batch)
         """
+        local = self._classify_locally(text)
+        if local:
+            self.tier_counts["rules"] += 1
+            return local
+        
+        if MODEL_MODE == "primary":
+            predicted = self._predict_locally([text], MODEL_MIN_CONFIDENCE)[0]
+            if predicted:
+                return predicted
+        
+        cached = self.cache.get(text, self.cache_version)
+        if cached:
+            self.tier_counts["cache"] += 1
+            return {**cached, "source": "llm"}
+        
         if not self.api_key:
             logger.warning("No API key available for sentiment analysis")
-            return None
+            return self.fallback_batch([text])[0]
         
-        if not text or len(text.strip()) < 3:
-            return {"score": 0.0, "label": "neutral", "confidence": 0.0}
+        result = await self._analyze_uncached(text)
+        if result:
+            self.tier_counts["llm"] += 1
+            self.cache.put(text, result, self.cache_version)
+            return result
+        result = self.fallback_batch([text])[0]
+        if result is None:
+            self.record_failed(1)
+        return result
+    
+    def _classify_locally(self, text: str) -> Optional[Dict]:
+        """Result of the rule-based tier, or neutral for texts too short to analyze"""
+        local = classify_locally(text)
+        if local is None and (not text or len(text.strip()) < 3):
+            local = {"score": 0.0, "label": "neutral", "confidence": 0.0}
+        if local:
+            local["source"] = "rules"
+        return local
+    
+    def _predict_locally(self, texts: List[str], min_confidence: float = 0.0,
+                         tier: str = "model") -> List[Optional[Dict]]:
+        """Local model results at least min_confidence confident (None without a trained model)"""
+        model = local_model.get()
+        if model is None or not texts:
+            return [None] * len(texts)
+        try:
+            predictions = model.predict(texts)
+        except Exception as e:
+            logger.error(f"Error predicting sentiment with the local model: {e}")
+            return [None] * len(texts)
+        
+        results = [{**prediction, "source": "model"} if prediction["confidence"] >= min_confidence else None
+                   for prediction in predictions]
+        self.tier_counts[tier] += sum(result is not None for result in results)
+        return results
+    
+    def fallback_batch(self, texts: List[str]) -> List[Optional[Dict]]:
+        """
+        Local model results for texts the LLM could not analyze
         
+        Only in the fallback mode of performance.sentiment.local_model and
+        for predictions at least min_confidence confident, as in the primary
+        mode. With an API key the results are marked provisional: callers
+        store them but leave the message unprocessed, so the LLM analyzes it
+        once it is back.
+        """
+        if MODEL_MODE != "fallback":
+            return [None] * len(texts)
+        results = self._predict_locally(texts, MODEL_MIN_CONFIDENCE, tier="fallback")
+        if self.api_key:
+            results = [dict(result, provisional=True) if result else None for result in results]
+        return results
+    
+    async def _analyze_uncached(self, text: str, retries: int = MAX_RETRIES) -> Optional[Dict]:
+        """Analyze one text with the API"""
         try:
             prompt = self._create_sentiment_prompt(text)
-            response = await self._call_openrouter_api(prompt)
+            response = await self._call_openrouter_api(prompt, retries=retries)
             
             if response:
-                return self._parse_sentiment_response(response)
+                result = self._parse_sentiment_response(response)
+                if result:
+                    result["source"] = "llm"
+                return result
             
         except Exception as e:
             logger.error(f"Error analyzing sentiment: {e}")
         
         return None
     
+    def record_failed(self, count: int):
+        """Messages given up on: no tier answered them after the caller's last attempt"""
+        self.tier_counts["failed"] += count
+    
+    def tier_split(self) -> Dict:
+        """Messages per tier and their shares"""
+        total = sum(self.tier_counts.values())
+        return {
+            tier: {"count": count, "share": round(count / total, 4) if total else None}
+            for tier, count in self.tier_counts.items()
+        }
+    
+    def metrics_snapshot(self) -> Dict:
+        """API call metrics, tier counts and hit rates, cache counters of this process"""
+        return {
+            "metrics": self.metrics.snapshot(),
+            "tiers": dict(self.tier_counts),
+            "rates": tier_rates(self.tier_counts),
+            "cache": self.cache.process_stats(),
+        }
+    
     def _create_sentiment_prompt(self, text: str) -> str:
         """Create prompt for sentiment analysis"""
         return f"""Analyze the sentiment of the following message and respond with ONLY a JSON object in this exact format:
@@ -61,12 +234,41 @@ Rules:
 - Response must be valid JSON only
 
 Message to analyze:
-"{text[:500]}"
+"{text[:MAX_TEXT_LENGTH]}"
 
 JSON Response:"""
     
-    async def _call_openrouter_api(self, prompt: str) -> Optional[str]:
-        """Call OpenRouter API"""
+    def _create_batch_prompt(self, texts: List[str]) -> str:
+        """Create prompt for sentiment analysis of several messages, numbered from 1"""
+        messages = "\n".join(
+            json.dumps({"id": index, "text": text[:MAX_TEXT_LENGTH]}, ensure_ascii=False)
+            for index, text in enumerate(texts, start=1)
+        )
+        return f"""Analyze the sentiment of each of the following {len(texts)} messages and respond with ONLY a JSON array containing one object per message, in this exact format:
+[{{"id": <message id>, "score": <float between -1 and 1>, "label": "<positive|negative|neutral>", "confidence": <float between 0 and 1>}}, ...]
+
+Rules:
+- id: the id of the message the result belongs to
+- score: -1 (very negative) to 1 (very positive), 0 is neutral
+- label: "positive", "negative", or "neutral"
+- confidence: how confident you are in the analysis (0-1)
+- Analyze every message on its own, messages are from different customers
+- Consider context of customer service communication
+- Response must be valid JSON only
+
+Messages to analyze (one JSON object per line):
+{messages}
+
+JSON Response:"""
+    
+    async def _call_openrouter_api(self, prompt: str, max_tokens: int = 100, kind: str = "single",
+                                   retries: int = MAX_RETRIES) -> Optional[str]:
+        """
+        Call OpenRouter API, retrying throttled, failed and timed out requests up to retries times
+        
+        A 429 pauses every request of this analyzer for the Retry-After
+        delay, also when no retry is left.
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -82,39 +284,79 @@ JSON Response:"""
                     "content": prompt
                 }
             ],
-            "max_tokens": 100,
+            "max_tokens": max_tokens,
             "temperature": 0.1,
             "top_p": 0.9
         }
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data["choices"][0]["message"]["content"].strip()
-                    else:
+        # Rough prompt size (about 3 characters per token) plus the completion
+        estimated_tokens = len(prompt) // 3 + max_tokens
+        
+        for attempt in range(retries + 1):
+            retry_after = None
+            status = None
+            sent = None
+            try:
+                session = await self.get_session()
+                waiting = time.perf_counter()
+                async with self._semaphore:
+                    await self.rate_limiter.acquire(estimated_tokens)
+                    sent = time.perf_counter()
+                    self.metrics.record_limit_wait(sent - waiting)
+                    async with session.post(
+                        f"{self.base_url}/chat/completions",
+                        headers=headers,
+                        json=payload
+                    ) as response:
+                        status = response.status
+                        if response.status == 200:
+                            data = await response.json()
+                            usage = data.get("usage") or {}
+                            self.metrics.record_request(kind, status, time.perf_counter() - sent, usage)
+                            self.metrics.record_call(kind, attempt)
+                            self.rate_limiter.record_usage(estimated_tokens, usage.get("total_tokens"))
+                            return data["choices"][0]["message"]["content"].strip()
+                        
                         error_text = await response.text()
-                        logger.error(f"OpenRouter API error {response.status}: {error_text}")
-                        return None
+                        self.metrics.record_request(kind, status, time.perf_counter() - sent)
+                        if not is_retryable_status(response.status):
+                            logger.error(f"OpenRouter API error {response.status}: {error_text}")
+                            self.metrics.record_call(kind, attempt)
+                            return None
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        problem = f"error {response.status}: {error_text[:200]}"
+            
+            except asyncio.TimeoutError:
+                problem = "timeout"
+                self.metrics.record_request(kind, "timeout", time.perf_counter() - sent if sent else None)
+            except aiohttp.ClientError as e:
+                problem = f"connection error: {e}"
+                self.metrics.record_request(kind, "connection_error", None)
+            except Exception as e:
+                logger.error(f"Error calling OpenRouter API: {e}")
+                self.metrics.record_request(kind, "error", None)
+                self.metrics.record_call(kind, attempt)
+                return None
+            
+            delay = retry_delay(attempt, retry_after)
+            if status == 429:
+                # Throttled: every request of this analyzer waits
+                self.rate_limiter.pause(delay)
+            
+            if attempt == retries:
+                log = logger.error if retries else logger.warning
+                log(f"OpenRouter API {problem}, giving up after {attempt + 1} attempts")
+                self.metrics.record_call(kind, attempt)
+                return None
+            
+            logger.warning(f"OpenRouter API {problem}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
         
-        except asyncio.TimeoutError:
-            logger.error("OpenRouter API timeout")
-            return None
-        except Exception as e:
-            logger.error(f"Error calling OpenRouter API: {e}")
-            return None
+        return None
     
     def _parse_sentiment_response(self, response: str) -> Optional[Dict]:
         """Parse sentiment analysis response"""
         try:
-            import json
-            
             # Clean response - sometimes the model adds extra text
             response = response.strip()
             
@@ -124,45 +366,179 @@ JSON Response:"""
             
             if start_idx != -1 and end_idx != -1:
                 json_str = response[start_idx:end_idx + 1]
-                result = json.loads(json_str)
-                
-                # Validate required fields
-                if all(key in result for key in ["score", "label", "confidence"]):
-                    # Ensure score is within bounds
-                    score = max(-1.0, min(1.0, float(result["score"])))
-                    
-                    # Ensure confidence is within bounds
-                    confidence = max(0.0, min(1.0, float(result["confidence"])))
-                    
-                    # Validate label
-                    label = result["label"].lower()
-                    if label not in ["positive", "negative", "neutral"]:
-                        # Infer label from score if invalid
-                        if score > 0.1:
-                            label = "positive"
-                        elif score < -0.1:
-                            label = "negative"
-                        else:
-                            label = "neutral"
-                    
-                    return {
-                        "score": score,
-                        "label": label,
-                        "confidence": confidence
-                    }
+                result = self._validate_sentiment_item(json.loads(json_str))
+                if result:
+                    return result
         
         except (json.JSONDecodeError, ValueError, KeyError) as e:
             logger.error(f"Error parsing sentiment response: {e}, response: {response}")
         
+        self.metrics.record_parse_failure("single")
         return None
     
-    async def analyze_batch(self, texts: list) -> list:
-        """Analyze sentiment for multiple texts"""
-        tasks = [self.analyze_sentiment(text) for text in texts]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    def _validate_sentiment_item(self, result) -> Optional[Dict]:
+        """Validate one sentiment object and clamp it to the expected ranges"""
+        # Validate required fields
+        if not isinstance(result, dict) or not all(key in result for key in ["score", "label", "confidence"]):
+            return None
+        
+        try:
+            # Ensure score is within bounds
+            score = max(-1.0, min(1.0, float(result["score"])))
+            
+            # Ensure confidence is within bounds
+            confidence = max(0.0, min(1.0, float(result["confidence"])))
+        except (TypeError, ValueError):
+            return None
+        
+        if score != score or confidence != confidence:
+            # NaN
+            return None
+        
+        # Validate label
+        label = str(result["label"]).lower().strip()
+        if label not in VALID_LABELS:
+            # Infer label from score if invalid
+            if score > 0.1:
+                label = "positive"
+            elif score < -0.1:
+                label = "negative"
+            else:
+                label = "neutral"
+        
+        return {
+            "score": score,
+            "label": label,
+            "confidence": confidence
+        }
+    
+    def _parse_batch_response(self, response: str, count: int) -> Dict[int, Dict]:
+        """
+        Parse a batched response into {id: result} for ids 1..count
+        
+        Objects are decoded one by one, so a truncated array or one malformed
+        item only loses the affected items. Unknown and repeated ids are
+        ignored; objects without ids are matched by position only when there
+        is exactly one per message.
+        """
+        decoder = json.JSONDecoder()
+        objects = []
+        position = response.find('{')
+        while position != -1:
+            try:
+                item, end = decoder.raw_decode(response, position)
+            except ValueError:
+                position = response.find('{', position + 1)
+                continue
+            if isinstance(item, dict):
+                objects.append(item)
+            position = response.find('{', end)
+        
+        results = {}
+        if objects and not any("id" in item for item in objects) and len(objects) == count:
+            objects = [dict(item, id=index) for index, item in enumerate(objects, start=1)]
+        
+        for item in objects:
+            try:
+                item_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if item_id < 1 or item_id > count or item_id in results:
+                continue
+            validated = self._validate_sentiment_item(item)
+            if validated:
+                results[item_id] = validated
+        
+        return results
+    
+    async def analyze_batch(self, texts: List[str], retries: int = MAX_RETRIES) -> List[Optional[Dict]]:
+        """
+        Analyze sentiment for multiple texts, batch_size messages per API call
+        
+        Returns one result per text, in order (None where analysis failed).
+        retries: retries of each API request (SentimentPipeline passes 0 and
+        re-queues failed items itself, so the two layers do not multiply).
+        In the primary mode of the local model, its confident predictions are
+        not sent either. Cached texts are not sent, and texts that normalize
+        the same are sent once. Items missing or invalid in a batched response are re-queried
+        one by one; if a batched call fails as a whole, its items are left None.
+        """
+        results: List[Optional[Dict]] = [None] * len(texts)
+        
+        pending = []
+        for index, text in enumerate(texts):
+            results[index] = self._classify_locally(text)
+            if results[index] is None:
+                pending.append(index)
+        self.tier_counts["rules"] += len(texts) - len(pending)
+        
+        if MODEL_MODE == "primary" and pending:
+            predicted = self._predict_locally([texts[index] for index in pending], MODEL_MIN_CONFIDENCE)
+            for index, result in zip(pending, predicted):
+                results[index] = result
+            pending = [index for index in pending if results[index] is None]
+        
+        version = self.cache_version
+        # One prompt item per distinct normalized text that is not cached
+        duplicates: Dict[str, List[int]] = {}
+        for index, cached in zip(pending, self.cache.get_many([texts[index] for index in pending], version)):
+            if cached:
+                results[index] = {**cached, "source": "llm"}
+                self.tier_counts["cache"] += 1
+            else:
+                duplicates.setdefault(normalize_text(texts[index]), []).append(index)
+        pending = [indexes[0] for indexes in duplicates.values()]
+        
+        if pending and not self.api_key:
+            logger.warning("No API key available for sentiment analysis")
+            return results
+        
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            if len(chunk) == 1:
+                results[chunk[0]] = await self._analyze_uncached(texts[chunk[0]], retries)
+                continue
+            
+            try:
+                prompt = self._create_batch_prompt([texts[index] for index in chunk])
+                response = await self._call_openrouter_api(
+                    prompt, max_tokens=BATCH_TOKENS_PER_ITEM * len(chunk) + 50, kind="batch", retries=retries
+                )
+            except Exception as e:
+                logger.error(f"Error analyzing sentiment batch: {e}")
+                continue
+            
+            if not response:
+                continue
+            
+            parsed = self._parse_batch_response(response, len(chunk))
+            failed = []
+            for item_id, index in enumerate(chunk, start=1):
+                if item_id in parsed:
+                    results[index] = {**parsed[item_id], "source": "llm"}
+                else:
+                    failed.append(index)
+            
+            if failed:
+                self.metrics.record_parse_failure("batch_items", len(failed))
+                logger.warning(f"Sentiment batch returned {len(chunk) - len(failed)}/{len(chunk)} valid results, "
+                               f"re-querying {len(failed)} individually")
+                retried = await asyncio.gather(
+                    *(self._analyze_uncached(texts[index], retries) for index in failed), return_exceptions=True
+                )
+                for index, result in zip(failed, retried):
+                    results[index] = result if isinstance(result, dict) else None
+        
+        self.cache.put_many([(texts[index], results[index]) for index in pending if results[index]], version)
+        for indexes in duplicates.values():
+            if results[indexes[0]]:
+                self.tier_counts["llm"] += 1
+                # Duplicates within the batch cost no call either
+                self.tier_counts["cache"] += len(indexes) - 1
+                for index in indexes[1:]:
+                    results[index] = dict(results[indexes[0]])
         
-        # Filter out exceptions and None results
-        return [result for result in results if isinstance(result, dict)]
+        return results
 
 
 # Example usage
@@ -178,11 +554,14 @@ async def test_sentiment_analyzer():
         "This doesn't work at all, I'm frustrated"
     ]
     
-    for message in test_messages:
-        result = await analyzer.analyze_sentiment(message)
-        print(f"Text: {message}")
-        print(f"Result: {result}")
-        print("---")
+    try:
+        for message in test_messages:
+            result = await analyzer.analyze_sentiment(message)
+            print(f"Text: {message}")
+            print(f"Result: {result}")
+            print("---")
+    finally:
+        await analyzer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+Conversation-level sentiment per client burst
+
+A burst is a run of consecutive client messages in a chat up to the next
+team reply, the turns response times are measured on
+(response_time_analyzer.conversation_turns). In burst mode the worker scores
+each burst touched by its queue with one call on the joined texts and writes
+the result to every client message of the burst, with sentiment_source
+'burst' and sentiment_burst_id set to the id of the burst's first message.
+The per-message sentiment fields stay populated, so dashboards and KPIs read
+them as before; a burst that grows later is scored again as a whole.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import DateTime, column, func, or_, select, values
+
+from config_manager import ConfigManager
+from models import Message
+from response_time_analyzer import conversation_turns
+from sentiment_analyzer import MAX_TEXT_LENGTH
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {}).get("bursts", {})
+BURSTS_ENABLED = _config.get("enabled", False)
+# Latest messages of a burst joined into its text
+MAX_MESSAGES = _config.get("max_messages", 20)
+# How far back (and forward) from each queued message its burst is followed
+LOOKBACK_HOURS = _config.get("lookback_hours", 24)
+
+
+def burst_text(messages: List[Message]) -> str:
+    """Texts of the latest burst messages, one per line, that fit into one prompt"""
+    lines = []
+    length = 0
+    for message in reversed([message for message in messages if message.text][-MAX_MESSAGES:]):
+        if lines and length + len(message.text) + 1 > MAX_TEXT_LENGTH:
+            break
+        lines.append(message.text)
+        length += len(message.text) + 1
+    return "\n".join(reversed(lines))
+
+
+def _burst_windows(session, chat_id: int, pending: List[Message]) -> List[Tuple[datetime, datetime]]:
+    """
+    Time ranges of the chat that hold the bursts of the pending messages
+
+    Each pending message gets the range from the team reply before it to the
+    one after it (at most LOOKBACK_HOURS away, in one query for all of them);
+    overlapping ranges are merged, so distant messages do not pull in the
+    whole conversation between them.
+    """
+    window = timedelta(hours=LOOKBACK_HOURS)
+    queued = values(column("timestamp", DateTime), name="queued").data(
+        [(timestamp,) for timestamp in sorted({message.timestamp for message in pending})]
+    )
+    previous = select(func.max(Message.timestamp)).where(
+        Message.chat_id == chat_id,
+        Message.is_team_member == True,
+        Message.timestamp < queued.c.timestamp,
+        Message.timestamp >= queued.c.timestamp - window
+    ).scalar_subquery()
+    following = select(func.min(Message.timestamp)).where(
+        Message.chat_id == chat_id,
+        Message.is_team_member == True,
+        Message.timestamp > queued.c.timestamp,
+        Message.timestamp <= queued.c.timestamp + window
+    ).scalar_subquery()
+
+    windows = []
+    for timestamp, lower, upper in session.execute(
+        select(queued.c.timestamp, previous, following).order_by(queued.c.timestamp)
+    ):
+        start, end = lower or timestamp - window, upper or timestamp + window
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def _chat_bursts(session, chat_id: int, pending: List[Message]) -> List[List[Message]]:
+    """Client bursts of the chat that contain pending messages"""
+    windows = _burst_windows(session, chat_id, pending)
+    messages = session.query(Message).filter(
+        Message.chat_id == chat_id,
+        or_(*(Message.timestamp.between(start, end) for start, end in windows))
+    ).order_by(Message.timestamp, Message.id).all()
+
+    # Turns are split per range: a burst never spans the gap between two of them
+    by_window = [[] for _ in windows]
+    for message in messages:
+        index = next(index for index, (start, end) in enumerate(windows) if start <= message.timestamp <= end)
+        by_window[index].append(message)
+
+    pending_ids = {message.id for message in pending}
+    return [
+        client_messages
+        for window_messages in by_window
+        for client_messages, _ in conversation_turns(window_messages)
+        if any(message.id in pending_ids for message in client_messages)
+    ]
+
+
+def collect_bursts(session, pending: List[Message]) -> List[Tuple[int, List[Message]]]:
+    """
+    (burst id, client messages) of the bursts the pending messages belong to
+
+    Messages of a burst that were analyzed before are included: the burst is
+    scored as a whole and they get its result too.
+    """
+    by_chat: Dict[int, List[Message]] = defaultdict(list)
+    for message in pending:
+        by_chat[message.chat_id].append(message)
+
+    bursts = []
+    for chat_id, chat_pending in by_chat.items():
+        for members in _chat_bursts(session, chat_id, chat_pending):
+            members = [message for message in members if message.text]
+            bursts.append((members[0].id, members))
+    return bursts
@@ -0,0 +1,331 @@
+"""
+Sentiment result cache
+
+Results are keyed by a hash of the normalized message text and the
+model/prompt version, so near-identical messages ("Спасибо!", "спасибо")
+cost one API call and changing the model or prompt starts a fresh cache.
+An in-process LRU sits in front of the sentiment_cache table
+(models.SentimentCacheEntry), which is shared by the worker, the batch
+script and the web app. Only texts up to max_text_length characters are
+cached: long messages are practically never repeated.
+
+Rows expire ttl_days after they were computed; when the table grows past
+max_entries the least recently used (eviction: lru) or least hit (lfu)
+rows are deleted, together with rows of other versions.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, create_engine, text
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {}).get("cache", {})
+CACHE_ENABLED = _config.get("enabled", True)
+MAX_TEXT_LENGTH = _config.get("max_text_length", 200)
+MEMORY_MAX_ENTRIES = _config.get("memory_max_entries", 10000)
+MEMORY_TTL = _config.get("memory_ttl", 3600)
+TTL_DAYS = _config.get("ttl_days", 90)
+MAX_ENTRIES = _config.get("max_entries", 200000)
+EVICTION = _config.get("eviction", "lru")
+EVICTION_INTERVAL = _config.get("eviction_interval", 3600)
+# Seconds hit counters are accumulated before they are written
+HIT_FLUSH_INTERVAL = 30
+# Seconds the table is skipped after a database error
+TABLE_RETRY_INTERVAL = 60
+
+_EVICTION_ORDER = {
+    "lru": "last_used_at, hit_count",
+    "lfu": "hit_count, last_used_at",
+}
+
+_WHITESPACE = re.compile(r"\s+")
+_REPEATED_PUNCTUATION = re.compile(r"([!?.,()])\1+")
+
+
+def normalize_text(value: str) -> str:
+    """Case, ё, whitespace and repeated or trailing punctuation do not change the key"""
+    normalized = _WHITESPACE.sub(" ", value.strip().lower().replace("ё", "е"))
+    normalized = _REPEATED_PUNCTUATION.sub(r"\1", normalized)
+    return normalized.rstrip(".! ") or normalized
+
+
+def cache_key(normalized: str, version: str) -> str:
+    return hashlib.sha256(f"{version}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class SentimentCache:
+    """In-process LRU in front of the sentiment_cache table"""
+
+    def __init__(self, database_url: Optional[str] = None):
+        self.database_url = database_url or os.getenv("DATABASE_URL")
+        self.enabled = CACHE_ENABLED
+        self._engine = None
+        self._table_down_until = 0.0
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_hits: Dict[str, int] = {}
+        self._flushed_at = time.monotonic()
+        self._evicted_at = 0.0
+        self.counters = {"lookups": 0, "memory_hits": 0, "db_hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = create_engine(self.database_url, pool_size=2, max_overflow=2,
+                                         pool_recycle=300, pool_pre_ping=True)
+        return self._engine
+
+    @property
+    def _persistent(self) -> bool:
+        return self.database_url is not None and time.monotonic() >= self._table_down_until
+
+    def _disable_persistent(self, error):
+        logger.warning(f"Sentiment cache table unavailable, caching in memory only "
+                       f"for {TABLE_RETRY_INTERVAL}s: {error}")
+        self._table_down_until = time.monotonic() + TABLE_RETRY_INTERVAL
+
+    def _keys(self, texts: Iterable[str], version: str) -> List[Optional[str]]:
+        """Cache key per text (None if the text is not cached)"""
+        keys = []
+        for value in texts:
+            normalized = normalize_text(value or "")
+            keys.append(cache_key(normalized, version) if normalized and len(normalized) <= MAX_TEXT_LENGTH
+                        else None)
+        return keys
+
+    def get_many(self, texts: List[str], version: str) -> List[Optional[Dict]]:
+        """Cached result per text, None for misses"""
+        results: List[Optional[Dict]] = [None] * len(texts)
+        if not self.enabled:
+            return results
+
+        keys = self._keys(texts, version)
+        now = time.monotonic()
+        missing = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                if key is None:
+                    continue
+                self.counters["lookups"] += 1
+                entry = self._memory.get(key)
+                if entry is not None and now - entry[0] < MEMORY_TTL:
+                    self._memory.move_to_end(key)
+                    results[index] = dict(entry[1])
+                    self.counters["memory_hits"] += 1
+                    self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+                else:
+                    missing.setdefault(key, []).append(index)
+
+        if missing and self._persistent:
+            rows = self._load(list(missing))
+            with self._lock:
+                for key, result in rows.items():
+                    self._remember(key, result, now)
+                    for index in missing.pop(key):
+                        results[index] = dict(result)
+                        self.counters["db_hits"] += 1
+                        self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+
+        with self._lock:
+            self.counters["misses"] += sum(len(indexes) for indexes in missing.values())
+        self._maybe_flush_hits()
+        return results
+
+    def get(self, value: str, version: str) -> Optional[Dict]:
+        return self.get_many([value], version)[0]
+
+    def put_many(self, items: List[Tuple[str, Dict]], version: str):
+        """Store results of (text, result) pairs"""
+        if not self.enabled or not items:
+            return
+
+        keys = self._keys([value for value, _ in items], version)
+        now = time.monotonic()
+        rows = {}
+        with self._lock:
+            for key, (value, result) in zip(keys, items):
+                if key is None or not result:
+                    continue
+                stored = {"score": result["score"], "label": result["label"], "confidence": result["confidence"]}
+                self._remember(key, stored, now)
+                rows[key] = dict(stored, cache_key=key, normalized_text=normalize_text(value))
+            self.counters["stored"] += len(rows)
+
+        if rows and self._persistent:
+            self._store(list(rows.values()), version)
+        self._maybe_evict(version)
+
+    def put(self, value: str, result: Dict, version: str):
+        self.put_many([(value, result)], version)
+
+    def _remember(self, key: str, result: Dict, now: float):
+        """Add to the in-memory LRU (caller holds the lock)"""
+        self._memory[key] = (now, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_MAX_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, Dict]:
+        """Unexpired rows of keys"""
+        statement = "SELECT cache_key, score, label, confidence FROM sentiment_cache WHERE cache_key IN :keys"
+        params = {"keys": keys}
+        if TTL_DAYS:
+            statement += " AND created_at >= :expires"
+            params["expires"] = datetime.utcnow() - timedelta(days=TTL_DAYS)
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(
+                    text(statement).bindparams(bindparam("keys", expanding=True)), params
+                ).all()
+        except Exception as e:
+            self._disable_persistent(e)
+            return {}
+        return {row.cache_key: {"score": row.score, "label": row.label, "confidence": row.confidence}
+                for row in rows}
+
+    def _store(self, rows: List[Dict], version: str):
+        """Upsert rows; a recomputed (e.g. expired) row starts over"""
+        now = datetime.utcnow()
+        for row in rows:
+            row.update(version=version, now=now)
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(text(
+                    "INSERT INTO sentiment_cache (cache_key, version, normalized_text, score, label, confidence, "
+                    "hit_count, created_at, last_used_at) "
+                    "VALUES (:cache_key, :version, :normalized_text, :score, :label, :confidence, 0, :now, :now) "
+                    "ON CONFLICT (cache_key) DO UPDATE SET score = excluded.score, label = excluded.label, "
+                    "confidence = excluded.confidence, hit_count = 0, created_at = excluded.created_at, "
+                    "last_used_at = excluded.last_used_at"
+                ), rows)
+        except Exception as e:
+            self._disable_persistent(e)
+
+    def _maybe_flush_hits(self, force: bool = False):
+        """Write accumulated hit counters (API calls saved) and last use times"""
+        with self._lock:
+            if not self._pending_hits or (not force and time.monotonic() - self._flushed_at < HIT_FLUSH_INTERVAL):
+                return
+            pending, self._pending_hits = self._pending_hits, {}
+            self._flushed_at = time.monotonic()
+
+        if not self._persistent:
+            return
+        now = datetime.utcnow()
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(text(
+                    "UPDATE sentiment_cache SET hit_count = hit_count + :hits, last_used_at = :now "
+                    "WHERE cache_key = :cache_key"
+                ), [{"cache_key": key, "hits": hits, "now": now} for key, hits in pending.items()])
+        except Exception as e:
+            logger.warning(f"Could not record sentiment cache hits: {e}")
+
+    def _maybe_evict(self, version: str):
+        if time.monotonic() - self._evicted_at >= EVICTION_INTERVAL:
+            self.evict(version)
+
+    def evict(self, version: Optional[str] = None) -> int:
+        """
+        Delete expired rows and rows of versions other than version (if
+        given), then trim the table to max_entries by the eviction policy
+        """
+        self._evicted_at = time.monotonic()
+        if not self._persistent:
+            return 0
+
+        self._maybe_flush_hits(force=True)
+        order = _EVICTION_ORDER.get(EVICTION, _EVICTION_ORDER["lru"])
+        deleted = 0
+        try:
+            with self.engine.begin() as connection:
+                if TTL_DAYS:
+                    deleted += connection.execute(
+                        text("DELETE FROM sentiment_cache WHERE created_at < :expires"),
+                        {"expires": datetime.utcnow() - timedelta(days=TTL_DAYS)}
+                    ).rowcount
+                if version is not None:
+                    deleted += connection.execute(
+                        text("DELETE FROM sentiment_cache WHERE version <> :version"), {"version": version}
+                    ).rowcount
+                if MAX_ENTRIES:
+                    excess = connection.execute(text("SELECT count(*) FROM sentiment_cache")).scalar() - MAX_ENTRIES
+                    if excess > 0:
+                        deleted += connection.execute(text(
+                            "DELETE FROM sentiment_cache WHERE cache_key IN ("
+                            f"SELECT cache_key FROM sentiment_cache ORDER BY {order} LIMIT :excess)"
+                        ), {"excess": excess}).rowcount
+        except Exception as e:
+            logger.warning(f"Sentiment cache eviction failed: {e}")
+            return 0
+
+        with self._lock:
+            self.counters["evicted"] += deleted
+        if deleted:
+            logger.info(f"Evicted {deleted} sentiment cache entries")
+        return deleted
+
+    def flush(self):
+        """Write pending hit counters (on shutdown)"""
+        self._maybe_flush_hits(force=True)
+
+    def process_stats(self) -> Dict:
+        """Lookups, hits and hit rate of this process (no database access)"""
+        with self._lock:
+            counters = dict(self.counters)
+            memory_entries = len(self._memory)
+        hits = counters["memory_hits"] + counters["db_hits"]
+        return dict(
+            counters,
+            hits=hits,
+            hit_rate=round(hits / counters["lookups"], 4) if counters["lookups"] else None,
+            api_calls_saved=hits,
+            memory_entries=memory_entries
+        )
+
+    def stats(self) -> Dict:
+        """Hit rate and API calls saved by this process, and totals of the table"""
+        result = {
+            "enabled": self.enabled,
+            "process": self.process_stats(),
+            "config": {
+                "max_text_length": MAX_TEXT_LENGTH,
+                "memory_max_entries": MEMORY_MAX_ENTRIES,
+                "memory_ttl": MEMORY_TTL,
+                "ttl_days": TTL_DAYS,
+                "max_entries": MAX_ENTRIES,
+                "eviction": EVICTION
+            }
+        }
+
+        if self._persistent:
+            self._maybe_flush_hits(force=True)
+            try:
+                with self.engine.connect() as connection:
+                    row = connection.execute(text(
+                        "SELECT count(*) AS entries, coalesce(sum(hit_count), 0) AS hits, "
+                        "min(created_at) AS oldest FROM sentiment_cache"
+                    )).one()
+                # hit_count counts every process, so this is the all-time saving
+                result["table"] = {
+                    "entries": row.entries,
+                    "api_calls_saved": int(row.hits),
+                    "oldest_entry": row.oldest.isoformat() if row.oldest else None
+                }
+            except Exception as e:
+                result["table"] = {"error": str(e)}
+        return result
+
+
+sentiment_cache = SentimentCache()
@@ -0,0 +1,322 @@
+"""
+Sentiment pipeline instrumentation
+
+SentimentAnalyzer records every OpenRouter call into a SentimentMetrics:
+latency histograms (request time, and time spent waiting for the
+concurrency and rate limits), HTTP status counts, parse failures and the
+token usage the API reports. The worker publishes snapshots of the
+metrics, its tier counts and queue stats to Redis after every cycle, and
+every backfill run or shard of analyze_sentiment_batch.py publishes its own
+after every page and at the end; the /api/sentiment-metrics and
+/api/sentiment-pipeline-status routes read the latest snapshots and add the
+backlog from the database.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import redis
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {}).get("metrics", {})
+# Thresholds above which /api/sentiment-pipeline-status reports "degraded"
+MAX_ERROR_RATE = _config.get("max_error_rate", 0.2)
+MAX_BACKLOG_AGE_HOURS = _config.get("max_backlog_age_hours", 24)
+
+SNAPSHOT_KEY = "sentiment:metrics"
+# Followed by the run (checkpoint digest of the backfill scope)
+BACKFILL_KEY_PREFIX = "sentiment:metrics:backfill:"
+# A snapshot older than this means the worker (or the backfill run) is not running
+SNAPSHOT_TTL = 600
+
+# Upper bounds of the latency buckets, seconds (the last bucket is unbounded)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        index = next((index for index, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the quantile (None without observations)"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> Dict:
+        """JSON-safe view: a quantile in the unbounded bucket is reported as +Inf"""
+        def json_bound(value):
+            return "+Inf" if value == float("inf") else value
+
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 3),
+            "avg_ms": round(self.total * 1000 / self.count, 1) if self.count else None,
+            "p50_le_seconds": json_bound(self.quantile(0.5)),
+            "p95_le_seconds": json_bound(self.quantile(0.95)),
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1]
+            },
+        }
+
+
+class SentimentMetrics:
+    """Counters of the OpenRouter calls of one analyzer"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.calls = {"single": 0, "batch": 0}
+        self.latency = {"single": LatencyHistogram(), "batch": LatencyHistogram()}
+        self.limit_wait = LatencyHistogram()
+        # HTTP status code (or "timeout" / "connection_error") -> requests
+        self.statuses: Dict[str, int] = {}
+        self.retries = 0
+        self.parse_failures = {"single": 0, "batch_items": 0}
+        self.tokens = {"prompt": 0, "completion": 0, "total": 0}
+        self._lock = threading.Lock()
+
+    def record_request(self, kind: str, status, seconds: Optional[float], usage: Optional[Dict] = None):
+        """One HTTP attempt: status code or error name, request time, reported usage"""
+        with self._lock:
+            status = str(status)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if seconds is not None:
+                self.latency[kind].observe(seconds)
+            for name in self.tokens:
+                self.tokens[name] += int((usage or {}).get(f"{name}_tokens") or 0)
+
+    def record_call(self, kind: str, retries: int):
+        """One logical call, however many attempts it took"""
+        with self._lock:
+            self.calls[kind] += 1
+            self.retries += retries
+
+    def record_limit_wait(self, seconds: float):
+        with self._lock:
+            self.limit_wait.observe(seconds)
+
+    def record_parse_failure(self, kind: str, count: int = 1):
+        with self._lock:
+            self.parse_failures[kind] += count
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "since": self.started,
+                "calls": dict(self.calls),
+                "retries": self.retries,
+                "statuses": dict(self.statuses),
+                "parse_failures": dict(self.parse_failures),
+                "tokens": dict(self.tokens),
+                "latency": {kind: histogram.snapshot() for kind, histogram in self.latency.items()},
+                "limit_wait": self.limit_wait.snapshot(),
+            }
+
+
+def tier_rates(tier_counts: Dict) -> Dict:
+    """Shares of the messages answered by the rules, the local model and the cache"""
+    total = sum(tier_counts.values())
+    return {
+        f"{tier}_hit_rate": round(tier_counts.get(tier, 0) / total, 4) if total else None
+        for tier in ("rules", "model", "cache")
+    }
+
+
+def _redis_client():
+    return redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), socket_timeout=2,
+                          socket_connect_timeout=2, decode_responses=True)
+
+
+async def publish_snapshot(client, snapshot: Dict):
+    """Store the worker's snapshot (aioredis client of the worker), best effort"""
+    try:
+        await client.set(SNAPSHOT_KEY, json.dumps({**snapshot, "published_at": time.time()}), ex=SNAPSHOT_TTL)
+    except Exception as e:
+        logger.warning(f"Could not publish sentiment metrics: {e}")
+
+
+def publish_backfill_snapshot(run: str, snapshot: Dict):
+    """Store the snapshot of a backfill run (analyze_sentiment_batch.py, no event loop), best effort"""
+    try:
+        _redis_client().set(BACKFILL_KEY_PREFIX + run, json.dumps({**snapshot, "published_at": time.time()}),
+                            ex=SNAPSHOT_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish sentiment backfill metrics: {e}")
+
+
+def load_backfill_snapshots() -> Dict[str, Dict]:
+    """Snapshots of the backfill runs published in the last SNAPSHOT_TTL seconds, by run"""
+    try:
+        client = _redis_client()
+        keys = sorted(client.scan_iter(match=BACKFILL_KEY_PREFIX + "*"))
+        values = client.mget(keys) if keys else []
+    except redis.RedisError as e:
+        logger.warning(f"Could not read sentiment backfill metrics: {e}")
+        return {}
+    return {key[len(BACKFILL_KEY_PREFIX):]: json.loads(value) for key, value in zip(keys, values) if value}
+
+
+def load_snapshot() -> Optional[Dict]:
+    """Latest worker snapshot, None if there is none (or Redis is down)"""
+    try:
+        value = _redis_client().get(SNAPSHOT_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read sentiment metrics: {e}")
+        return None
+    return json.loads(value) if value else None
+
+
+def _summed(counters) -> Dict:
+    """Counter dicts added up key by key"""
+    total: Dict = {}
+    for counter in counters:
+        for key, count in counter.items():
+            total[key] = total.get(key, 0) + count
+    return total
+
+
+def pipeline_status(snapshot: Optional[Dict], backlog: Dict, now: Optional[float] = None,
+                    backfill: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Compact status for the admin UI: worker health, LLM calls, hit rates, backlog
+
+    The LLM counters and hit rates add up the worker's snapshot and those of
+    the running backfill runs (load_backfill_snapshots); "stale" still means
+    the worker is not publishing.
+    """
+    now = now or time.time()
+    backfill = backfill or {}
+    backlog_age = backlog.get("oldest_age_seconds")
+    backlog_old = backlog_age is not None and backlog_age > MAX_BACKLOG_AGE_HOURS * 3600
+    if not snapshot and not backfill:
+        return {"status": "stale", "snapshot_age_seconds": None, "llm": None, "rates": None, "backlog": backlog}
+
+    snapshots = ([snapshot] if snapshot else []) + list(backfill.values())
+    metrics = [item.get("metrics", {}) for item in snapshots]
+    statuses = _summed(item.get("statuses", {}) for item in metrics)
+    attempts = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if status != "200")
+    error_rate = round(errors / attempts, 4) if attempts else None
+    p95 = [histogram["p95_le_seconds"] for item in metrics for histogram in item.get("latency", {}).values()
+           if histogram.get("p95_le_seconds") is not None]
+    slowest = "+Inf" if "+Inf" in p95 else max(p95, default=None)
+
+    degraded = backlog_old or (error_rate is not None and error_rate > MAX_ERROR_RATE)
+    if not snapshot:
+        status = "stale"
+    else:
+        status = "degraded" if degraded else "ok"
+    return {
+        "status": status,
+        "snapshot_age_seconds": round(now - snapshot.get("published_at", now)) if snapshot else None,
+        "llm": {
+            "calls": sum(sum(item.get("calls", {}).values()) for item in metrics),
+            "attempts": attempts,
+            "error_rate": error_rate,
+            "p95_le_seconds": slowest,
+            "parse_failures": sum(sum(item.get("parse_failures", {}).values()) for item in metrics),
+            "tokens": sum(item.get("tokens", {}).get("total", 0) for item in metrics),
+        },
+        "rates": tier_rates(_summed(item.get("tiers", {}) for item in snapshots)),
+        "backfill": {
+            run: {**item.get("run", {}), "snapshot_age_seconds": round(now - item.get("published_at", now))}
+            for run, item in backfill.items()
+        },
+        "backlog": backlog,
+    }
+
+
+def prometheus_lines(snapshot: Dict, backlog: Dict, backfill: Optional[Dict[str, Dict]] = None) -> List[str]:
+    """
+    Snapshots in the Prometheus text exposition format
+
+    Every sample is labeled with its process: "worker", or "backfill:<run>"
+    for the backfill runs, so the counters of each stay monotonic.
+    """
+    lines = []
+    processes = ([("worker", snapshot)] if snapshot else []) + [
+        (f"backfill:{run}", item) for run, item in sorted((backfill or {}).items())
+    ]
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    def per_process(samples_of):
+        return [({"process": process, **labels}, value)
+                for process, item in processes for labels, value in samples_of(item.get("metrics", {}), item)]
+
+    metric("sentiment_api_calls_total", "counter", "Logical OpenRouter calls", per_process(
+        lambda metrics, _: [({"kind": kind}, count) for kind, count in metrics.get("calls", {}).items()]))
+    metric("sentiment_api_retries_total", "counter", "Retried OpenRouter attempts", per_process(
+        lambda metrics, _: [({}, metrics.get("retries", 0))]))
+    metric("sentiment_api_responses_total", "counter", "OpenRouter attempts by HTTP status or error", per_process(
+        lambda metrics, _: [({"status": status}, count) for status, count in metrics.get("statuses", {}).items()]))
+    metric("sentiment_parse_failures_total", "counter", "Responses that could not be parsed", per_process(
+        lambda metrics, _: [({"kind": kind}, count) for kind, count in metrics.get("parse_failures", {}).items()]))
+    metric("sentiment_tokens_total", "counter", "Tokens reported by OpenRouter", per_process(
+        lambda metrics, _: [({"type": kind}, count) for kind, count in metrics.get("tokens", {}).items()]))
+    metric("sentiment_messages_total", "counter", "Messages by the tier that answered them", per_process(
+        lambda _, item: [({"tier": tier}, count) for tier, count in item.get("tiers", {}).items()]))
+
+    histograms = []
+    for process, item in processes:
+        metrics = item.get("metrics", {})
+        histograms += [("sentiment_api_latency_seconds", "OpenRouter request time", histogram,
+                        {"process": process, "kind": kind})
+                       for kind, histogram in metrics.get("latency", {}).items()]
+        if "limit_wait" in metrics:
+            histograms.append(("sentiment_limit_wait_seconds", "Wait for the concurrency and rate limits",
+                               metrics["limit_wait"], {"process": process}))
+    # Samples of one metric must be consecutive (the sort keeps the process order)
+    histograms.sort(key=lambda histogram: histogram[0])
+    described = set()
+    for name, help_text, histogram, labels in histograms:
+        # HELP and TYPE once per metric, before all of its label sets
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            label_text = ",".join(f'{key}="{value}"' for key, value in {**labels, "le": bound}.items())
+            lines.append(f"{name}_bucket{{{label_text}}} {cumulative}")
+        label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+        suffix = f"{{{label_text}}}" if label_text else ""
+        lines.append(f"{name}_sum{suffix} {histogram['sum_seconds']}")
+        lines.append(f"{name}_count{suffix} {histogram['count']}")
+
+    metric("sentiment_backlog_messages", "gauge", "Unprocessed client messages",
+           [({}, backlog.get("messages", 0))])
+    metric("sentiment_backlog_oldest_age_seconds", "gauge", "Age of the oldest unprocessed client message",
+           [({}, backlog.get("oldest_age_seconds") or 0)])
+    return lines
@@ -0,0 +1,257 @@
+"""
+Local sentiment model
+
+Multinomial logistic regression over hashed features (word unigrams and
+bigrams, character 3-5-grams inside words), trained from messages the LLM
+has already labeled (train_sentiment_model.py). Pure Python, no extra
+dependencies; with numpy installed, batch inference is vectorized.
+
+performance.sentiment.local_model.mode decides how SentimentAnalyzer uses
+it:
+- fallback: only for messages the LLM could not analyze (no API key,
+  OpenRouter down, retries exhausted), for predictions at least
+  min_confidence confident; with an API key these results are provisional
+  and the messages stay queued for the LLM;
+- primary: before the cache and the LLM, for predictions at least
+  min_confidence confident; the rest still goes to the LLM;
+- off.
+"""
+
+import gzip
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+from config_manager import ConfigManager
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {}).get("local_model", {})
+MODEL_MODE = _config.get("mode", "fallback")
+MODEL_PATH = _config.get("path", "data/sentiment_model.json.gz")
+if not os.path.isabs(MODEL_PATH):
+    MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), MODEL_PATH)
+MODEL_MIN_CONFIDENCE = _config.get("min_confidence", 0.75)
+# Seconds between checks of the model file for a retrained version
+RELOAD_INTERVAL = 60
+
+CLASSES = ("positive", "neutral", "negative")
+DEFAULT_BUCKETS = 2 ** 18
+
+_WORD = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _tokens(text: str) -> List[str]:
+    normalized = (text or "").lower().replace("ё", "е")
+    words = _WORD.findall(normalized)
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+    for word in words:
+        if len(word) < 3:
+            continue
+        padded = f" {word} "
+        for size in (3, 4, 5):
+            features += [f"c:{padded[start:start + size]}" for start in range(len(padded) - size + 1)]
+    return features
+
+
+class HashedNgramModel:
+    """Softmax regression over hashed n-gram features"""
+
+    def __init__(self, buckets: int = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # bucket -> weights per class; only buckets seen in training are stored
+        self.weights: Dict[int, List[float]] = {}
+        self.bias = [0.0] * len(CLASSES)
+        self.metadata: Dict = {}
+        self._matrix = None
+
+    def features(self, text: str) -> List[int]:
+        """Distinct hashed feature buckets of text"""
+        return sorted({zlib.crc32(token.encode("utf-8")) % self.buckets for token in _tokens(text)})
+
+    def _logits(self, buckets: Sequence[int]) -> List[float]:
+        logits = list(self.bias)
+        if buckets:
+            scale = 1 / math.sqrt(len(buckets))
+            for bucket in buckets:
+                weights = self.weights.get(bucket)
+                if weights is not None:
+                    for index in range(len(CLASSES)):
+                        logits[index] += weights[index] * scale
+        return logits
+
+    @staticmethod
+    def _softmax(logits: Sequence[float]) -> List[float]:
+        top = max(logits)
+        exps = [math.exp(value - top) for value in logits]
+        total = sum(exps)
+        return [value / total for value in exps]
+
+    def train(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 8, learning_rate: float = 0.5,
+              l2: float = 1e-6, balanced: bool = True, seed: int = 42):
+        """AdaGrad SGD on the cross-entropy; balanced weighs classes by inverse frequency"""
+        examples = [(self.features(text), CLASSES.index(label)) for text, label in zip(texts, labels)]
+        counts = [sum(1 for _, target in examples if target == index) for index in range(len(CLASSES))]
+        class_weight = [
+            (len(examples) / (len(CLASSES) * count) if balanced else 1.0) if count else 0.0 for count in counts
+        ]
+
+        self.weights = {}
+        self.bias = [0.0] * len(CLASSES)
+        squared: Dict[int, List[float]] = {}
+        bias_squared = [1e-8] * len(CLASSES)
+        order = list(range(len(examples)))
+        rng = random.Random(seed)
+
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for position in order:
+                buckets, target = examples[position]
+                probabilities = self._softmax(self._logits(buckets))
+                weight = class_weight[target]
+                gradient = [(probability - (index == target)) * weight
+                            for index, probability in enumerate(probabilities)]
+                scale = 1 / math.sqrt(len(buckets)) if buckets else 0.0
+
+                for index in range(len(CLASSES)):
+                    bias_squared[index] += gradient[index] ** 2
+                    self.bias[index] -= learning_rate * gradient[index] / math.sqrt(bias_squared[index])
+                for bucket in buckets:
+                    weights = self.weights.setdefault(bucket, [0.0] * len(CLASSES))
+                    accumulated = squared.setdefault(bucket, [1e-8] * len(CLASSES))
+                    for index in range(len(CLASSES)):
+                        step = gradient[index] * scale + l2 * weights[index]
+                        accumulated[index] += step * step
+                        weights[index] -= learning_rate * step / math.sqrt(accumulated[index])
+
+        self.metadata = {
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "examples": len(examples),
+            "class_counts": dict(zip(CLASSES, counts)),
+            "epochs": epochs,
+            "buckets": self.buckets,
+        }
+        self._matrix = None
+        return self
+
+    def _result(self, probabilities: Sequence[float]) -> Dict:
+        best = max(range(len(CLASSES)), key=lambda index: probabilities[index])
+        score = probabilities[CLASSES.index("positive")] - probabilities[CLASSES.index("negative")]
+        return {
+            "score": round(float(score), 4),
+            "label": CLASSES[best],
+            "confidence": round(float(probabilities[best]), 4)
+        }
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        """Result per text (score = P(positive) - P(negative), confidence = top probability)"""
+        if numpy is not None and len(texts) > 1:
+            return self._predict_numpy(texts)
+        return [self._result(self._softmax(self._logits(self.features(text)))) for text in texts]
+
+    def _predict_numpy(self, texts: Sequence[str]) -> List[Dict]:
+        if self._matrix is None:
+            matrix = numpy.zeros((self.buckets, len(CLASSES)), dtype=numpy.float32)
+            if self.weights:
+                keys = numpy.fromiter(self.weights.keys(), dtype=numpy.int64, count=len(self.weights))
+                matrix[keys] = numpy.array(list(self.weights.values()), dtype=numpy.float32)
+            self._matrix = matrix
+
+        features = [self.features(text) for text in texts]
+        lengths = numpy.array([len(buckets) for buckets in features], dtype=numpy.int64)
+        flat = numpy.fromiter((bucket for buckets in features for bucket in buckets), dtype=numpy.int64,
+                              count=int(lengths.sum()))
+        # Sum of weight rows per text: cumulative sums at the text boundaries
+        cumulative = numpy.vstack([numpy.zeros((1, len(CLASSES)), dtype=numpy.float64),
+                                   numpy.cumsum(self._matrix[flat], axis=0, dtype=numpy.float64)])
+        ends = numpy.cumsum(lengths)
+        sums = cumulative[ends] - cumulative[ends - lengths]
+        logits = sums / numpy.sqrt(numpy.maximum(lengths, 1))[:, None] + numpy.array(self.bias)
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = numpy.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return [self._result(row) for row in probabilities.tolist()]
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = {
+            "classes": CLASSES,
+            "buckets": self.buckets,
+            "bias": self.bias,
+            "metadata": self.metadata,
+            # Rounded: the file stays small and predictions do not change
+            "weights": {str(bucket): [round(value, 5) for value in weights]
+                        for bucket, weights in self.weights.items() if any(abs(value) > 1e-5 for value in weights)},
+        }
+        temporary = f"{path}.tmp"
+        with gzip.open(temporary, "wt", encoding="utf-8") as file:
+            json.dump(payload, file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramModel":
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            payload = json.load(file)
+        if tuple(payload["classes"]) != CLASSES:
+            raise ValueError(f"Unexpected classes in {path}: {payload['classes']}")
+        model = cls(payload["buckets"])
+        model.bias = payload["bias"]
+        model.metadata = payload.get("metadata", {})
+        model.weights = {int(bucket): weights for bucket, weights in payload["weights"].items()}
+        return model
+
+
+class LocalModelLoader:
+    """The trained model of MODEL_PATH, reloaded when the file is replaced"""
+
+    def __init__(self, path: str = MODEL_PATH):
+        self.path = path
+        self._model: Optional[HashedNgramModel] = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[HashedNgramModel]:
+        if MODEL_MODE == "off":
+            return None
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_INTERVAL:
+            return self._model
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                if not self._warned:
+                    logger.info(f"Local sentiment model {self.path} not found, run train_sentiment_model.py")
+                    self._warned = True
+                return self._model
+            if mtime != self._mtime:
+                try:
+                    self._model = HashedNgramModel.load(self.path)
+                    self._mtime = mtime
+                    logger.info(f"Loaded local sentiment model {self.path} "
+                                f"({len(self._model.weights)} features, trained {self._model.metadata.get('trained_at')})")
+                except Exception as e:
+                    logger.error(f"Could not load local sentiment model {self.path}: {e}")
+        return self._model
+
+
+local_model = LocalModelLoader()
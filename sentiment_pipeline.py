@@ -0,0 +1,238 @@
+"""
+Sentiment analysis pipeline
+
+Rate limiting and retries for OpenRouter calls, and a queue that feeds
+messages to SentimentAnalyzer.analyze_batch from a fixed number of
+concurrent workers.
+
+- RateLimiter: token buckets for requests and tokens per minute, shared by
+  every call of one analyzer; a 429 pauses all callers until Retry-After.
+- retry_delay: exponential backoff with full jitter, or Retry-After when the
+  server sent one.
+- SentimentPipeline: items whose analysis failed go back to the queue (up
+  to max_attempts) instead of being reported as processed. It is the only
+  retry layer of its calls: each API request is made once, so the worst
+  case per item is max_attempts requests, not max_attempts * max_retries.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {})
+CONCURRENCY = _config.get("concurrency", 4)
+REQUESTS_PER_MINUTE = _config.get("requests_per_minute", 60)
+TOKENS_PER_MINUTE = _config.get("tokens_per_minute", 100000)
+# Seconds of quota that may be spent at once
+BURST_SECONDS = _config.get("burst_seconds", 60)
+MAX_RETRIES = _config.get("max_retries", 4)
+BACKOFF_BASE = _config.get("backoff_base", 1.0)
+BACKOFF_MAX = _config.get("backoff_max", 60)
+MAX_ATTEMPTS = _config.get("max_attempts", 5)
+
+
+class TokenBucket:
+    """Token bucket refilled at rate_per_minute, holding at most burst_seconds of tokens"""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until amount tokens are available and take them (waiters are served in order)"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """Take (or give back, if negative) tokens after the fact; the balance may go below zero"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits (0 disables a limit)"""
+
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE, burst_seconds: float = BURST_SECONDS):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        self._paused_until = 0.0
+
+    async def acquire(self, tokens: int):
+        """Wait for a request slot and the estimated tokens of the request"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens:
+            await self.tokens.acquire(tokens)
+
+    def record_usage(self, estimated: int, actual: Optional[int]):
+        """Correct the token bucket with the usage reported by the API"""
+        if self.tokens and actual is not None:
+            self.tokens.adjust(actual - estimated)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for seconds (after a 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before retry number attempt (0-based)"""
+    if retry_after is not None:
+        # A little jitter so paused callers do not all retry at once
+        return min(retry_after, BACKOFF_MAX) + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def is_retryable_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+class SentimentPipeline:
+    """
+    Analyze (key, text) items with a bounded number of concurrent batches
+
+    on_results(list of (key, result)) is called for every analyzed batch.
+    Items that fail are queued again after a backoff; after max_attempts
+    they get the local model's result if the analyzer has one
+    (analyzer.fallback_batch). run() returns the keys left without a final
+    result: those without one, those with a provisional fallback result
+    (stored by on_results, but to be analyzed again) and those of batches
+    on_results failed to store.
+    """
+
+    def __init__(self, analyzer, concurrency: int = CONCURRENCY, max_attempts: int = MAX_ATTEMPTS,
+                 batch_size: Optional[int] = None):
+        self.analyzer = analyzer
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.batch_size = batch_size or analyzer.batch_size
+        self.stats = {"analyzed": 0, "retried": 0, "fallback": 0, "failed": 0, "batches": 0}
+
+    async def run(self, items: Iterable[Tuple[Hashable, str]],
+                  on_results: Callable[[List[Tuple[Hashable, Dict]]], None]) -> List[Hashable]:
+        items = list(items)
+        # Without an API key only the local tiers and the cache answer: retrying cannot help
+        max_attempts = self.max_attempts if self.analyzer.api_key else 1
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for key, text in items:
+            queue.put_nowait((key, text, 0))
+        failed: List[Hashable] = []
+        delayed = set()
+
+        async def requeue(item, delay):
+            # The item stays unfinished while it waits, so join() keeps waiting too
+            await asyncio.sleep(delay)
+            queue.put_nowait(item)
+            queue.task_done()
+
+        async def worker():
+            while True:
+                batch = [await queue.get()]
+                while len(batch) < self.batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                try:
+                    results = await self.analyzer.analyze_batch([text for _, text, _ in batch], retries=0)
+                except Exception as e:
+                    logger.error(f"Error analyzing sentiment batch: {e}")
+                    results = [None] * len(batch)
+                self.stats["batches"] += 1
+
+                done = []
+                exhausted = []
+                finished = 0
+                for (key, text, attempts), result in zip(batch, results):
+                    if result:
+                        done.append((key, result))
+                    elif attempts + 1 < max_attempts:
+                        task = asyncio.create_task(requeue((key, text, attempts + 1), retry_delay(attempts)))
+                        delayed.add(task)
+                        task.add_done_callback(delayed.discard)
+                        self.stats["retried"] += 1
+                        continue
+                    else:
+                        exhausted.append((key, text))
+                    finished += 1
+
+                if exhausted:
+                    fallback = self.analyzer.fallback_batch([text for _, text in exhausted])
+                    given_up = 0
+                    for (key, _), result in zip(exhausted, fallback):
+                        if result:
+                            done.append((key, result))
+                            self.stats["fallback"] += 1
+                            if result.get("provisional"):
+                                failed.append(key)
+                        else:
+                            failed.append(key)
+                            given_up += 1
+                    self.stats["failed"] += given_up
+                    self.analyzer.record_failed(given_up)
+
+                if done:
+                    final = [key for key, result in done if not result.get("provisional")]
+                    try:
+                        on_results(done)
+                        self.stats["analyzed"] += len(final)
+                    except Exception as e:
+                        # Not stored: the caller leaves them unprocessed like the other failures
+                        logger.error(f"Error storing sentiment results: {e}")
+                        failed.extend(final)
+                        self.stats["failed"] += len(final)
+                for _ in range(finished):
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers + list(delayed):
+                task.cancel()
+            await asyncio.gather(*workers, *delayed, return_exceptions=True)
+
+        return failed
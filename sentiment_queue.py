@@ -0,0 +1,112 @@
+"""
+Prioritized sentiment work queue
+
+Each worker cycle takes unprocessed client messages in priority order:
+1. attention - messages of the last recent_hours in chats currently flagged
+   for attention;
+2. recent - other messages of the last recent_hours;
+3. backlog - older messages, newest first.
+backlog_share of every cycle is kept for the backlog, so it keeps draining
+while recent traffic fills the rest. Team messages are not analyzed. The
+queries are backed by the partial index idx_messages_sentiment_queue
+(migrations/009_sentiment_queue_index.sql).
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import desc, func
+
+from config_manager import ConfigManager
+from models import Message
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {}).get("queue", {})
+# Messages taken per cycle (0 = batch_size * concurrency: one batched call per concurrent worker)
+CYCLE_SIZE = _config.get("cycle_size", 0)
+RECENT_HOURS = _config.get("recent_hours", 24)
+BACKLOG_SHARE = _config.get("backlog_share", 0.1)
+# Seconds between cycles once the queue is drained; a full cycle is followed by the next at once
+INTERVAL = _config.get("interval", 60)
+
+PRIORITIES = ("attention", "recent", "backlog")
+
+
+def _pending():
+    """Filter of the partial index: unprocessed client messages with text"""
+    return [
+        Message.processed_for_sentiment == False,
+        Message.is_team_member == False,
+        Message.text.isnot(None),
+        Message.text != ""
+    ]
+
+
+def fetch_prioritized(session, limit: int, attention_chat_ids: Iterable[int],
+                      now: Optional[datetime] = None) -> List[Tuple[str, Message]]:
+    """Up to limit (priority, message) pairs, highest priority first"""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=RECENT_HOURS)
+    attention_chat_ids = list(attention_chat_ids)
+    reserved = min(limit, int(limit * BACKLOG_SHARE))
+    taken: List[Tuple[str, Message]] = []
+
+    def take(priority, conditions, count):
+        if count <= 0:
+            return
+        messages = session.query(Message).filter(*_pending(), *conditions).order_by(
+            desc(Message.timestamp)
+        ).limit(count).all()
+        taken.extend((priority, message) for message in messages)
+
+    if attention_chat_ids:
+        take("attention", [Message.timestamp >= cutoff, Message.chat_id.in_(attention_chat_ids)],
+             limit - reserved)
+    recent = [Message.timestamp >= cutoff]
+    if attention_chat_ids:
+        recent.append(Message.chat_id.notin_(attention_chat_ids))
+    take("recent", recent, limit - reserved - len(taken))
+    # The reserved share, plus whatever the recent messages left
+    take("backlog", [Message.timestamp < cutoff], limit - len(taken))
+    return taken
+
+
+def backlog_stats(session, now: Optional[datetime] = None) -> Dict:
+    """Unprocessed client messages and the age of the oldest one"""
+    now = now or datetime.utcnow()
+    count, oldest = session.query(func.count(Message.id), func.min(Message.timestamp)).filter(*_pending()).one()
+    return {
+        "messages": count,
+        "oldest_age_seconds": round((now - oldest).total_seconds()) if oldest else None
+    }
+
+
+class QueueStats:
+    """Per-priority counters since the worker started"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = {priority: {"analyzed": 0, "failed": 0, "age_seconds": 0.0} for priority in PRIORITIES}
+
+    def record(self, priority: str, analyzed: int, failed: int, age_seconds: float = 0.0):
+        """age_seconds: summed time from the analyzed messages to their analysis"""
+        counts = self.counts[priority]
+        counts["analyzed"] += analyzed
+        counts["failed"] += failed
+        counts["age_seconds"] += age_seconds
+
+    def summary(self) -> Dict:
+        """Analyzed and failed messages, throughput and average wait per priority"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            priority: {
+                "analyzed": counts["analyzed"],
+                "failed": counts["failed"],
+                "per_minute": round(counts["analyzed"] * 60 / elapsed, 2),
+                "avg_wait_seconds": round(counts["age_seconds"] / counts["analyzed"], 1) if counts["analyzed"] else None
+            }
+            for priority, counts in self.counts.items()
+        }
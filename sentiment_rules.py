@@ -0,0 +1,161 @@
+"""
+Rule-based sentiment pre-classifier
+
+A local tier in front of the LLM for messages that need no model: emoji
+and emoticons only, numbers, links, and short acknowledgements, greetings
+and thanks built entirely from a small Russian/English lexicon. It answers
+only when a rule is confident (confidence >= min_confidence); anything with
+a question, a negation, mixed polarity or unknown words goes to the LLM.
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_config = ConfigManager().get_performance_config().get("sentiment", {}).get("rules", {})
+RULES_ENABLED = _config.get("enabled", True)
+MAX_WORDS = _config.get("max_words", 6)
+MIN_CONFIDENCE = _config.get("min_confidence", 0.7)
+
+POSITIVE_EMOJI = set("👍👌🙏😊🙂😀😃😄😁😆😍🥰😘☺💪🔥👏🤝✅😉🤗🎉🥳😎💯✨⭐🌟💖💗💕💙💚💛🧡💜🤩😇🆗")
+POSITIVE_EMOJI |= {"❤", "♥"}
+NEGATIVE_EMOJI = set("👎😡😠🤬😢😭😞😔😟😩😫💩❌🙁☹😤😒🤦😕😣😖😰😱🤯💔⛔🚫😑")
+NEUTRAL_EMOJI = set("🤔😐😶👀⏳⌛🕐📎📌📞📝👋")
+# Variation selectors, skin tones, zero-width joiner
+_EMOJI_MODIFIERS = re.compile("[︎️‍\U0001F3FB-\U0001F3FF]")
+
+POSITIVE_EMOTICONS = (":)", ":-)", ":d", ":-d", "xd", ";)", ";-)", "=)", ")", "<3")
+NEGATIVE_EMOTICONS = (":(", ":-(", "(", ":'(", "=(")
+
+POSITIVE_WORDS = {
+    "спасибо", "спс", "пасиб", "пасибо", "благодарю", "благодарим", "мерси", "отлично", "отличный",
+    "отличная", "супер", "класс", "классно", "круто", "здорово", "прекрасно", "замечательно",
+    "шикарно", "великолепно", "молодцы", "молодец", "ура", "рад", "рады", "довольна", "доволен",
+    "thanks", "thank", "thx", "great", "perfect", "awesome", "excellent", "nice", "cool", "amazing",
+}
+NEGATIVE_WORDS = {
+    "ужас", "ужасно", "кошмар", "плохо", "отвратительно", "безобразие", "позор", "недоволен",
+    "недовольна", "разочарован", "разочарована", "возмутительно", "отстой",
+    "bad", "terrible", "awful", "horrible", "disappointed",
+}
+NEUTRAL_WORDS = {
+    "ок", "окей", "ok", "okay", "k", "да", "ага", "угу", "понял", "поняла", "поняли", "понятно",
+    "принято", "принял", "приняла", "ясно", "хорошо", "ладно", "договорились", "жду", "ждем", "ждём",
+    "добрый", "доброе", "день", "утро", "утра", "вечер", "ночи", "здравствуйте", "здравствуй", "привет",
+    "приветствую", "всем", "коллеги", "hello", "hi", "hey", "morning", "afternoon", "evening",
+    "yes", "sure", "got", "it", "noted",
+    # Intensifiers and fillers of acknowledgements ("спасибо вам большое", "thank you very much")
+    "вам", "тебе", "вас", "большое", "огромное", "очень", "все", "всё", "ну", "тоже", "и", "за",
+    "you", "very", "much", "so", "a", "lot", "all",
+}
+NEGATIONS = {"не", "ни", "нет", "никак", "not", "no", "don't", "dont", "doesn't", "never"}
+
+_WORD = re.compile(r"[a-zа-я']+")
+_NUMBERS_ONLY = re.compile(r"^[\d\s+\-().,:;/#№%*=]+$")
+_URL = re.compile(r"https?://\S+|www\.\S+|t\.me/\S+")
+
+
+def _emoji_polarity(text: str) -> Tuple[float, int, str]:
+    """(polarity sum, number of emoji/emoticons, text without them)"""
+    polarity = 0.0
+    count = 0
+    rest = []
+    for char in _EMOJI_MODIFIERS.sub("", text):
+        if char in POSITIVE_EMOJI:
+            polarity += 1
+            count += 1
+        elif char in NEGATIVE_EMOJI:
+            polarity -= 1
+            count += 1
+        elif char in NEUTRAL_EMOJI or unicodedata.category(char) == "So":
+            count += 1
+        else:
+            rest.append(char)
+    rest = "".join(rest)
+
+    # Emoticons: ":)", "))))", ":(" - the longest runs first
+    for emoticon in sorted(POSITIVE_EMOTICONS + NEGATIVE_EMOTICONS, key=len, reverse=True):
+        while emoticon in rest:
+            sign = 1 if emoticon in POSITIVE_EMOTICONS else -1
+            if len(emoticon) == 1:
+                # A run of brackets counts once
+                run = re.search(re.escape(emoticon) + "+", rest)
+                rest = rest[:run.start()] + " " + rest[run.end():]
+            else:
+                rest = rest.replace(emoticon, " ", 1)
+            polarity += sign
+            count += 1
+    return polarity, count, rest
+
+
+def _result(score: float, confidence: float) -> Dict:
+    if score > 0.1:
+        label = "positive"
+    elif score < -0.1:
+        label = "negative"
+    else:
+        label = "neutral"
+    return {"score": round(max(-1.0, min(1.0, score)), 3), "label": label, "confidence": confidence}
+
+
+def match_rule(text: Optional[str]) -> Optional[Tuple[str, Dict]]:
+    """(rule name, result) of the first rule that applies, None if the text needs the LLM"""
+    stripped = (text or "").strip()
+    if not stripped:
+        return "empty", _result(0.0, 1.0)
+
+    lowered = stripped.lower().replace("ё", "е")
+    if _URL.search(lowered) and _URL.sub("", lowered).strip(" \n\t.,;:") == "":
+        return "link", _result(0.0, 0.9)
+    if _NUMBERS_ONLY.match(lowered) and any(char.isdigit() for char in lowered):
+        return "numbers", _result(0.0, 0.9)
+
+    polarity, emoji_count, rest = _emoji_polarity(lowered)
+    if "?" in rest:
+        return None
+
+    words = _WORD.findall(rest)
+    leftover = _WORD.sub("", rest)
+    if any(char.isalnum() for char in leftover):
+        # Digits or other scripts mixed into words
+        return None
+
+    if not words:
+        if emoji_count == 0:
+            # Punctuation only ("!", "...", "+")
+            return "punctuation", _result(0.0, 0.8)
+        if polarity == 0:
+            return "emoji", _result(0.0, 0.6)
+        sign = 1 if polarity > 0 else -1
+        return "emoji", _result(sign * min(0.9, 0.4 + 0.2 * min(abs(polarity), 3)), 0.8)
+
+    if len(words) > MAX_WORDS or any(word in NEGATIONS for word in words):
+        return None
+    if any(word not in POSITIVE_WORDS and word not in NEGATIVE_WORDS and word not in NEUTRAL_WORDS
+           for word in words):
+        return None
+
+    positive = sum(word in POSITIVE_WORDS for word in words) + max(polarity, 0)
+    negative = sum(word in NEGATIVE_WORDS for word in words) + max(-polarity, 0)
+    if positive and negative:
+        return None
+    if positive:
+        return "lexicon", _result(min(0.9, 0.5 + 0.15 * (positive - 1)), 0.8)
+    if negative:
+        return "lexicon", _result(-min(0.9, 0.5 + 0.15 * (negative - 1)), 0.8)
+    return "lexicon", _result(0.0, 0.85)
+
+
+def classify(text: Optional[str]) -> Optional[Dict]:
+    """Local result if a rule is confident enough, else None"""
+    if not RULES_ENABLED:
+        return None
+    matched = match_rule(text)
+    if matched is None or matched[1]["confidence"] < MIN_CONFIDENCE:
+        return None
+    return dict(matched[1])
@@ -9,14 +9,29 @@ class FilteredDashboard {
             end_date: ''
         };
         this.charts = {};
+        // Trend data delivered by the last dashboard bundle, consumed by the trend charts
+        this.bundledTrends = {};
+        // General statistics currently shown, updated in place by live events
+        this.generalStats = null;
+        this.liveSource = null;
+        this.liveConnectedOnce = false;
+        // Messages whose live sentiment result was already added to generalStats
+        this.liveSentimentIds = new Set();
+        // Periodic refresh while the live stream is unavailable
+        this.livePollTimer = null;
+        // Delta sync: cursor of the last bundle and the data it was applied to
+        this.deltaCursor = null;
+        this.deltaFiltersKey = null;
+        this.dashboardState = null;
+        this.trendState = {};
         this.init();
     }
 
     init() {
         this.setupEventListeners();
-        this.loadFilterOptions();
         this.setDefaultDates();
-        this.loadDashboardData();
+        this.loadDashboardData(true);
+        this.connectLiveEvents();
     }
 
     setupEventListeners() {
@@ -157,7 +172,7 @@ class FilteredDashboard {
         }
     }
 
-    async loadDashboardData() {
+    async loadDashboardData(includeFilterOptions = false) {
         try {
             // Build query string
             const params = new URLSearchParams();
@@ -167,7 +182,22 @@ class FilteredDashboard {
                 }
             });
 
-            const response = await fetch(`/api/filtered-dashboard-data?${params}`, {
+            // One round-trip for all sections of the overview
+            const sections = ['dashboard', 'sentiment_trend', 'response_time_trend'];
+            if (includeFilterOptions) {
+                sections.unshift('filter_options');
+            }
+            params.append('sections', sections.join(','));
+            params.append('days', 7);
+
+            // Ask only for what changed while the filters stay the same
+            const filtersKey = params.toString().replace(/(^|&)sections=[^&]*/, '');
+            const delta = this.deltaCursor && this.deltaFiltersKey === filtersKey && !includeFilterOptions;
+            if (delta) {
+                params.append('since', this.deltaCursor);
+            }
+
+            const response = await fetch(`/api/dashboard-bundle?${params}`, {
                 headers: this.getAuthHeaders()
             });
 
@@ -175,13 +205,33 @@ class FilteredDashboard {
                 throw new Error('Ошибка загрузки данных');
             }
 
-            const data = await response.json();
+            const bundle = await response.json();
             console.log('Loading dashboard data with filters:', this.currentFilters);
-            console.log('Request URL:', `/api/filtered-dashboard-data?${params}`);
-            console.log('Auth headers:', this.getAuthHeaders());
-            console.log('Response status:', response.status);
-            console.log('Received data:', data);
-            this.updateDashboard(data);
+            console.log('Received bundle:', bundle);
+
+            if (bundle.errors && Object.keys(bundle.errors).length > 0) {
+                console.error('Dashboard bundle section errors:', bundle.errors);
+            }
+
+            if (bundle.filter_options) {
+                this.populateFilterOptions(bundle.filter_options);
+            } else if (includeFilterOptions) {
+                this.loadFilterOptions();
+            }
+
+            this.bundledTrends = {
+                sentiment: this.mergeTrendDelta('sentiment', bundle.sentiment_trend),
+                responseTime: this.mergeTrendDelta('responseTime', bundle.response_time_trend)
+            };
+
+            if (!bundle.dashboard) {
+                this.deltaCursor = null;
+                throw new Error('Ошибка загрузки данных');
+            }
+
+            this.updateDashboard(this.mergeDashboardDelta(bundle.dashboard));
+            this.deltaCursor = bundle.cursor || null;
+            this.deltaFiltersKey = filtersKey;
             this.updateLastUpdated();
 
         } catch (error) {
@@ -190,6 +240,57 @@ class FilteredDashboard {
         }
     }
 
+    mergeDashboardDelta(data) {
+        // Full responses replace the state; deltas replace only the changed clients and employees
+        if (!data.changed || !this.dashboardState) {
+            this.dashboardState = data;
+            return data;
+        }
+
+        const changedClients = new Set(data.changed.clients || []);
+        const changedEmployees = new Set(data.changed.employees || []);
+
+        const clients = this.dashboardState.clients
+            .filter(client => !changedClients.has(client.chat_id))
+            .concat(data.clients || [])
+            .sort((a, b) => b.communication_intensity - a.communication_intensity);
+        const employees = this.dashboardState.employees
+            .filter(employee => !changedEmployees.has(employee.user_id))
+            .concat(data.employees || [])
+            .sort((a, b) => b.message_count - a.message_count);
+
+        this.dashboardState = { ...data, clients, employees };
+        return this.dashboardState;
+    }
+
+    mergeTrendDelta(name, trend) {
+        // Trend deltas carry only the changed days; the rest come from the previous response
+        if (!trend || !trend.changed_dates || !this.trendState[name]) {
+            this.trendState[name] = trend || null;
+            return trend;
+        }
+
+        const byDate = new Map();
+        const previous = this.trendState[name];
+        (previous.dates || []).forEach((date, index) => {
+            if (date >= trend.start_date && !trend.changed_dates.includes(date)) {
+                byDate.set(date, [previous.labels[index], previous.data[index]]);
+            }
+        });
+        trend.dates.forEach((date, index) => byDate.set(date, [trend.labels[index], trend.data[index]]));
+
+        const dates = [...byDate.keys()].sort();
+        const merged = {
+            ...trend,
+            dates,
+            labels: dates.map(date => byDate.get(date)[0]),
+            data: dates.map(date => byDate.get(date)[1])
+        };
+        delete merged.changed_dates;
+        this.trendState[name] = merged;
+        return merged;
+    }
+
     updateDashboard(data) {
         // Update general statistics
         this.updateGeneralStats(data.general_stats);
@@ -225,6 +326,8 @@ class FilteredDashboard {
     }
 
     updateGeneralStats(stats) {
+        this.generalStats = Object.assign({}, stats);
+
         // Update statistics cards for new design
         const elements = {
             'totalMessages': stats.total_messages || 0,
@@ -260,6 +363,189 @@ class FilteredDashboard {
         }
     }
 
+    // Live updates (Server-Sent Events from /api/live)
+
+    connectLiveEvents() {
+        if (!window.EventSource) {
+            this.startLivePolling();
+            return;
+        }
+
+        const token = this.getAdminToken();
+        const source = new EventSource(token ? `/api/live?token=${encodeURIComponent(token)}` : '/api/live');
+        this.liveSource = source;
+
+        source.addEventListener('ready', () => {
+            // Events may have been missed while disconnected: resync once after a reconnect
+            if (this.liveConnectedOnce) {
+                this.loadDashboardData();
+            }
+            this.liveConnectedOnce = true;
+            this.stopLivePolling();
+        });
+
+        source.addEventListener('message', (e) => this.applyLiveMessage(JSON.parse(e.data)));
+        source.addEventListener('sentiment', (e) => this.applyLiveSentiment(JSON.parse(e.data)));
+        source.addEventListener('sla_breach', (e) => this.applyLiveSlaBreach(JSON.parse(e.data)));
+        source.addEventListener('attention', (e) => this.applyLiveAttention(JSON.parse(e.data)));
+
+        source.onerror = () => {
+            // The browser reconnects by itself unless the server refused the stream (401/503);
+            // until a stream is back the dashboard is refreshed by polling
+            if (source.readyState === EventSource.CLOSED) {
+                this.startLivePolling();
+                setTimeout(() => this.connectLiveEvents(), 30000);
+            }
+        };
+    }
+
+    startLivePolling() {
+        if (!this.livePollTimer) {
+            this.livePollTimer = setInterval(() => this.loadDashboardData(), 60000);
+        }
+    }
+
+    stopLivePolling() {
+        if (this.livePollTimer) {
+            clearInterval(this.livePollTimer);
+            this.livePollTimer = null;
+        }
+    }
+
+    liveEventMatchesFilters(event) {
+        if (!this.generalStats) {
+            return false;
+        }
+
+        if (this.currentFilters.chat_id && String(event.chat_id) !== String(this.currentFilters.chat_id)) {
+            return false;
+        }
+
+        // Live events belong to today: ignore them when the selected period ended earlier
+        if (this.currentFilters.end_date) {
+            const today = new Date().toLocaleDateString('en-CA', { timeZone: 'Europe/Moscow' });
+            if (this.currentFilters.end_date < today) {
+                return false;
+            }
+        }
+
+        return true;
+    }
+
+    liveTimestampInPeriod(timestamp) {
+        if (!timestamp) {
+            return false;
+        }
+
+        // Timestamps are UTC, the period is in Moscow dates (last 7 days without filters)
+        const day = new Date(timestamp + 'Z').toLocaleDateString('en-CA', { timeZone: 'Europe/Moscow' });
+        let start = this.currentFilters.start_date;
+        if (!start) {
+            start = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000)
+                .toLocaleDateString('en-CA', { timeZone: 'Europe/Moscow' });
+        }
+        const end = this.currentFilters.end_date;
+        return day >= start && (!end || day <= end);
+    }
+
+    applyLiveMessage(event) {
+        if (!this.liveEventMatchesFilters(event)) {
+            return;
+        }
+        if (this.currentFilters.employee_id && String(event.user_id) !== String(this.currentFilters.employee_id)) {
+            return;
+        }
+
+        const stats = this.generalStats;
+        stats.total_messages = (stats.total_messages || 0) + 1;
+        if (event.is_team_member) {
+            stats.team_messages = (stats.team_messages || 0) + 1;
+        } else {
+            stats.client_messages = (stats.client_messages || 0) + 1;
+        }
+        stats.total_symbols = (stats.total_symbols || 0) + (event.length || 0);
+
+        this.updateGeneralStats(stats);
+        this.updateLastUpdated();
+    }
+
+    applyLiveSentiment(event) {
+        // Average sentiment covers client messages only, so it cannot change under an employee filter
+        if (this.currentFilters.employee_id) {
+            return;
+        }
+
+        const stats = this.generalStats;
+        let changed = false;
+        (event.results || []).forEach(result => {
+            if (result.is_team_member || result.score === null || !this.liveEventMatchesFilters(result)) {
+                return;
+            }
+            // Backlog messages may belong to another period; a message is averaged in once
+            if (!this.liveTimestampInPeriod(result.timestamp) || this.liveSentimentIds.has(result.message_id)) {
+                return;
+            }
+            this.liveSentimentIds.add(result.message_id);
+            const count = stats.sentiment_messages || 0;
+            stats.avg_sentiment_score = ((stats.avg_sentiment_score || 0) * count + result.score) / (count + 1);
+            stats.sentiment_messages = count + 1;
+            changed = true;
+        });
+
+        if (changed) {
+            this.updateGeneralStats(stats);
+            this.updateLastUpdated();
+        }
+    }
+
+    applyLiveSlaBreach(event) {
+        const minutes = Math.round(event.response_time_seconds / 60);
+        this.showLiveNotice(`Превышено время ответа в чате ${this.chatTitle(event.chat_id)}: ${this.formatTime(minutes)}`, 'warning');
+
+        if (!this.liveEventMatchesFilters(event)) {
+            return;
+        }
+        const stats = this.generalStats;
+        if (minutes > (stats.max_response_time_minutes || 0)) {
+            stats.max_response_time_minutes = minutes;
+            this.updateGeneralStats(stats);
+        }
+    }
+
+    applyLiveAttention(event) {
+        const title = event.chat_title || this.chatTitle(event.chat_id);
+        if (event.needs_attention) {
+            const reasons = (event.reasons || []).join('; ');
+            this.showLiveNotice(`Чат «${title}» требует внимания${reasons ? ': ' + reasons : ''}`, 'danger');
+        } else {
+            this.showLiveNotice(`Чат «${title}» больше не требует внимания`, 'success');
+        }
+    }
+
+    chatTitle(chatId) {
+        const option = document.querySelector(`#chatFilter option[value="${chatId}"]`);
+        return option ? option.textContent : chatId;
+    }
+
+    showLiveNotice(text, level = 'info') {
+        let container = document.getElementById('liveNotices');
+        if (!container) {
+            container = document.createElement('div');
+            container.id = 'liveNotices';
+            container.style.cssText = 'position:fixed;right:16px;bottom:16px;z-index:1000;max-width:360px;';
+            document.body.appendChild(container);
+        }
+
+        const colors = { danger: '#dc2626', warning: '#d97706', success: '#16a34a', info: '#2563eb' };
+        const notice = document.createElement('div');
+        notice.style.cssText = `background:#fff;border-left:4px solid ${colors[level] || colors.info};` +
+            'box-shadow:0 4px 12px rgba(0,0,0,.15);border-radius:8px;padding:10px 14px;margin-top:8px;font-size:14px;';
+        notice.textContent = text;
+        container.appendChild(notice);
+
+        setTimeout(() => notice.remove(), 8000);
+    }
+
     updateEmployeesTab(employees) {
         try {
             console.log('Updating employees tab with data:', employees);
@@ -1246,6 +1532,12 @@ class FilteredDashboard {
     }
 
     async loadSentimentTrendData() {
+        if (this.bundledTrends.sentiment) {
+            const bundled = this.bundledTrends.sentiment;
+            this.bundledTrends.sentiment = null;
+            return bundled;
+        }
+
         try {
             console.log('Loading sentiment trend data with token:', this.adminToken);
             const response = await fetch('/api/sentiment-trend?days=7', {
@@ -1270,6 +1562,12 @@ class FilteredDashboard {
     }
 
     async loadResponseTimeTrendData() {
+        if (this.bundledTrends.responseTime) {
+            const bundled = this.bundledTrends.responseTime;
+            this.bundledTrends.responseTime = null;
+            return bundled;
+        }
+
         try {
             console.log('Loading response time trend data with token:', this.adminToken);
             const response = await fetch('/api/response-time-trend?days=7', {
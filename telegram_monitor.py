@@ -12,6 +12,8 @@ from aiogram.types import Message
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
+from live_events import publish_new_message
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -95,6 +97,8 @@ async def handle_message(message: Message):
             
             session.commit()
             
+            publish_new_message(message.chat.id, user_id, is_team_member, message.text, message.date)
+            
             role = "команды" if is_team_member else "клиента"
             logger.info(f"Сохранено сообщение от {role}: {full_name}")
             
@@ -10,6 +10,7 @@ from datetime import datetime
 from app import app, db
 from models import Chat, Message
 from config_manager import ConfigManager
+from live_events import publish_new_message
 
 logger = logging.getLogger(__name__)
 
@@ -115,6 +116,8 @@ class TelegramUpdater:
                     db.session.add(message_obj)
                     db.session.commit()
                     
+                    publish_new_message(chat_id, user_id, is_team_member, text, timestamp)
+                    
                     member_type = "команды" if is_team_member else "клиента"
                     logger.info(f"Новое сообщение от {member_type}: {full_name}")
                     return True
@@ -7,6 +7,7 @@ from datetime import datetime
 import psycopg2
 from flask import request, jsonify
 from app import app
+from live_events import publish_new_message
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +64,8 @@ def save_telegram_message(message_data):
         conn.commit()
         conn.close()
         
+        publish_new_message(chat_id, user_id, is_team_member, text, timestamp)
+        
         logger.info(f"Message saved: {full_name} ({'team' if is_team_member else 'client'}) in {chat_title}")
         return True
         
@@ -64,6 +64,7 @@ async def test_client_messages():
         
         logger.info("-" * 40)
     
+    await analyzer.close()
     logger.info("\n✅ Анализ завершен!")
 
 if __name__ == "__main__":
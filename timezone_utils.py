@@ -1,68 +1,190 @@
 """
 Utilities for timezone handling
+
+Timestamps are stored as naive UTC. Reports are bucketed by the agency's
+local time, agency.timezone in config.yaml (Europe/Moscow by default); the
+moscow_* names are kept as aliases of the local_* functions.
+
+Bulk conversions go through an offset transition table (bisect over the
+zone's UTC transition instants) instead of localizing every datetime with
+pytz, and SQL bucketing uses local_timestamp()/local_date(), which match the
+expression index of migrations/002_message_local_date.sql.
 """
+import logging
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, List
+
 import pytz
-from datetime import datetime, timedelta
+from sqlalchemy import func
+
+from config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'Europe/Moscow'
 
-# Moscow timezone
-MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+def _configured_timezone():
+    """Agency timezone from config.yaml, Moscow if missing or unknown"""
+    name = ConfigManager().get_agency_timezone() or DEFAULT_TIMEZONE
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        logger.error(f"Unknown agency timezone {name!r}, using {DEFAULT_TIMEZONE}")
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+LOCAL_TZ = _configured_timezone()
+LOCAL_TZ_NAME = LOCAL_TZ.zone
 UTC_TZ = pytz.utc
 
-def utc_to_moscow(utc_dt):
-    """Convert UTC datetime to Moscow timezone"""
+# Kept for existing callers; it is the configured zone, not necessarily Moscow
+MOSCOW_TZ = LOCAL_TZ
+
+
+class OffsetTable:
+    """
+    UTC offsets of a timezone indexed by their UTC transition instants
+
+    Converting a naive UTC datetime is a bisect plus an addition; for sorted
+    input the current interval is reused until the next transition, so a
+    whole result set is converted without per-row pytz work.
+    """
+
+    def __init__(self, tz):
+        transitions = getattr(tz, '_utc_transition_times', None)
+        if transitions:
+            self.transitions = list(transitions)
+            self.offsets = [info[0] for info in tz._transition_info]
+        else:
+            self.transitions = [datetime.min]
+            self.offsets = [tz.utcoffset(datetime(2000, 1, 1))]
+
+    def offset_at(self, utc_dt: datetime) -> timedelta:
+        """UTC offset in effect at a naive UTC datetime"""
+        index = bisect_right(self.transitions, utc_dt) - 1
+        return self.offsets[max(index, 0)]
+
+    def to_local(self, utc_dt: datetime) -> datetime:
+        """Naive local datetime for a naive UTC datetime"""
+        return utc_dt + self.offset_at(utc_dt)
+
+    def iter_local(self, utc_dts: Iterable[datetime]) -> Iterator[datetime]:
+        """Naive local datetimes for naive UTC datetimes (fastest on sorted input)"""
+        transitions = self.transitions
+        lower = upper = None
+        offset = None
+        for utc_dt in utc_dts:
+            if offset is None or not (lower <= utc_dt < upper):
+                index = max(bisect_right(transitions, utc_dt) - 1, 0)
+                offset = self.offsets[index]
+                lower = transitions[index] if index > 0 else datetime.min
+                upper = transitions[index + 1] if index + 1 < len(transitions) else datetime.max
+            yield utc_dt + offset
+
+
+LOCAL_OFFSETS = OffsetTable(LOCAL_TZ)
+
+
+def _naive_utc(utc_dt):
+    """Drop tzinfo after converting aware datetimes to UTC"""
+    if utc_dt.tzinfo is not None:
+        utc_dt = utc_dt.astimezone(UTC_TZ).replace(tzinfo=None)
+    return utc_dt
+
+
+def to_local_naive(utc_dt):
+    """Naive local datetime for a (naive UTC or aware) datetime"""
+    if utc_dt is None:
+        return None
+    return LOCAL_OFFSETS.to_local(_naive_utc(utc_dt))
+
+
+def to_local_naive_many(utc_dts: Iterable[datetime]) -> List[datetime]:
+    """Naive local datetimes for many naive UTC datetimes"""
+    return list(LOCAL_OFFSETS.iter_local(utc_dts))
+
+
+def local_day_key(utc_dt) -> date:
+    """Local calendar day of a UTC datetime (key of daily rollups)"""
+    return to_local_naive(utc_dt).date()
+
+
+def local_timestamp(column):
+    """SQL expression: naive local time of a naive UTC timestamp column (PostgreSQL)"""
+    return func.timezone(LOCAL_TZ_NAME, func.timezone('UTC', column))
+
+
+def local_date(column):
+    """SQL expression: local calendar day of a naive UTC timestamp column (PostgreSQL)"""
+    return func.date(local_timestamp(column))
+
+
+def utc_to_local(utc_dt):
+    """Convert UTC datetime to the agency timezone"""
     if utc_dt is None:
         return None
-    
+
     if utc_dt.tzinfo is None:
         utc_dt = UTC_TZ.localize(utc_dt)
-    
-    return utc_dt.astimezone(MOSCOW_TZ)
 
-def moscow_to_utc(moscow_dt):
-    """Convert Moscow timezone datetime to UTC"""
-    if moscow_dt is None:
+    return utc_dt.astimezone(LOCAL_TZ)
+
+def local_to_utc(local_dt):
+    """Convert agency timezone datetime to UTC"""
+    if local_dt is None:
         return None
-    
-    if moscow_dt.tzinfo is None:
-        moscow_dt = MOSCOW_TZ.localize(moscow_dt)
-    
-    return moscow_dt.astimezone(UTC_TZ)
-
-def moscow_date_to_utc_range(start_date_str, end_date_str=None):
-    """Convert Moscow date string(s) to UTC datetime range"""
+
+    if local_dt.tzinfo is None:
+        local_dt = LOCAL_TZ.localize(local_dt)
+
+    return local_dt.astimezone(UTC_TZ)
+
+def local_date_to_utc_range(start_date_str, end_date_str=None):
+    """Convert agency-local date string(s) to UTC datetime range"""
     if end_date_str is None:
         end_date_str = start_date_str
-    
+
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-    
-    # Start of start_date in Moscow
-    moscow_start = MOSCOW_TZ.localize(start_date.replace(hour=0, minute=0, second=0, microsecond=0))
-    # End of end_date in Moscow
-    moscow_end = MOSCOW_TZ.localize(end_date.replace(hour=23, minute=59, second=59, microsecond=999999))
-    
+
+    # Start of start_date in local time
+    local_start = LOCAL_TZ.localize(start_date.replace(hour=0, minute=0, second=0, microsecond=0))
+    # End of end_date in local time
+    local_end = LOCAL_TZ.localize(end_date.replace(hour=23, minute=59, second=59, microsecond=999999))
+
     # Convert to UTC
-    utc_start = moscow_start.astimezone(UTC_TZ)
-    utc_end = moscow_end.astimezone(UTC_TZ)
-    
+    utc_start = local_start.astimezone(UTC_TZ)
+    utc_end = local_end.astimezone(UTC_TZ)
+
     return utc_start, utc_end
 
-def get_moscow_now():
-    """Get current datetime in Moscow timezone"""
-    return datetime.now(MOSCOW_TZ)
+def get_local_now():
+    """Get current datetime in the agency timezone"""
+    return datetime.now(LOCAL_TZ)
 
-def format_moscow_datetime(utc_dt, format_str='%d.%m.%Y %H:%M'):
-    """Format UTC datetime as Moscow timezone string"""
+def format_local_datetime(utc_dt, format_str='%d.%m.%Y %H:%M'):
+    """Format UTC datetime as agency timezone string"""
     if utc_dt is None:
         return None
-    
-    moscow_dt = utc_to_moscow(utc_dt)
-    return moscow_dt.strftime(format_str)
 
-def format_moscow_date(utc_dt):
-    """Format UTC datetime as Moscow date string"""
-    return format_moscow_datetime(utc_dt, '%Y-%m-%d')
+    local_dt = utc_to_local(utc_dt)
+    return local_dt.strftime(format_str)
+
+def format_local_date(utc_dt):
+    """Format UTC datetime as agency timezone date string"""
+    return format_local_datetime(utc_dt, '%Y-%m-%d')
+
+def format_configured_time(utc_dt, format_str='%d.%m.%Y %H:%M'):
+    """Format UTC datetime in the configured timezone (alias for format_local_datetime)"""
+    return format_local_datetime(utc_dt, format_str)
+
 
-def format_configured_time(utc_dt):
-    """Format UTC datetime as Moscow timezone string (alias for format_moscow_datetime)"""
-    return format_moscow_datetime(utc_dt)
\ No newline at end of file
+# Moscow-named aliases of the functions above
+utc_to_moscow = utc_to_local
+moscow_to_utc = local_to_utc
+moscow_date_to_utc_range = local_date_to_utc_range
+get_moscow_now = get_local_now
+format_moscow_datetime = format_local_datetime
+format_moscow_date = format_local_date
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Обучение локальной модели тональности на разметке LLM
+
+Берет из базы сообщения, тональность которых определил LLM
+(sentiment_source = 'llm' или NULL - проанализированные до миграции 008),
+кроме оценок целых серий сообщений (sentiment_burst_id),
+без сообщений, которые и так берут локальные правила, и без повторов
+текста. Сообщения с id % --holdout == 0 откладываются для проверки: по ним
+печатаются точность, macro-F1, точность/полнота по классам, матрица ошибок
+против меток LLM и скорость пакетного предсказания. Модель сохраняется в
+performance.sentiment.local_model.path, где ее подхватывают worker и
+analyze_sentiment_batch.py (перечитывается после замены файла).
+
+Пример:
+    DATABASE_URL=... python train_sentiment_model.py
+    DATABASE_URL=... python train_sentiment_model.py --evaluate-only
+    DATABASE_URL=... python train_sentiment_model.py --no-save --epochs 12
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+from evaluate_sentiment import DEFAULT_SET, LABELS, load_set, print_confusion, share
+
+
+def load_labeled(engine, limit):
+    """[(id, text, label)] размеченных LLM сообщений, новые первыми, без повторов текста"""
+    from sentiment_cache import normalize_text
+    from sentiment_rules import classify
+
+    query = text("""
+        SELECT id, text, sentiment_label FROM messages
+        WHERE sentiment_label IN ('positive', 'neutral', 'negative')
+          AND (sentiment_source = 'llm' OR sentiment_source IS NULL)
+          AND sentiment_burst_id IS NULL
+          AND text IS NOT NULL AND text <> ''
+        ORDER BY id DESC
+        LIMIT :limit
+    """)
+    with engine.connect() as connection:
+        rows = connection.execute(query, {"limit": limit}).all()
+
+    seen = set()
+    examples = []
+    for message_id, message_text, label in rows:
+        normalized = normalize_text(message_text)
+        # Короткие сообщения и то, что берут правила, до модели не доходят
+        if normalized in seen or len(message_text.strip()) < 3 or classify(message_text) is not None:
+            continue
+        seen.add(normalized)
+        examples.append((message_id, message_text, label))
+    return examples
+
+
+def report(model, texts, labels, title):
+    """Метрики модели против меток"""
+    predicted = [result['label'] for result in model.predict(texts)]
+    correct = sum(gold == label for gold, label in zip(labels, predicted))
+    print(f"\n{title}: {len(texts)} сообщений, точность {share(correct, len(texts))}")
+
+    f1_scores = []
+    print(f"{'класс':<12}{'сообщений':>10}{'точность':>10}{'полнота':>10}{'F1':>8}")
+    for label in LABELS:
+        true_positive = sum(gold == label and guess == label for gold, guess in zip(labels, predicted))
+        guessed = sum(guess == label for guess in predicted)
+        actual = sum(gold == label for gold in labels)
+        precision = true_positive / guessed if guessed else 0.0
+        recall = true_positive / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        f1_scores.append(f1)
+        print(f"{label:<12}{actual:>10}{precision:>10.1%}{recall:>10.1%}{f1:>8.3f}")
+    print(f"macro-F1: {sum(f1_scores) / len(f1_scores):.3f}")
+    print_confusion(list(zip(labels, predicted)), "Метка / предсказание модели")
+
+
+def throughput(model, texts, minimum=20000):
+    """Сообщений в секунду при пакетном предсказании"""
+    sample = (texts * (minimum // max(1, len(texts)) + 1))[:minimum]
+    model.predict(sample[:100])
+    started = time.perf_counter()
+    for start in range(0, len(sample), 1000):
+        model.predict(sample[start:start + 1000])
+    return len(sample) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обучение локальной модели тональности на разметке LLM")
+    parser.add_argument('--limit', type=int, default=200000, help="Максимум сообщений из базы (новые первыми)")
+    parser.add_argument('--holdout', type=int, default=10, help="Отложить сообщения с id %% N == 0")
+    parser.add_argument('--epochs', type=int, default=8, help="Эпох обучения")
+    parser.add_argument('--no-balance', action='store_true', help="Не выравнивать веса классов")
+    parser.add_argument('--evaluate-only', action='store_true', help="Только проверить сохраненную модель")
+    parser.add_argument('--no-save', action='store_true', help="Не сохранять модель")
+    parser.add_argument('--eval-set', nargs='?', const=DEFAULT_SET,
+                        help="Проверить и на размеченном вручную наборе (JSON Lines)")
+    args = parser.parse_args()
+
+    from sentiment_model import MODEL_PATH, HashedNgramModel, numpy
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("Ошибка: DATABASE_URL не найден в переменных окружения")
+        sys.exit(1)
+
+    examples = load_labeled(create_engine(database_url), args.limit)
+    train = [(message_text, label) for message_id, message_text, label in examples if message_id % args.holdout]
+    held_out = [(message_text, label) for message_id, message_text, label in examples
+                if message_id % args.holdout == 0]
+    print(f"Размеченных LLM сообщений: {len(examples)} (обучение {len(train)}, проверка {len(held_out)})")
+
+    if args.evaluate_only:
+        if not os.path.exists(MODEL_PATH):
+            print(f"Ошибка: модель {MODEL_PATH} не найдена")
+            sys.exit(1)
+        model = HashedNgramModel.load(MODEL_PATH)
+        print(f"Модель {MODEL_PATH}, обучена {model.metadata.get('trained_at')}")
+    else:
+        if not train:
+            print("Ошибка: нет сообщений для обучения")
+            sys.exit(1)
+        started = time.perf_counter()
+        model = HashedNgramModel().train([item[0] for item in train], [item[1] for item in train],
+                                         epochs=args.epochs, balanced=not args.no_balance)
+        print(f"Обучение: {time.perf_counter() - started:.1f} с, признаков {len(model.weights)}")
+
+    if held_out:
+        report(model, [item[0] for item in held_out], [item[1] for item in held_out], "Отложенные сообщения")
+        speed = throughput(model, [item[0] for item in held_out])
+        print(f"\nСкорость: {speed:,.0f} сообщений/с ({'numpy' if numpy is not None else 'без numpy'})")
+
+    if args.eval_set:
+        labeled = load_set(args.eval_set)
+        report(model, [item[0] for item in labeled], [item[1] for item in labeled], "Ручная разметка")
+
+    if not args.evaluate_only and not args.no_save:
+        model.metadata["holdout"] = len(held_out)
+        model.save(MODEL_PATH)
+        print(f"\nМодель сохранена: {MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
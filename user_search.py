@@ -0,0 +1,79 @@
+"""
+User lookup for autocomplete
+
+Searches the users dimension table (models.User) by user_id, username or
+full name. Prefix matches are served by lower(...) text_pattern_ops indexes,
+substring matches by pg_trgm GIN indexes (migrations/005_users.sql); prefix
+matches rank first, then the most active users.
+"""
+
+from typing import Dict, List
+
+from sqlalchemy import case, func, or_
+
+from models import TeamMember, User
+
+
+def _escape_like(text: str) -> str:
+    """Escape LIKE wildcards in user input"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_users(session, query: str, limit: int = 10, exclude_team: bool = False) -> List[Dict]:
+    """
+    Find users whose username or full name contains the query
+
+    Args:
+        session: SQLAlchemy session
+        query: Text typed by the user (a leading @ is ignored); digits also match user_id
+        limit: Maximum number of users returned
+        exclude_team: Skip users who are active team members
+
+    Returns:
+        List of user dicts, best matches first
+    """
+    text = query.strip().lstrip('@')
+    if not text:
+        return []
+
+    pattern = _escape_like(text.lower())
+    prefix = f'{pattern}%'
+    contains = f'%{pattern}%'
+
+    username = func.lower(User.username)
+    full_name = func.lower(User.full_name)
+    conditions = [
+        username.like(prefix),
+        full_name.like(prefix),
+        User.username.ilike(contains),
+        User.full_name.ilike(contains),
+    ]
+    if text.isdigit():
+        conditions.append(User.user_id == int(text))
+
+    team_member = session.query(TeamMember.id).filter(
+        TeamMember.user_id == User.user_id,
+        TeamMember.is_active == True
+    ).exists()
+
+    prefix_match = or_(username.like(prefix), full_name.like(prefix), full_name.like(f'% {prefix}'))
+    users = session.query(User, team_member.label('is_team_member')).filter(or_(*conditions))
+    if exclude_team:
+        users = users.filter(~team_member)
+
+    rows = users.order_by(
+        case((prefix_match, 0), else_=1),
+        User.message_count.desc(),
+        User.user_id
+    ).limit(limit).all()
+
+    return [{
+        'user_id': user.user_id,
+        'username': user.username,
+        'full_name': user.full_name,
+        'message_count': user.message_count,
+        'client_message_count': user.client_message_count,
+        'first_seen_at': user.first_seen_at.isoformat() if user.first_seen_at else None,
+        'last_seen_at': user.last_seen_at.isoformat() if user.last_seen_at else None,
+        'is_team_member': bool(is_team_member)
+    } for user, is_team_member in rows]
@@ -9,6 +9,7 @@ from flask import request, jsonify
 from app import app, db
 from models import Chat, Message
 from config_manager import ConfigManager
+from live_events import publish_new_message
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +85,8 @@ class WebhookHandler:
             db.session.add(message_obj)
             db.session.commit()
             
+            publish_new_message(chat_id, user_id, is_team_member, text, timestamp)
+            
             member_type = "команды" if is_team_member else "клиента"
             logger.info(f"Webhook: Сохранено сообщение от {member_type}: {full_name}")
             
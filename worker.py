@@ -12,8 +12,15 @@ from sqlalchemy.orm import sessionmaker
 from app import db
 from models import Chat, Message, KpiLive, TeamMember
 from sentiment_analyzer import SentimentAnalyzer
+from sentiment_pipeline import SentimentPipeline
+from sentiment_bursts import BURSTS_ENABLED, burst_text, collect_bursts
+from sentiment_metrics import publish_snapshot
+from sentiment_queue import CYCLE_SIZE, INTERVAL as SENTIMENT_INTERVAL, QueueStats, fetch_prioritized
 from kpi_calculator import KpiCalculator
 from config_manager import ConfigManager
+from partition_manager import maintain_partitions, partitioning_config
+from live_events import (LIVE_CHANNEL, LIVE_EVENTS_ENABLED, encode_event, message_event,
+                         attention_event, sla_breach_event, sentiment_event)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +33,9 @@ class MessageWorker:
     def __init__(self):
         self.redis = None
         self.sentiment_analyzer = SentimentAnalyzer()
+        self.sentiment_stats = QueueStats()
+        # Chats flagged by the latest KPI calculation; their messages are analyzed first
+        self.attention_chat_ids = set()
         self.kpi_calculator = KpiCalculator()
         self.config = ConfigManager()
         
@@ -39,6 +49,16 @@ class MessageWorker:
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
         self.redis = aioredis.from_url(redis_url, decode_responses=True)
     
+    async def publish_live(self, event_type: str, data: Dict):
+        """Publish a live dashboard event (best effort)"""
+        if not LIVE_EVENTS_ENABLED or self.redis is None:
+            return
+        
+        try:
+            await self.redis.publish(LIVE_CHANNEL, encode_event(event_type, data))
+        except Exception as e:
+            logger.warning(f"Could not publish live event {event_type}: {e}")
+    
     async def start_worker(self):
         """Start the background worker"""
         await self.init_redis()
@@ -48,10 +68,23 @@ class MessageWorker:
         tasks = [
             self.process_messages(),
             self.calculate_kpis_periodically(),
-            self.update_sentiment_analysis()
+            self.update_sentiment_analysis(),
+            self.maintain_partitions_periodically()
         ]
         
-        await asyncio.gather(*tasks)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await self.close()
+    
+    async def close(self):
+        """Release the sentiment HTTP session and the Redis connection"""
+        await self.sentiment_analyzer.close()
+        if self.redis is not None:
+            try:
+                await self.redis.close()
+            except Exception as e:
+                logger.warning(f"Error closing Redis connection: {e}")
     
     async def process_messages(self):
         """Process messages from Redis queue"""
@@ -114,6 +147,10 @@ class MessageWorker:
                 
                 logger.info(f"Saved message {message_data['message_id']} from chat {message_data['chat_id']}")
                 
+                await self.publish_live("message", message_event(
+                    message.chat_id, message.user_id, message.is_team_member, message.text, message.timestamp
+                ))
+                
                 # Calculate response time if this is a team response
                 if message_data["is_team_member"]:
                     await self.calculate_response_time(session, message)
@@ -144,6 +181,13 @@ class MessageWorker:
                 session.commit()
                 
                 logger.debug(f"Calculated response time: {response_time} seconds for message {team_message.message_id}")
+                
+                # Notify open dashboards about responses over the SLA
+                max_response_time = self.config.get_kpi_thresholds().get("max_response_time", 7200)
+                if response_time > max_response_time:
+                    await self.publish_live("sla_breach", sla_breach_event(
+                        team_message.chat_id, int(response_time), max_response_time
+                    ))
         
         except Exception as e:
             logger.error(f"Error calculating response time: {e}")
@@ -185,6 +229,12 @@ class MessageWorker:
             kpis = self.kpi_calculator.calculate_chat_kpis(session, chat.id, start_time, end_time)
             
             if kpis:
+                # Attention flag of the previous calculation, to publish changes only
+                previous_kpi = session.query(KpiLive.needs_attention).filter(
+                    KpiLive.chat_id == chat.id
+                ).order_by(desc(KpiLive.calculated_at)).first()
+                was_flagged = bool(previous_kpi.needs_attention) if previous_kpi else False
+                
                 # Check if KPI record for this period already exists
                 existing_kpi = session.query(KpiLive).filter(
                     KpiLive.chat_id == chat.id,
@@ -208,6 +258,16 @@ class MessageWorker:
                     session.add(kpi_record)
                 
                 logger.debug(f"Calculated KPIs for chat {chat.id}")
+                
+                if kpis.get("needs_attention"):
+                    self.attention_chat_ids.add(chat.id)
+                else:
+                    self.attention_chat_ids.discard(chat.id)
+                
+                if bool(kpis.get("needs_attention")) != was_flagged:
+                    await self.publish_live("attention", attention_event(
+                        chat.id, chat.title, kpis.get("needs_attention"), kpis.get("attention_reasons")
+                    ))
         
         except Exception as e:
             logger.error(f"Error calculating KPIs for chat {chat.id}: {e}")
@@ -216,41 +276,127 @@ class MessageWorker:
         """Update sentiment analysis for messages that haven't been processed"""
         logger.info("Starting sentiment analysis updater...")
         
+        drained = True
         while True:
             try:
-                await asyncio.sleep(60)  # Check every minute
-                await self.process_sentiment_analysis()
+                if drained:
+                    await asyncio.sleep(SENTIMENT_INTERVAL)
+                # A full cycle means more is waiting: go on without sleeping
+                drained = not await self.process_sentiment_analysis()
             except Exception as e:
                 logger.error(f"Error in sentiment analysis: {e}")
-                await asyncio.sleep(60)
+                drained = True
+    
+    async def maintain_partitions_periodically(self):
+        """Create upcoming and detach expired messages partitions (no-op if unpartitioned)"""
+        interval = partitioning_config()["maintenance_interval"]
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            try:
+                # DDL waits for locks, keep it off the event loop
+                result = await loop.run_in_executor(None, maintain_partitions, self.engine)
+                if result["created"] or result["detached"]:
+                    logger.info(f"Partition maintenance: created {result['created']}, detached {result['detached']}")
+            except Exception as e:
+                logger.error(f"Error in partition maintenance: {e}")
+            await asyncio.sleep(interval)
     
-    async def process_sentiment_analysis(self):
-        """Process sentiment analysis for unprocessed messages"""
+    async def process_sentiment_analysis(self) -> bool:
+        """
+        Analyze one cycle of unprocessed client messages (sentiment_queue.py)
+        
+        Returns True if the cycle was full and analyzed without failures, i.e.
+        more messages are probably waiting and the API is keeping up.
+        """
         try:
             with self.SessionLocal() as session:
-                # Get unprocessed messages with text content
-                messages = session.query(Message).filter(
-                    Message.processed_for_sentiment == False,
-                    Message.text.isnot(None),
-                    Message.text != ""
-                ).limit(10).all()  # Process 10 messages at a time
+                pipeline = SentimentPipeline(self.sentiment_analyzer)
+                limit = CYCLE_SIZE or pipeline.batch_size * pipeline.concurrency
                 
-                for message in messages:
-                    sentiment_result = await self.sentiment_analyzer.analyze_sentiment(message.text)
-                    
-                    if sentiment_result:
-                        message.sentiment_score = sentiment_result.get("score")
-                        message.sentiment_label = sentiment_result.get("label")
-                        message.sentiment_confidence = sentiment_result.get("confidence")
-                    
-                    message.processed_for_sentiment = True
+                # Attention chats first, then recent messages, then the backlog,
+                # each newest first so messages that keep failing do not hold back new ones
+                prioritized = fetch_prioritized(session, limit, self.attention_chat_ids)
+                messages = [message for _, message in prioritized]
+                priority_of = {message.id: priority for priority, message in prioritized}
+                
+                if BURSTS_ENABLED:
+                    # One item per client burst, its result goes to every message of the burst
+                    members = dict(collect_bursts(session, messages))
+                    items = [(burst_id, burst_text(burst)) for burst_id, burst in members.items()]
+                else:
+                    members = {message.id: [message] for message in messages}
+                    items = [(message.id, message.text) for message in messages]
+                analyzed = []
+                provisional = []
                 
-                if messages:
+                def store(results):
+                    for key, sentiment_result in results:
+                        # Provisional fallback results are shown but the message stays queued for the LLM
+                        final = not sentiment_result.get("provisional")
+                        for message in members[key]:
+                            message.sentiment_score = sentiment_result.get("score")
+                            message.sentiment_label = sentiment_result.get("label")
+                            message.sentiment_confidence = sentiment_result.get("confidence")
+                            # A burst label belongs to the conversation, not to each message (not training data)
+                            message.sentiment_source = "burst" if BURSTS_ENABLED else sentiment_result.get("source")
+                            message.sentiment_burst_id = key if BURSTS_ENABLED else None
+                            message.processed_for_sentiment = final
+                            (analyzed if final else provisional).append(message)
+                
+                # Messages that still fail stay unprocessed and are retried next time
+                failed = await pipeline.run(items, store)
+                failed = [message.id for key in failed for message in members[key] if message.id in priority_of]
+                
+                if analyzed or provisional:
                     session.commit()
-                    logger.info(f"Processed sentiment analysis for {len(messages)} messages")
+                
+                now = datetime.utcnow()
+                for priority in self.sentiment_stats.counts:
+                    done = [message for message in analyzed if priority_of.get(message.id) == priority]
+                    self.sentiment_stats.record(
+                        priority, len(done),
+                        sum(1 for message_id in failed if priority_of[message_id] == priority),
+                        sum((now - message.timestamp).total_seconds() for message in done)
+                    )
+                
+                if analyzed:
+                    tiers = self.sentiment_analyzer.tier_counts
+                    logger.info(f"Processed sentiment analysis for {len(analyzed)} messages"
+                                + (f", {len(failed)} left for retry" if failed else "")
+                                + f" (since start: rules {tiers['rules']}, model {tiers['model']}, cache {tiers['cache']}, "
+                                  f"LLM {tiers['llm']}, fallback {tiers['fallback']}, failed {tiers['failed']})")
+                    logger.info("Sentiment queue since start: " + ", ".join(
+                        f"{priority} {stats['analyzed']} ({stats['per_minute']}/min, "
+                        f"avg wait {stats['avg_wait_seconds']} s)"
+                        for priority, stats in self.sentiment_stats.summary().items()
+                    ))
+                    
+                    # Only messages that had no final result yet: re-scored burst members
+                    # are already part of the dashboards' averages
+                    results = [{
+                        "message_id": message.id,
+                        "chat_id": message.chat_id,
+                        "is_team_member": message.is_team_member,
+                        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+                        "label": message.sentiment_label,
+                        "score": message.sentiment_score
+                    } for message in analyzed if message.sentiment_label and message.id in priority_of]
+                    if results:
+                        await self.publish_live("sentiment", sentiment_event(results))
+                
+                if self.redis is not None:
+                    await publish_snapshot(self.redis, {
+                        **self.sentiment_analyzer.metrics_snapshot(),
+                        "queue": self.sentiment_stats.summary(),
+                        "last_cycle": {"messages": len(messages), "analyzed": len(analyzed), "failed": len(failed)},
+                    })
+                
+                return len(messages) == limit and bool(analyzed) and not failed
         
         except Exception as e:
             logger.error(f"Error processing sentiment analysis: {e}")
+            return False
 
 
 async def main():